@@ -0,0 +1,58 @@
+import hashlib
+
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi import Request, Response
+
+CHART_COLUMNS = {"time": "Date", "open": "Open", "high": "High", "low": "Low", "close": "Close", "volume": "Volume"}
+FORMATS = ("rows", "columnar")
+
+
+def chart_columns(df: pd.DataFrame) -> dict:
+    """OHLCV bars as parallel arrays {time: [...], open: [...], ...} (no per-row Python loop)."""
+    columns = {"time": pd.to_datetime(df["Date"]).dt.strftime("%Y-%m-%d").tolist()}
+    for key, col in CHART_COLUMNS.items():
+        if key != "time":
+            columns[key] = df[col].to_numpy(dtype=np.float64).tolist()
+    return columns
+
+
+def to_rows(columns: dict) -> list:
+    """Parallel arrays -> list of dicts (the Lightweight Charts `setData` shape)."""
+    keys = list(columns)
+    return [dict(zip(keys, values)) for values in zip(*columns.values())]
+
+
+def to_columns(rows: list) -> dict:
+    """List of dicts -> parallel arrays (keys taken from the first row)."""
+    if not rows:
+        return {}
+    return {key: [row[key] for row in rows] for key in rows[0]}
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def fast_json_response(request: Request, payload, status_code: int = 200) -> Response:
+    """
+    Serializes with orjson (NumPy scalars/arrays included) and tags the body
+    with a content ETag. If the client already has this exact body
+    (If-None-Match), answers 304 with no payload. Gzip is applied by the
+    app's GZipMiddleware.
+    """
+    body = orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    etag = etag_for(body)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if status_code == 200 and etag in _parse_if_none_match(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+def _parse_if_none_match(value: str) -> set:
+    if not value:
+        return set()
+    # Weak validators match too (W/"..."), e.g. after a proxy re-compressed the body
+    return {tag.strip().removeprefix("W/") for tag in value.split(",")}
@@ -1,54 +1,64 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
-from typing import List, Dict, Union, Any
+from typing import List, Dict, Union, Any, Optional
 from contextlib import asynccontextmanager
-from datetime import datetime
-from app.services.backtester import BacktestEngine
-from app.services.report_engine import ReportEngine
-from app.services.data_loader import MarketDataLoader
-import torch
-import numpy as np
-from sklearn.preprocessing import MinMaxScaler
-import os
+import asyncio
+import orjson
+from datetime import datetime, time
+from app.services.backtester import BacktestEngine, parse_holding_rule
+from app.services.portfolio_backtester import PortfolioBacktester, SIZING_RULES, REBALANCE_RULES
+from app.services.report_engine import ReportEngine, default_watchlist
 
 # Custom Modules
-from app.services.data_loader import MarketDataLoader
-from app.processing.indicators import TechnicalAnalyzer
-# CHANGE: Import the Transformer Model
-from app.ml.transformer_model import TimeSeriesTransformer
+from app.services.pipeline import market_loader, load_features, predict_closes, serving_model
+from app.ml.registry import registry, LOOKBACK
 from app.services.news_agent import NewsAgent
 from app.services.mongo import db 
+from app.services.executor import executor
+from app.services.positions import positions
+from app.services.prediction_cache import prediction_cache
+from app.services.quote_hub import quote_hub, QUOTE_SEND_TIMEOUT
+from app.services.scheduler import MarketScheduler, MARKET_SCHEDULER, PRE_OPEN_AT, POST_MARKET_AT
+from app.services.market_calendar import NSE_OPEN
+from app.services.metrics import metrics, RequestTimer, CACHE_REQUESTS, CACHE_ENTRIES, QUOTE_CLIENTS, QUOTE_SYMBOLS, CONTENT_TYPE
+from app.ml.embedding_cache import embedding_cache
+from app.api.serialization import FORMATS, chart_columns, to_rows, to_columns, fast_json_response
 
 news_agent = NewsAgent()
-# GLOBAL MODEL INSTANCE (Load once, use everywhere)
-universal_model = None 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("🚀 Aladdin Engine Starting...")
     db.connect()
-    
-    # LOAD UNIVERSAL BRAIN
-    global universal_model
-    model_path = "app/ml/models/universal_transformer.pth"
-    
     try:
-        # Initialize with the EXACT same params used in Colab training
-        universal_model = TimeSeriesTransformer(
-            input_dim=5, 
-            d_model=128, 
-            nhead=8, 
-            num_layers=4
-        )
-        universal_model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
-        universal_model.eval()
-        print(f"🧠 Universal Brain Loaded successfully from {model_path}")
+        await db.ensure_indexes()
     except Exception as e:
-        print(f"⚠️ Failed to load Universal Model: {e}")
-        print("Using dummy predictions until fixed.")
+        print(f"⚠️ Could not create MongoDB indexes: {e}")
+    try:
+        await db.normalize_timestamps()
+    except Exception as e:
+        print(f"⚠️ Could not convert trade timestamps: {e}")
+    try:
+        await positions.ensure_materialized()
+    except Exception as e:
+        print(f"⚠️ Could not materialize positions: {e}")
+    
+    # LOAD UNIVERSAL BRAIN (+ MiniLM) in the background; /ready reports when done
+    warmup_task = asyncio.create_task(asyncio.to_thread(registry.warm_up))
+
+    # Pre-open cache warm-up + post-market report on NSE trading days
+    if MARKET_SCHEDULER:
+        scheduler.start()
         
     yield
+    warmup_task.cancel()
+    await scheduler.stop()
+    await quote_hub.shutdown()
+    executor.shutdown()
+    await news_agent.aclose()
     await db.close()
     print("🛑 Aladdin Engine Stopped.")
 
@@ -59,7 +69,12 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
+# Chart / equity-curve payloads compress ~5-10x
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+# Outermost, so latencies include compression
+app.add_middleware(RequestTimer)
 
 class PortfolioItem(BaseModel):
     symbol: str
@@ -79,10 +94,38 @@ class PredictionResponse(BaseModel):
     confidence: float
     sentiment_score: float
     recent_news: List[Dict[str, str]]
-    chart_data: List[Dict[str, Any]] 
+    chart_data: Union[List[Dict[str, Any]], Dict[str, List[Any]]]  # rows (default) or columnar
     market_cap: float
     volume: float
 
+class BatchPredictRequest(BaseModel):
+    symbols: List[str]
+
+class ReportRequest(BaseModel):
+    symbols: Optional[List[str]] = None
+
+class BatchPredictionResponse(BaseModel):
+    predictions: List[PredictionResponse]
+    errors: Dict[str, str]
+
+class SweepRequest(BaseModel):
+    symbols: List[str]
+    thresholds: List[float] = [1.5]        # % predicted move needed for a BUY / SELL signal
+    holding_rules: List[str] = ["signal"]  # "signal" (exit on SELL) or "hold_<days>"
+    days: int = 180
+    capital: Optional[float] = None
+
+class PortfolioBacktestRequest(BaseModel):
+    symbols: Optional[List[str]] = None    # default: the report watchlist
+    days: int = 365
+    capital: Optional[float] = None
+    sizing: str = "equal"                  # "equal", "signal" (by predicted move) or "inverse_vol"
+    rebalance: str = "weekly"              # "daily", "weekly" or "monthly"
+    threshold: float = 1.5                 # % predicted move needed for a BUY / SELL signal
+    cost_bps: float = 10.0                 # transaction cost per traded value, in basis points
+    monthly_injection: float = 1000.0      # Smart Wallet style top-up on the first trading day of each month
+    max_weight: float = 1.0                # cap per asset (the rest stays in cash)
+
 class TradeRequest(BaseModel):
     symbol: str
     action: str
@@ -108,55 +151,39 @@ def calculate_confidence(signal: str, sentiment: float, rsi: float, macd_hist: f
 
 @app.get("/portfolio", response_model=List[PortfolioItem])
 async def get_portfolio():
-    """Calculates current holdings based on trade history."""
-    trades = await db.db.trades.find({"user_id": "demo_user"}).to_list(length=1000)
-
-    holdings = {}
-
-    for t in trades:
-        sym = t['symbol']
-        qty = t['quantity']
-        price = t['price']
-        action = t['action']
-
-        if sym not in holdings:
-            holdings[sym] = {"qty": 0, "total_cost": 0.0}
-
-        if action == "BUY":
-            holdings[sym]["qty"] += qty
-            holdings[sym]["total_cost"] += (qty * price)
-        elif action == "SELL":
-            # FIFO logic is complex, using simple average cost for now
-            if holdings[sym]["qty"] > 0:
-                avg_cost = holdings[sym]["total_cost"] / holdings[sym]["qty"]
-                holdings[sym]["total_cost"] -= (qty * avg_cost)
-                holdings[sym]["qty"] -= qty
-
-    # Convert to list and filter zero qty
+    """Current holdings, served from the materialized positions collection."""
+    open_positions = await positions.holdings("demo_user")
+    holdings = {p["symbol"]: {"qty": p["quantity"], "total_cost": p["total_cost"]} for p in open_positions}
+
+    # Convert to list
     portfolio = []
-    loader = MarketDataLoader()
-
-    for sym, data in holdings.items():
-        if data["qty"] > 0:
-            # Fetch live price for PnL
-            try:
-                df = loader.get_stock_data(sym, period="1d")
-                current_price = df['Close'].iloc[-1]
-            except:
-                current_price = data["total_cost"] / data["qty"] # Fallback
-
-            avg_price = data["total_cost"] / data["qty"]
-            current_val = data["qty"] * current_price
-            pnl = current_val - data["total_cost"]
-
-            portfolio.append({
-                "symbol": sym,
-                "quantity": int(data["qty"]),
-                "average_price": round(avg_price, 2),
-                "current_value": round(current_val, 2),
-                "current_price": round(current_price, 2),
-                "pnl": round(pnl, 2)
-            })
+    held = list(holdings.keys())
+
+    # Fetch live prices for PnL concurrently, off the event loop
+    frames = await asyncio.gather(
+        *(executor.run("download", market_loader.get_stock_data, sym, period="1d") for sym in held),
+        return_exceptions=True
+    )
+
+    for sym, df in zip(held, frames):
+        data = holdings[sym]
+        try:
+            current_price = df['Close'].iloc[-1]
+        except:
+            current_price = data["total_cost"] / data["qty"] # Fallback
+
+        avg_price = data["total_cost"] / data["qty"]
+        current_val = data["qty"] * current_price
+        pnl = current_val - data["total_cost"]
+
+        portfolio.append({
+            "symbol": sym,
+            "quantity": int(data["qty"]),
+            "average_price": round(avg_price, 2),
+            "current_value": round(current_val, 2),
+            "current_price": round(current_price, 2),
+            "pnl": round(pnl, 2)
+        })
 
     return portfolio
 
@@ -164,129 +191,256 @@ async def get_portfolio():
 def health_check():
     return {"status": "online"}
 
+@app.get("/ready")
+def readiness_check():
+    """503 until the Universal Brain is loaded and warmed up (for load balancers)."""
+    status = registry.readiness()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+# --- METRICS ---
+# Counters the caches keep themselves are read at scrape time (nothing extra on the hot path)
+CACHE_REQUESTS.track(lambda: {
+    ("prediction", "hit"): prediction_cache.hits,
+    ("prediction", "stale"): prediction_cache.stale_hits,
+    ("prediction", "miss"): prediction_cache.misses,
+    ("embedding", "hit"): embedding_cache.hits,
+    ("embedding", "miss"): embedding_cache.misses,
+    ("news", "hit"): news_agent.cache.hits,
+    ("news", "miss"): news_agent.cache.misses,
+})
+CACHE_ENTRIES.track(lambda: {("prediction",): prediction_cache.stats()["entries"], ("news",): len(news_agent.cache)})
+QUOTE_CLIENTS.track(lambda: {(): quote_hub.clients})
+QUOTE_SYMBOLS.track(lambda: {(): quote_hub.stats()["symbols"]})
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus scrape target: stage, upstream, cache, Mongo and HTTP latencies/counters."""
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
+# --- PREDICTION PIPELINE ---
+# Shared by /predict/{symbol} and /predict/batch (feature loading + batched forward in app/services/pipeline.py)
+
+async def market_view(symbol: str, df, prediction_actual: float) -> dict:
+    """
+    The user-independent part of a prediction (forecast, news, sentiment, chart).
+    Safe to cache and share between requests.
+    """
+    current_price = float(df['Close'].iloc[-1])
+    prediction_actual = float(prediction_actual)
+    move_pct = ((prediction_actual - current_price) / current_price) * 100
+    
+    # Logic
+    search_term = f"{symbol} stock" if "USD" not in symbol else f"{symbol} crypto"
+    news = await news_agent.aget_news(search_term)
+    sentiment_score = await executor.run("sentiment", news_agent.analyze_sentiment, news)
+    
+    market_signal = "HOLD"
+    if move_pct > 0.5: market_signal = "BUY"
+    elif move_pct < -0.5: market_signal = "SELL"
+
+    macd_hist_col = [c for c in df.columns if 'MACDh' in c]
+
+    # Chart Data (kept columnar; rows are built only when a client asks for them)
+    chart = chart_columns(df.tail(90))
+
+    return {
+        "symbol": symbol,
+        "current_price": current_price,
+        "predicted_price": prediction_actual,
+        "move_pct": move_pct,
+        "market_signal": market_signal,
+        "sentiment_score": sentiment_score,
+        "news": news,
+        "rsi": float(df['RSI'].iloc[-1]),
+        "macd_hist": float(df[macd_hist_col[0]].iloc[-1]) if macd_hist_col else 0,
+        "chart": chart,
+        "volume": float(df['Volume'].iloc[-1]),
+    }
+
+async def finalize_prediction(view: dict, user_id: str = "demo_user", format: str = "rows") -> dict:
+    """
+    Per-request part: refines the market signal with the user's holdings, scores and logs it.
+    format='columnar' returns chart_data as parallel arrays instead of one dict per bar.
+    """
+    symbol = view["symbol"]
+    market_signal = view["market_signal"]
+    sentiment_score = view["sentiment_score"]
+
+    # 2. Check User Holdings (Context Awareness)
+    position = await positions.get(user_id, symbol)
+    holding_qty = position["quantity"] if position else 0
+
+    # 3. Refine Signal based on Ownership
+    final_signal = market_signal
+
+    if market_signal == "SELL" and holding_qty <= 0:
+        final_signal = "AVOID"  # Changing SELL to AVOID (bearish, but you don't own it)
+    elif market_signal == "HOLD" and holding_qty <= 0:
+        final_signal = "WATCH"  # Changing HOLD to WATCH (wait for better entry)
+
+    # Risk Check
+    if final_signal == "BUY" and sentiment_score < -0.2:
+        final_signal = "WATCH (High Risk ⚠️)"
+
+    # Confidence
+    confidence_score = calculate_confidence(
+        signal=final_signal.split()[0], 
+        sentiment=sentiment_score,
+        rsi=view["rsi"],
+        macd_hist=view["macd_hist"]
+    )
+
+    # Save to DB (write-behind: batched with other requests' predictions)
+    await db.save_prediction({
+        "symbol": symbol,
+        "price": view["current_price"],
+        "predicted": view["predicted_price"],
+        "signal": final_signal,
+        "confidence": float(confidence_score),
+        "timestamp": datetime.utcnow()
+    })
+
+    return {
+        "symbol": symbol,
+        "current_price": round(view["current_price"], 2),
+        "predicted_price": round(view["predicted_price"], 2),
+        "expected_move_pct": round(view["move_pct"], 2),
+        "signal": final_signal,
+        "confidence": round(confidence_score, 1),
+        "sentiment_score": sentiment_score,
+        "recent_news": view["news"][:3],
+        "chart_data": view["chart"] if format == "columnar" else to_rows(view["chart"]),
+        "volume": view["volume"],
+        "market_cap": 0.0
+    }
+
+async def compute_market_view(symbol: str) -> dict:
+    """Full uncached pipeline for one symbol: download -> indicators -> inference -> news/sentiment."""
+    df = await load_features(symbol)
+    if df is None or df.empty:
+        raise HTTPException(status_code=404, detail="Stock data not found")
+
+    # PREDICT USING SHARED MODEL
+    universal_model = await serving_model()
+    if universal_model:
+        prediction_actual = (await executor.run("inference", predict_closes, universal_model, [symbol], [df]))[0]
+    else:
+        # Fallback if model failed to load
+        prediction_actual = df['Close'].iloc[-1]
+
+    return await market_view(symbol, df, prediction_actual)
+
 @app.get("/predict/{symbol}", response_model=PredictionResponse)
-async def predict_stock(symbol: str):
+async def predict_stock(symbol: str, request: Request, format: str = "rows"):
+    """?format=columnar returns chart_data as {time: [...], open: [...], ...}."""
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Use one of {FORMATS}.")
     try:
-        loader = MarketDataLoader()
-        df = loader.get_stock_data(symbol, period="2y")
-        if df is None or df.empty:
-            raise HTTPException(status_code=404, detail="Stock data not found")
-            
-        ta = TechnicalAnalyzer()
-        df = ta.add_all_indicators(df)
-        df = df.dropna()
-
-        # PREPARE DATA FOR UNIVERSAL BRAIN
-        features = ['Close', 'RSI', 'SMA_50', 'SMA_200', 'OBV']
-        data_values = df[features].values
-        
-        # Normalize (CRITICAL for Universal Model)
-        scaler = MinMaxScaler(feature_range=(0, 1))
-        scaler.fit(data_values)
-        
-        last_60_days = data_values[-60:]
-        scaled_input = scaler.transform(last_60_days)
-        input_tensor = torch.from_numpy(scaled_input).float().unsqueeze(0)
-        
-        # PREDICT USING GLOBAL MODEL
-        if universal_model:
-            with torch.no_grad():
-                pred_scaled = universal_model(input_tensor)
-            
-            # Unscale
-            dummy = np.zeros((1, len(features)))
-            dummy[0, 0] = pred_scaled.item()
-            prediction_actual = scaler.inverse_transform(dummy)[0, 0]
-        else:
-            # Fallback if model failed to load
-            prediction_actual = df['Close'].iloc[-1]
-            
-        current_price = df['Close'].iloc[-1]
-        move_pct = ((prediction_actual - current_price) / current_price) * 100
-        
-        # Logic
-        search_term = f"{symbol} stock" if "USD" not in symbol else f"{symbol} crypto"
-        news = news_agent.get_news(search_term) 
-        sentiment_score = news_agent.analyze_sentiment(news)
-        
-        market_signal = "HOLD"
-        if move_pct > 0.5: market_signal = "BUY"
-        elif move_pct < -0.5: market_signal = "SELL"
-
-        # 2. Check User Holdings (Context Awareness)
-        # Fetch all trades for this symbol
-        trades = await db.db.trades.find({"user_id": "demo_user", "symbol": symbol}).to_list(length=1000)
-        holding_qty = 0
-        for t in trades:
-            if t['action'] == "BUY": holding_qty += t['quantity']
-            elif t['action'] == "SELL": holding_qty -= t['quantity']
-
-        # 3. Refine Signal based on Ownership
-        final_signal = market_signal
-        reason_suffix = ""
-
-        if market_signal == "SELL" and holding_qty <= 0:
-            final_signal = "AVOID"  # Changing SELL to AVOID
-            reason_suffix = " (Bearish, but you don't own it)"
-        elif market_signal == "HOLD" and holding_qty <= 0:
-            final_signal = "WATCH"  # Changing HOLD to WATCH
-            reason_suffix = " (Wait for better entry)"
-
-        # Risk Check
-        if final_signal == "BUY" and sentiment_score < -0.2:
-            final_signal = "WATCH (High Risk ⚠️)"
-
-        # Confidence
-        current_rsi = df['RSI'].iloc[-1]
-        macd_hist_col = [c for c in df.columns if 'MACDh' in c]
-        current_macd_hist = df[macd_hist_col[0]].iloc[-1] if macd_hist_col else 0
-        
-        confidence_score = calculate_confidence(
-            signal=final_signal.split()[0], 
-            sentiment=sentiment_score,
-            rsi=current_rsi,
-            macd_hist=current_macd_hist
-        )
-
-        # Chart Data
-        history_df = df.tail(90).copy()
-        chart_data = []
-        for index, row in history_df.iterrows():
-            chart_data.append({
-                "time": row['Date'].strftime("%Y-%m-%d"),
-                "open": row['Open'], "high": row['High'], "low": row['Low'], "close": row['Close'],
-                "volume": row['Volume']
-            })
-
-        # Save to DB
-        try:
-            await db.save_prediction({
-                "symbol": symbol,
-                "price": float(current_price),
-                "predicted": float(prediction_actual),
-                "signal": final_signal,
-                "confidence": float(confidence_score),
-                "timestamp": datetime.utcnow()
-            })
-        except: pass
-
-        return {
-            "symbol": symbol,
-            "current_price": round(current_price, 2),
-            "predicted_price": round(prediction_actual, 2),
-            "expected_move_pct": round(move_pct, 2),
-            "signal": final_signal,
-            "confidence": round(confidence_score, 1),
-            "sentiment_score": sentiment_score,
-            "recent_news": news[:3],
-            "chart_data": chart_data,
-            "volume": float(df['Volume'].iloc[-1]),
-            "market_cap": 0.0
-        }
+        # Market view is cached per (symbol, last bar, model version); holdings are applied per request
+        view = await prediction_cache.get(symbol, lambda: compute_market_view(symbol))
+        return fast_json_response(request, await finalize_prediction(view, format=format))
     except Exception as e:
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def compute_market_views(symbols: list):
+    """
+    Batched pipeline for many symbols: concurrent download + indicators, ONE
+    stacked forward pass, then news/sentiment. Every view is stored in the
+    prediction cache. Returns ({symbol: view}, {symbol: error}).
+    """
+    frames, errors = {}, {}
+
+    # 1. Download + indicators for every symbol concurrently (bounded per stage)
+    results = await asyncio.gather(*(load_features(sym) for sym in symbols), return_exceptions=True)
+    for symbol, df in zip(symbols, results):
+        if isinstance(df, Exception):
+            errors[symbol] = str(df)
+        elif df is None or df.empty:
+            errors[symbol] = "Stock data not found"
+        elif len(df) < LOOKBACK:
+            errors[symbol] = f"Only {len(df)} usable days of history (Need {LOOKBACK}+)."
+        else:
+            frames[symbol] = df
+
+    # 2. One forward pass for the whole batch
+    ready = list(frames.keys())
+    universal_model = await serving_model()
+    if universal_model and ready:
+        prices = await executor.run("inference", predict_closes, universal_model, ready, [frames[sym] for sym in ready])
+    else:
+        prices = [frames[sym]['Close'].iloc[-1] for sym in ready]
+
+    # 3. Per-symbol signal, news and chart (same fields as /predict/{symbol})
+    built = await asyncio.gather(
+        *(market_view(sym, frames[sym], price) for sym, price in zip(ready, prices)),
+        return_exceptions=True
+    )
+    views = {}
+    for symbol, view in zip(ready, built):
+        if isinstance(view, Exception):
+            errors[symbol] = str(view)
+        else:
+            prediction_cache.put(symbol, view)
+            views[symbol] = view
+    return views, errors
+
+@app.post("/predict/batch", response_model=BatchPredictionResponse)
+async def predict_batch(request: BatchPredictRequest):
+    """
+    Predicts a whole watchlist with ONE stacked forward pass of the Universal Brain.
+    Symbols that fail (no data, too little history) are reported in `errors`.
+    """
+    symbols = list(dict.fromkeys(request.symbols)) # De-duplicate, keep order
+    views, errors = await compute_market_views(symbols)
+    predictions = await asyncio.gather(*(finalize_prediction(view) for view in views.values()))
+    return {"predictions": predictions, "errors": errors}
+
+# --- Scheduled jobs (NSE calendar, see app/services/scheduler.py) ---
+
+async def warm_caches():
+    """
+    Pre-open warm-up for the report watchlist + every held symbol: bars, indicators,
+    scaler statistics, predictions, news and sentiment land in the bar store,
+    embedding cache and prediction cache before the opening rush.
+    """
+    symbols = list(dict.fromkeys(default_watchlist() + await positions.held_symbols()))
+    views, errors = await compute_market_views(symbols)
+    for symbol, error in errors.items():
+        print(f"⚠️ Warm-up skipped {symbol}: {error}")
+    print(f"🔥 Warmed {len(views)}/{len(symbols)} symbols")
+
+async def report_exists(report_type: str) -> bool:
+    """Today's report (reports are dated in UTC) was already generated, e.g. before a restart."""
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    return await db.db.reports.find_one({"type": report_type, "date": today}) is not None
+
+async def pre_open_job():
+    await warm_caches()
+    # The morning report now runs entirely on warm caches
+    if not await report_exists("PRE_MARKET"):
+        await ReportEngine(news_agent=news_agent).generate_pre_market_report(default_watchlist())
+
+async def post_market_job():
+    if not await report_exists("POST_MARKET"):
+        await ReportEngine(news_agent=news_agent).generate_post_market_report()
+
+scheduler = MarketScheduler()
+scheduler.add("pre_open", PRE_OPEN_AT, pre_open_job, catch_up_until=NSE_OPEN)
+scheduler.add("post_market", POST_MARKET_AT, post_market_job, catch_up_until=time(23, 59))
+
+@app.get("/scheduler")
+async def scheduler_status():
+    return scheduler.status()
+
+@app.post("/scheduler/{job}/run")
+async def run_scheduled_job(job: str):
+    """Runs a scheduled job now (e.g. to warm the caches after a deploy)."""
+    if job not in scheduler.status()["jobs"]:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job}'.")
+    await scheduler.run(job)
+    return scheduler.status()["jobs"][job]
+
 
 @app.get("/wallet")
 async def get_wallet():
@@ -353,21 +507,14 @@ async def trade_stock(trade: TradeRequest):
             {"user_id": user_id},
             {"$set": {"balance": new_balance}}
         )
+        await positions.apply_buy(user_id, trade.symbol, trade.quantity, trade.price)
 
     # 3. SELL Logic (The Fix)
     elif trade.action == "SELL":
-        # Calculate Net Holdings (Buys - Sells)
-        trades = await db.db.trades.find({"user_id": user_id, "symbol": trade.symbol}).to_list(length=1000)
-        
-        current_qty = 0
-        for t in trades:
-            if t['action'] == "BUY":
-                current_qty += t['quantity']
-            elif t['action'] == "SELL":
-                current_qty -= t['quantity']
-        
-        # Validation Check
-        if current_qty < trade.quantity:
+        # Validation + position update in one atomic step on the positions collection
+        if not await positions.apply_sell(user_id, trade.symbol, trade.quantity, trade.price):
+            position = await positions.get(user_id, trade.symbol)
+            current_qty = position["quantity"] if position else 0
             print(f"❌ Sell Rejected. Owned: {current_qty}, Requested: {trade.quantity}")
             raise HTTPException(status_code=400, detail=f"Insufficient quantity. You own {current_qty}.")
 
@@ -385,7 +532,7 @@ async def trade_stock(trade: TradeRequest):
         "price": trade.price,
         "quantity": trade.quantity,
         "total": total_cost,
-        "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        "timestamp": datetime.utcnow()
     }
     await db.db.trades.insert_one(trade_doc)
     
@@ -395,6 +542,7 @@ async def trade_stock(trade: TradeRequest):
 async def reset_account():
     user_id = "demo_user"
     await db.db.trades.delete_many({"user_id": user_id})
+    await positions.clear(user_id)
     await db.db.users.update_one(
         {"user_id": user_id},
         {"$set": {"balance": 1000.0, "portfolio": {}, "last_refill": datetime.utcnow()}},
@@ -405,15 +553,16 @@ async def reset_account():
 # --- REPORT SYSTEM ---
 
 @app.post("/reports/generate/{type}")
-async def generate_report_api(type: str):
+async def generate_report_api(type: str, request: Optional[ReportRequest] = None):
     """
     Triggers generation of a Daily Report.
     type: 'pre' (Morning) or 'post' (Evening)
+    Optional body {"symbols": [...]} overrides the watchlist (default: REPORT_WATCHLIST env).
     """
-    engine = ReportEngine()
+    engine = ReportEngine(news_agent=news_agent)
     
-    # Define your "Watchlist" for the daily report
-    watchlist = ["RELIANCE.NS", "TCS.NS", "INFY.NS", "HDFCBANK.NS", "BTC-USD"]
+    # "Watchlist" for the daily report
+    watchlist = list(dict.fromkeys(request.symbols)) if request and request.symbols else default_watchlist()
     
     if type == "pre":
         report = await engine.generate_pre_market_report(watchlist)
@@ -442,17 +591,137 @@ async def get_latest_reports():
 
 # Backtest Endpoint
 @app.get("/backtest/{symbol}")
-async def run_backtest(symbol: str):
+async def run_backtest(symbol: str, request: Request, vectorized: bool = True, format: str = "rows"):
     """
     Runs a simulation on historical data to verify AI performance.
+    Pass ?vectorized=false to use the reference day-by-day loop.
+    ?format=columnar returns equity_curve / trade_log as parallel arrays.
     """
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Use one of {FORMATS}.")
     user_id = "demo_user"
     user = await db.db.users.find_one({"user_id": user_id})
     current_capital = user["balance"] if user else 1000.0
 
     engine = BacktestEngine()
-    result = await engine.run_backtest(symbol, current_capital)
-    return result
+    result = await engine.run_backtest(symbol, capital=current_capital, vectorized=vectorized)
+    if format == "columnar" and "equity_curve" in result:
+        result["equity_curve"] = to_columns(result["equity_curve"])
+        result["trade_log"] = to_columns(result["trade_log"])
+    return fast_json_response(request, result)
+
+MAX_SWEEP_RUNS = 50000
+
+@app.post("/backtest/sweep")
+async def run_backtest_sweep(request: SweepRequest, http_request: Request):
+    """
+    Grid backtest: every symbol x threshold x holding rule.
+    Data and model predictions are computed once per symbol and shared by the whole grid.
+    """
+    symbols = list(dict.fromkeys(request.symbols))
+    runs = len(symbols) * len(request.thresholds) * len(request.holding_rules)
+    if runs == 0:
+        raise HTTPException(status_code=400, detail="Need at least one symbol, threshold and holding rule.")
+    if runs > MAX_SWEEP_RUNS:
+        raise HTTPException(status_code=400, detail=f"Sweep too large ({runs} runs, max {MAX_SWEEP_RUNS}).")
+    for rule in request.holding_rules:
+        try:
+            parse_holding_rule(rule)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    capital = request.capital
+    if capital is None:
+        user = await db.db.users.find_one({"user_id": "demo_user"})
+        capital = user["balance"] if user else 1000.0
+
+    engine = BacktestEngine()
+    result = await engine.run_sweep(symbols, request.thresholds, request.holding_rules, days=request.days, capital=capital)
+    return fast_json_response(http_request, result)
+
+@app.websocket("/ws/quotes")
+async def quotes_socket(websocket: WebSocket, symbols: str = None):
+    """
+    Live quotes. Subscribe with ?symbols=TCS.NS,BTC-USD and/or messages
+    {"action": "subscribe" | "unsubscribe", "symbols": [...]}.
+    Updates arrive as {"type": "quotes", "data": [{symbol, price, change_pct, source, time}, ...]}.
+    """
+    await websocket.accept()
+    client = quote_hub.connect()
+
+    async def pump():
+        # Sends whatever is pending; a slow client gets only each symbol's newest quote
+        while True:
+            batch = await client.next_batch()
+            await asyncio.wait_for(websocket.send_text(orjson.dumps({"type": "quotes", "data": batch}).decode()),
+                                   QUOTE_SEND_TIMEOUT)
+
+    async def reply(message: dict):
+        await websocket.send_text(orjson.dumps(message).decode())
+
+    sender = asyncio.create_task(pump())
+    try:
+        if symbols:
+            await reply({"type": "subscribed", "symbols": quote_hub.subscribe(client, [s.strip() for s in symbols.split(",") if s.strip()])})
+        while True:
+            receiver = asyncio.create_task(websocket.receive_json())
+            done, _ = await asyncio.wait({receiver, sender}, return_when=asyncio.FIRST_COMPLETED)
+            if sender in done:
+                receiver.cancel()
+                sender.result()  # Re-raises the send failure / timeout
+            message = receiver.result()
+            action = message.get("action") if isinstance(message, dict) else None
+            requested = message.get("symbols") if isinstance(message, dict) else None
+            if action not in ("subscribe", "unsubscribe") or not isinstance(requested, list):
+                await reply({"type": "error", "message": "Send {\"action\": \"subscribe\" | \"unsubscribe\", \"symbols\": [...]}."})
+            elif action == "subscribe":
+                await reply({"type": "subscribed", "symbols": quote_hub.subscribe(client, [str(s) for s in requested])})
+            else:
+                quote_hub.unsubscribe(client, [str(s) for s in requested])
+                await reply({"type": "unsubscribed", "symbols": requested})
+    except (WebSocketDisconnect, asyncio.TimeoutError):
+        pass
+    except ValueError:
+        # Not JSON
+        await websocket.close(code=1003)
+    finally:
+        sender.cancel()
+        quote_hub.disconnect(client)
+
+MAX_PORTFOLIO_SYMBOLS = 500
+
+@app.post("/backtest/portfolio")
+async def run_portfolio_backtest(request: PortfolioBacktestRequest, http_request: Request, format: str = "rows"):
+    """
+    Basket backtest with shared capital, signal-driven weights, periodic
+    rebalancing, transaction costs and a monthly cash injection.
+    """
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format '{format}'. Use one of {FORMATS}.")
+    if request.sizing not in SIZING_RULES:
+        raise HTTPException(status_code=400, detail=f"Invalid sizing '{request.sizing}'. Use one of {SIZING_RULES}.")
+    if request.rebalance not in REBALANCE_RULES:
+        raise HTTPException(status_code=400, detail=f"Invalid rebalance '{request.rebalance}'. Use one of {REBALANCE_RULES}.")
+    if not 0 < request.max_weight <= 1 or request.cost_bps < 0 or request.monthly_injection < 0:
+        raise HTTPException(status_code=400, detail="Need 0 < max_weight <= 1, cost_bps >= 0 and monthly_injection >= 0.")
+
+    symbols = list(dict.fromkeys(request.symbols)) if request.symbols else default_watchlist()
+    if len(symbols) > MAX_PORTFOLIO_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"Basket too large ({len(symbols)} symbols, max {MAX_PORTFOLIO_SYMBOLS}).")
+
+    capital = request.capital
+    if capital is None:
+        user = await db.db.users.find_one({"user_id": "demo_user"})
+        capital = user["balance"] if user else 1000.0
+
+    result = await PortfolioBacktester().run(
+        symbols, days=request.days, capital=capital, sizing=request.sizing, rebalance=request.rebalance,
+        threshold=request.threshold, cost_bps=request.cost_bps, monthly_injection=request.monthly_injection,
+        max_weight=request.max_weight
+    )
+    if format == "columnar" and "equity_curve" in result:
+        result["equity_curve"] = to_columns(result["equity_curve"])
+    return fast_json_response(http_request, result)
 
 if __name__ == "__main__":
     import uvicorn
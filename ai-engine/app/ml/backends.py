@@ -0,0 +1,213 @@
+import copy
+import os
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from app.ml.registry import LOOKBACK, TRANSFORMER_CONFIG
+from app.processing.scaling import FEATURES
+
+# Which inference backend serves the Universal Brain (see build_backend)
+BACKENDS = ("eager", "fastpath", "int8", "torchscript", "compile")
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "eager")
+
+# Max |optimized - fp32| on the scaled (0..1) prediction before we fall back to eager
+DRIFT_TOLERANCE = float(os.getenv("INFERENCE_DRIFT_TOLERANCE", "0.01"))
+
+# Held-out windows for the drift check: stored bars of these symbols (no network),
+# or a seeded synthetic series when none are stored yet
+HOLDOUT_SYMBOLS = [s.strip() for s in os.getenv("INFERENCE_HOLDOUT_SYMBOLS", "RELIANCE.NS,TCS.NS,BTC-USD,EURUSD=X").split(",") if s.strip()]
+HOLDOUT_WINDOWS = 256
+
+
+class FastPathModel(nn.Module):
+    """
+    Eager model with frozen parameters, always run under inference_mode, so
+    nn.TransformerEncoderLayer takes its fused attention fast path even when
+    the caller forgot no_grad.
+    """
+
+    def __init__(self, model: nn.Module):
+        super().__init__()
+        self.model = model.eval()
+        for param in self.model.parameters():
+            param.requires_grad_(False)
+
+    def forward(self, src):
+        with torch.inference_mode():
+            return self.model(src)
+
+
+def _disable_fast_path():
+    """
+    The fused encoder-layer kernel reads raw Linear weights, which dynamically
+    quantized Linears don't have. Turns it off through PyTorch's switch
+    (process-wide, PyTorch 2.2+); without the switch int8 can't be served.
+    """
+    mha = getattr(torch.backends, "mha", None)
+    if mha is None or not hasattr(mha, "set_fastpath_enabled"):
+        raise RuntimeError(f"int8 needs torch.backends.mha.set_fastpath_enabled (PyTorch 2.2+, have {torch.__version__})")
+    mha.set_fastpath_enabled(False)
+
+
+def _fast_path_enabled():
+    mha = getattr(torch.backends, "mha", None)
+    return mha.get_fastpath_enabled() if mha is not None and hasattr(mha, "get_fastpath_enabled") else None
+
+
+def build_backend(model: nn.Module, name: str) -> nn.Module:
+    """
+    Wraps/converts an fp32 eval-mode model for fast CPU inference.
+    The input model is never modified.
+      eager       - the model as is
+      fastpath    - frozen params + inference_mode (fused attention fast path)
+      int8        - dynamic int8 quantization of the nn.Linear layers (turns off
+                    the fused attention fast path for the whole process)
+      torchscript - traced + frozen TorchScript graph
+      compile     - torch.compile (first call per input shape compiles)
+    """
+    if name == "eager":
+        return model
+    if name == "fastpath":
+        return FastPathModel(copy.deepcopy(model))
+    if name == "int8":
+        _disable_fast_path()
+        return torch.ao.quantization.quantize_dynamic(copy.deepcopy(model).eval(), {nn.Linear}, dtype=torch.qint8)
+    if name == "torchscript":
+        example = torch.zeros(2, LOOKBACK, TRANSFORMER_CONFIG['input_dim'])
+        with torch.no_grad():
+            traced = torch.jit.trace(copy.deepcopy(model).eval(), example, check_trace=False)
+        return torch.jit.freeze(traced)
+    if name == "compile":
+        return torch.compile(copy.deepcopy(model).eval())
+    raise ValueError(f"Unknown inference backend '{name}'. Use one of {BACKENDS}")
+
+
+def _windows_from_bars(df, count: int) -> np.ndarray:
+    from app.processing.indicators import TechnicalAnalyzer
+    from app.processing.scaling import FeatureScaler
+
+    df = TechnicalAnalyzer().add_all_indicators(df)
+    if df is None or len(df) < LOOKBACK:
+        return np.empty((0, LOOKBACK, len(FEATURES)), dtype=np.float32)
+    df = df.dropna()
+    scaled = FeatureScaler.from_frame(df, FEATURES).transform(df[FEATURES].values).astype(np.float32)
+    windows = np.lib.stride_tricks.sliding_window_view(scaled, LOOKBACK, axis=0).transpose(0, 2, 1)
+    return windows[-count:]
+
+
+def holdout_windows(symbols: list = None, count: int = HOLDOUT_WINDOWS, seed: int = 0) -> np.ndarray:
+    """
+    [count, LOOKBACK, features] scaled windows for the accuracy-drift check:
+    the most recent windows of each stored symbol, topped up with a seeded
+    synthetic random walk so the check is always deterministic and offline.
+    """
+    import pandas as pd
+    from app.services.bar_store import bar_store
+
+    symbols = HOLDOUT_SYMBOLS if symbols is None else symbols
+    per_symbol = max(1, count // max(1, len(symbols)))
+    parts = []
+    for symbol in symbols:
+        bars = bar_store.read(symbol)
+        if bars is not None and len(bars) > 200 + LOOKBACK:
+            parts.append(_windows_from_bars(bars, per_symbol))
+
+    have = sum(len(p) for p in parts)
+    if have < count:
+        rng = np.random.default_rng(seed)
+        n = 260 + count
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, n)))
+        synthetic = pd.DataFrame({
+            'Open': close, 'High': close * 1.01, 'Low': close * 0.99, 'Close': close,
+            'Volume': rng.integers(1_000, 100_000, n).astype(float),
+        })
+        parts.append(_windows_from_bars(synthetic, count - have))
+
+    return np.ascontiguousarray(np.concatenate(parts)[:count], dtype=np.float32)
+
+
+def _forward(model, windows: np.ndarray) -> np.ndarray:
+    from app.ml.inference import batch_forward
+    return batch_forward(model, windows)
+
+
+def measure_drift(reference, candidate, windows: np.ndarray) -> dict:
+    """How far the candidate's scaled predictions stray from the fp32 reference."""
+    diff = np.abs(_forward(candidate, windows) - _forward(reference, windows))
+    return {"max_abs": float(diff.max()), "mean_abs": float(diff.mean())}
+
+
+def time_forward(model, windows: np.ndarray, repeats: int = 3) -> float:
+    """Best-of-N milliseconds for one batched pass over `windows` (after a warm-up pass)."""
+    _forward(model, windows)
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        _forward(model, windows)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def select_backend(model, name: str = INFERENCE_BACKEND, windows: np.ndarray = None, tolerance: float = DRIFT_TOLERANCE):
+    """
+    Builds the requested backend and checks it against the fp32 model on
+    held-out windows. Falls back to eager if it fails to build/run or drifts
+    more than `tolerance`. Returns (model, report).
+    """
+    report = {"requested": name, "backend": "eager", "tolerance": tolerance}
+    if name == "eager":
+        return model, report
+
+    try:
+        candidate = build_backend(model, name)
+        windows = holdout_windows() if windows is None else windows
+        drift = measure_drift(model, candidate, windows)
+    except Exception as e:
+        print(f"⚠️ Inference backend '{name}' unavailable ({e}). Using eager.")
+        report["error"] = str(e)
+        return model, report
+
+    report["drift"] = drift
+    if drift["max_abs"] > tolerance:
+        print(f"⚠️ Inference backend '{name}' drifts {drift['max_abs']:.4f} from fp32 (tolerance {tolerance}). Using eager.")
+        return model, report
+
+    print(f"⚡ Inference backend: {name} (max drift {drift['max_abs']:.2e})")
+    report["backend"] = name
+    return candidate, report
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.ml.registry import registry
+
+    parser = argparse.ArgumentParser(description="Compare inference backends against the fp32 Universal Brain")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--windows", type=int, default=HOLDOUT_WINDOWS, help="Held-out windows per pass")
+    parser.add_argument("--tolerance", type=float, default=DRIFT_TOLERANCE)
+    args = parser.parse_args()
+
+    reference = registry.get_reference_transformer()
+    if reference is None:
+        raise SystemExit("❌ Universal Model not found.")
+
+    windows = holdout_windows(count=args.windows)
+    base_ms = time_forward(reference, windows)
+    print(f"\n{'backend':<12} {'ms/pass':>9} {'speedup':>8} {'max drift':>10} {'mean drift':>11}  verdict")
+    fast_path = _fast_path_enabled()
+    for name in args.backends:
+        try:
+            candidate = build_backend(reference, name)
+            ms = time_forward(candidate, windows)
+            drift = measure_drift(reference, candidate, windows)
+        except Exception as e:
+            print(f"{name:<12} {'-':>9} {'-':>8} {'-':>10} {'-':>11}  ❌ {e}")
+            continue
+        finally:
+            if fast_path is not None:
+                torch.backends.mha.set_fastpath_enabled(fast_path)  # int8 turned it off; later backends get it back
+        verdict = "✅ ok" if drift["max_abs"] <= args.tolerance else "❌ drift"
+        print(f"{name:<12} {ms:>9.1f} {base_ms / ms:>7.2f}x {drift['max_abs']:>10.2e} {drift['mean_abs']:>11.2e}  {verdict}")
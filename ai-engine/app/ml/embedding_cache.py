@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from app.ml.registry import registry, EMBEDDER_NAME
+
+# ai-engine/data/vector_db
+VECTOR_DB_DIR = Path(__file__).resolve().parent.parent.parent / "data" / "vector_db"
+
+
+class EmbeddingCache:
+    """
+    The 'Memory' of the RAG engine.
+    Sentence embeddings keyed by a SHA-1 of the text: a bounded in-memory LRU
+    in front of an append-only vector file on disk. Only texts never seen
+    before are sent to the (slow) encoder, in one batched call.
+    """
+
+    def __init__(self, get_model=None, model_name: str = EMBEDDER_NAME,
+                 root: Path = VECTOR_DB_DIR, max_memory_items: int = 20000):
+        self._get_model = get_model or registry.get_embedder
+        self.model_name = model_name
+        self.root = Path(root)
+        self.max_memory_items = max_memory_items
+
+        self._lru = OrderedDict()
+        self._index = None   # sha1 hex digest -> row in the vector file
+        self._disk = None    # np.memmap over the vector file
+        self._dtype = None
+        self._rows = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def model(self):
+        return self._get_model()
+
+    @property
+    def path(self) -> Path:
+        # One file per embedder: switching models never mixes vector spaces
+        return self.root / f"{re.sub(r'[^A-Za-z0-9._-]', '_', self.model_name)}.emb"
+
+    @property
+    def meta_path(self) -> Path:
+        # Sidecar with the vector dimension, so reading the file never needs the model
+        return self.path.with_suffix(".emb.json")
+
+    def encode(self, texts: list) -> np.ndarray:
+        """Returns one float32 vector per text (same order), encoding only cache misses."""
+        keys = [hashlib.sha1(t.encode("utf-8")).hexdigest().encode("ascii") for t in texts]
+
+        with self._lock:
+            self._open()
+            found = {}
+            for key in set(keys):
+                vec = self._lookup(key)
+                if vec is not None:
+                    found[key] = vec
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        self.hits += len(keys) - sum(1 for k in keys if k in missing)
+        self.misses += len(missing)
+
+        if missing:
+            vectors = np.asarray(self.model.encode(list(missing.values())), dtype=np.float32)
+            with self._lock:
+                self._persist(list(missing.keys()), vectors)
+                for key, vec in zip(missing.keys(), vectors):
+                    self._remember(key, vec)
+                    found[key] = vec
+
+        return np.stack([found[k] for k in keys])
+
+    # --- Internals (call with the lock held) ---
+
+    def _lookup(self, key: bytes):
+        if key in self._lru:
+            self._lru.move_to_end(key)
+            return self._lru[key]
+
+        row = self._index.get(key)
+        if row is None:
+            return None
+        if self._disk is None or row >= len(self._disk):
+            self._disk = np.memmap(self.path, dtype=self._dtype, mode='r')
+        vec = np.array(self._disk[row]['vec'])
+        self._remember(key, vec)
+        return vec
+
+    def _remember(self, key: bytes, vec: np.ndarray):
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.max_memory_items:
+            self._lru.popitem(last=False)
+
+    def _open(self):
+        if self._index is not None:
+            return
+        self._index = {}
+        if not self.path.exists():
+            return
+
+        # Record size depends on the embedder's output dimension
+        self._dtype = np.dtype([('key', 'S40'), ('vec', '<f4', (self._dimension(),))])
+
+        size = self.path.stat().st_size
+        rows = size // self._dtype.itemsize
+        if rows * self._dtype.itemsize != size:
+            # A crash mid-append left a partial record: drop it
+            with open(self.path, "r+b") as f:
+                f.truncate(rows * self._dtype.itemsize)
+        self._rows = rows
+        if rows == 0:
+            return
+
+        self._disk = np.memmap(self.path, dtype=self._dtype, mode='r')
+        self._index = {bytes(k): i for i, k in enumerate(self._disk['key'])}
+        print(f"💾 Embedding cache: {rows} vectors loaded from {self.path.name}")
+
+    def _dimension(self) -> int:
+        try:
+            with open(self.meta_path) as f:
+                return int(json.load(f)["dim"])
+        except (OSError, ValueError, KeyError):
+            pass
+        # Vector file written before the sidecar existed: ask the model once and record it
+        dim = self.model.get_sentence_embedding_dimension()
+        self._write_meta(dim)
+        return dim
+
+    def _write_meta(self, dim: int):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.meta_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"model": self.model_name, "dim": dim}, f)
+        os.replace(tmp_path, self.meta_path)  # Atomic swap
+
+    def _persist(self, keys: list, vectors: np.ndarray):
+        if self._dtype is None:
+            self._dtype = np.dtype([('key', 'S40'), ('vec', '<f4', (vectors.shape[1],))])
+            self._write_meta(vectors.shape[1])
+
+        records = np.empty(len(keys), dtype=self._dtype)
+        records['key'] = keys
+        records['vec'] = vectors
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(records.tobytes())
+        for i, key in enumerate(keys):
+            self._index[key] = self._rows + i
+        self._rows += len(keys)
+
+
+# Shared instance (one cache per process)
+embedding_cache = EmbeddingCache()
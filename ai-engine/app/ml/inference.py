@@ -3,8 +3,25 @@ import numpy as np
 import pandas as pd
 from app.services.data_loader import MarketDataLoader
 from app.processing.indicators import TechnicalAnalyzer
-from app.ml.model import AladdinPricePredictor
-from sklearn.preprocessing import MinMaxScaler
+from app.ml.registry import registry
+from app.processing.scaling import feature_scalers
+
+def batch_forward(model, windows: np.ndarray, batch_size: int = 256) -> np.ndarray:
+    """
+    Runs many [seq_len, features] windows through the model in stacked
+    forward passes instead of one call per window.
+    Returns one scaled prediction per window.
+    """
+    if len(windows) == 0:
+        return np.empty(0, dtype=np.float32)
+
+    outputs = []
+    with torch.no_grad():
+        for start in range(0, len(windows), batch_size):
+            # Copies only this chunk (windows may be a strided, read-only view)
+            chunk = np.ascontiguousarray(windows[start:start + batch_size], dtype=np.float32)
+            outputs.append(model(torch.from_numpy(chunk)).reshape(-1).numpy())
+    return np.concatenate(outputs)
 
 def predict_next_day(symbol="RELIANCE.NS"):
     print(f"🔮 Gazing into the crystal ball for {symbol}...")
@@ -19,26 +36,19 @@ def predict_next_day(symbol="RELIANCE.NS"):
     ta = TechnicalAnalyzer()
     df = ta.add_all_indicators(df)
     
-    # 3. Prepare Data (Same scaling as training)
+    # 3. Prepare Data (Same scaling as training: the symbol's stored statistics)
     features = ['Close', 'RSI', 'SMA_50', 'SMA_200', 'OBV']
-    data = df[features].values
-    
-    scaler = MinMaxScaler(feature_range=(0, 1))
-    scaler.fit(data) # Learn the scale from history
-    
+    scaler = feature_scalers.fit(symbol, df)
+
     # 4. Get the last 60 days (The "Sequence" we need to predict tomorrow)
-    last_60_days = data[-60:] 
-    scaled_input = scaler.transform(last_60_days)
+    scaled_input = scaler.transform(df[features].values[-60:])
     
     # Convert to Tensor [Batch Size, Seq Len, Features]
     input_tensor = torch.from_numpy(scaled_input).float().unsqueeze(0)
     
-    # 5. Load the Trained Brain
-    model = AladdinPricePredictor(input_dim=len(features))
-    try:
-        model.load_state_dict(torch.load(f"app/ml/models/{symbol}_lstm.pth"))
-        model.eval() # Set to evaluation mode (no learning, just predicting)
-    except FileNotFoundError:
+    # 5. Load the Trained Brain (cached by the registry)
+    model = registry.get_lstm(symbol)
+    if model is None:
         print("❌ Model not found! Train it first.")
         return
 
@@ -46,12 +56,8 @@ def predict_next_day(symbol="RELIANCE.NS"):
     with torch.no_grad():
         prediction_scaled = model(input_tensor)
         
-    # 7. Un-scale the prediction to get the actual price
-    # We need to construct a dummy row to inverse_transform because scaler expects 5 columns
-    dummy_row = np.zeros((1, len(features)))
-    dummy_row[0, 0] = prediction_scaled.item() # Put predicted Close in 1st column
-    
-    prediction_actual = scaler.inverse_transform(dummy_row)[0, 0]
+    # 7. Un-scale the prediction to get the actual price (Close column only)
+    prediction_actual = float(scaler.unscale_close(prediction_scaled.item()))
     current_price = df['Close'].iloc[-1]
     
     change_percent = ((prediction_actual - current_price) / current_price) * 100
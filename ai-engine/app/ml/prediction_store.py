@@ -0,0 +1,264 @@
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.ml.inference import batch_forward
+from app.ml.registry import registry, LOOKBACK
+from app.processing.incremental import indicator_engine
+from app.processing.scaling import FeatureScaler, feature_scalers, FEATURES
+
+# ai-engine/data/predictions (next to the bar store)
+DATA_DIR = Path(__file__).resolve().parent.parent.parent / "data" / "predictions"
+
+PREDICTION_DTYPE = np.dtype([('Date', '<M8[ns]'), ('Predicted', '<f8')])
+
+
+class PredictionStore:
+    """
+    Historical predicted closes of the Universal Brain.
+    One memory-mapped NumPy file (Date, Predicted) per symbol + model version,
+    plus a JSON sidecar. The row for date D is the model's prediction from the
+    LOOKBACK bars before D, exactly what BacktestEngine's model path computes.
+    Rows stay valid while the model version, the history start (where OBV is
+    anchored) and the symbol's scaler statistics are unchanged; a new high/low
+    widens the scaler and the next scoring run rescores the history.
+    """
+
+    def __init__(self, root: Path = DATA_DIR, engine=None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.engine = engine or indicator_engine
+
+    def _key(self, symbol: str, version: str) -> str:
+        return re.sub(r'[^A-Za-z0-9._-]', '_', f"{symbol}_{version}")
+
+    def _path(self, symbol: str, version: str) -> Path:
+        return self.root / f"{self._key(symbol, version)}.npy"
+
+    def _meta_path(self, symbol: str, version: str) -> Path:
+        return self.root / f"{self._key(symbol, version)}.json"
+
+    # --- Reads ---
+
+    def meta(self, symbol: str, version: str) -> dict:
+        path = self._meta_path(symbol, version)
+        if not path.exists():
+            return {}
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def read(self, symbol: str, version: str):
+        path = self._path(symbol, version)
+        if not path.exists():
+            return None
+        return np.load(path, mmap_mode='r')
+
+    def lookup(self, symbol: str, version: str, dates, history_start=None, scaler: FeatureScaler = None) -> np.ndarray:
+        """
+        Stored predictions for `dates` (in order), or None unless every date is
+        stored for this model version, history start and scaler.
+        """
+        if not _valid(self.meta(symbol, version), version, history_start, scaler):
+            return None
+        rows = self.read(symbol, version)
+        if rows is None or len(rows) == 0:
+            return None
+
+        wanted = _naive_dates(pd.Series(dates))
+        idx = np.searchsorted(rows['Date'], wanted)
+        if np.any(idx >= len(rows)) or np.any(rows['Date'][np.minimum(idx, len(rows) - 1)] != wanted):
+            return None
+        return np.array(rows['Predicted'][idx], dtype=np.float64)
+
+    # --- Writes ---
+
+    def _write(self, symbol: str, version: str, rows: np.ndarray, meta: dict):
+        path = self._path(symbol, version)
+        tmp_path = path.with_suffix(".tmp.npy")
+        np.save(tmp_path, rows)
+        os.replace(tmp_path, path)  # Atomic swap, readers never see half a file
+
+        meta_path = self._meta_path(symbol, version)
+        tmp_meta = meta_path.with_suffix(".tmp.json")
+        with open(tmp_meta, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, meta_path)
+
+    def score(self, symbol: str, df: pd.DataFrame, model=None, version: str = None, force: bool = False) -> dict:
+        """
+        Brings the stored predictions for `symbol` up to date with `df` (raw OHLCV).
+        Only dates newer than the last stored one are scored. The whole history
+        is rescored when there's no valid file yet, the history start moved, the
+        scaler's statistics changed, or force.
+        """
+        model = model or registry.get_transformer()
+        if model is None:
+            return {"symbol": symbol, "error": "Universal Model not found."}
+        version = version or registry.model_version()
+
+        df = self.engine.features(symbol, df)
+        if len(df) <= LOOKBACK:
+            return {"symbol": symbol, "error": f"Only {len(df)} usable rows (need more than {LOOKBACK})."}
+        history_start = self.engine.first_date(symbol)
+        # The symbol's live scaler, as BacktestEngine and serving use it
+        scaler = feature_scalers.fit(symbol, df)
+        dates = _naive_dates(df['Date'])
+
+        existing = None
+        if not force and _valid(self.meta(symbol, version), version, history_start, scaler):
+            existing = self.read(symbol, version)
+        if existing is not None and len(existing):
+            first = max(LOOKBACK, int(np.searchsorted(dates, existing['Date'][-1], side='right')))
+            mode = "incremental"
+        else:
+            existing = None
+            first = LOOKBACK
+            mode = "full"
+
+        if first >= len(df):
+            return {"symbol": symbol, "mode": "up-to-date", "scored": 0, "rows": int(len(existing))}
+
+        # Only the tail the new windows need: day i is predicted from scaled[i-LOOKBACK:i]
+        scaled = scaler.transform(df[FEATURES].values[first - LOOKBACK:])
+        windows = np.lib.stride_tricks.sliding_window_view(scaled, LOOKBACK, axis=0).transpose(0, 2, 1)
+        pred_scaled = batch_forward(model, windows[:len(df) - first])
+        new_rows = np.empty(len(pred_scaled), dtype=PREDICTION_DTYPE)
+        new_rows['Date'] = dates[first:]
+        new_rows['Predicted'] = scaler.unscale_close(pred_scaled)
+
+        rows = np.concatenate([np.array(existing), new_rows]) if existing is not None else new_rows
+        self._write(symbol, version, rows, {
+            "model_version": version,
+            "history_start": _iso(history_start),
+            "scaler": scaler_key(scaler),
+            "first_date": pd.Timestamp(rows['Date'][0]).date().isoformat(),
+            "last_date": pd.Timestamp(rows['Date'][-1]).date().isoformat(),
+            "rows": int(len(rows)),
+            "scored_at": datetime.now(timezone.utc).isoformat(),
+        })
+        return {"symbol": symbol, "mode": mode, "scored": int(len(new_rows)), "rows": int(len(rows))}
+
+
+def _iso(date) -> str:
+    return pd.Timestamp(date).date().isoformat() if date is not None else None
+
+
+def scaler_key(scaler: FeatureScaler) -> str:
+    """Identifies a scaler's statistics (any new high/low changes every scaled window)."""
+    digest = hashlib.sha1(",".join(scaler.features).encode())
+    digest.update(np.ascontiguousarray(scaler.data_min_, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(scaler.data_max_, dtype=np.float64).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _valid(meta: dict, version: str, history_start, scaler: FeatureScaler) -> bool:
+    """Same weights, same history start (OBV is cumulative from the first bar) and same scaler."""
+    return (history_start is not None and scaler is not None and meta.get("model_version") == version
+            and meta.get("history_start") == _iso(history_start) and meta.get("scaler") == scaler_key(scaler))
+
+
+def _naive_dates(dates: pd.Series) -> np.ndarray:
+    dates = pd.to_datetime(dates)
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    return dates.to_numpy(dtype='datetime64[ns]')
+
+
+# Shared instance (one store per process)
+prediction_store = PredictionStore()
+
+
+def score_universe(symbols, force: bool = False):
+    """Batch job: prefetches every symbol's 5y history and brings its stored predictions up to date."""
+    from train_universe import prefetch
+
+    model = registry.get_transformer()
+    if model is None:
+        print("❌ Universal Model not found. Train it first (python -m app.ml.train --universal).")
+        return []
+    version = registry.model_version()
+    print(f"🧮 Scoring {len(symbols)} symbols with model {version}...")
+
+    start = time.time()
+    frames = prefetch(symbols)
+    results = []
+    for symbol in symbols:
+        df = frames.get(symbol)
+        if df is None or df.empty:
+            results.append({"symbol": symbol, "error": "No data found."})
+        else:
+            results.append(prediction_store.score(symbol, df, model=model, version=version, force=force))
+        r = results[-1]
+        if "error" in r:
+            print(f"   ⚠️ {symbol}: {r['error']}")
+        else:
+            print(f"   ✅ {symbol}: {r['mode']}, {r['scored']} scored, {r['rows']} stored")
+
+    failed = sum('error' in r for r in results)
+    print(f"🏁 Scored {len(symbols) - failed}/{len(symbols)} symbols in {time.time() - start:.1f}s")
+    return results
+
+
+def check_incremental(symbols) -> bool:
+    """
+    Scores each symbol's stored history minus its last bar into a scratch
+    store, then the full history: the second pass must append exactly one row
+    (mode "incremental") and leave the earlier rows untouched.
+    """
+    import tempfile
+    from app.services.bar_store import bar_store
+    from app.processing.incremental import IncrementalIndicatorEngine
+
+    model = registry.get_transformer()
+    if model is None:
+        print("❌ Universal Model not found. Train it first (python -m app.ml.train --universal).")
+        return False
+    version = registry.model_version()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PredictionStore(tmp, engine=IncrementalIndicatorEngine())
+        for symbol in symbols:
+            history = bar_store.read(symbol)
+            if history is None or len(history) <= LOOKBACK + 200:
+                print(f"   ⚠️ {symbol}: not enough stored bars, skipped")
+                continue
+            # Statistics over the full history first, so the last bar can't widen the scaler in between
+            feature_scalers.fit(symbol, store.engine.features(symbol, history))
+            before = store.score(symbol, history.iloc[:-1], model=model, version=version)
+            rows = np.array(store.read(symbol, version)) if "error" not in before else None
+            after = store.score(symbol, history, model=model, version=version)
+            passed = (rows is not None and after.get("mode") == "incremental" and after.get("scored") == 1
+                      and np.array_equal(store.read(symbol, version)[:len(rows)], rows))
+            ok &= passed
+            print(f"   {'✅' if passed else '❌'} {symbol}: {before.get('mode', before.get('error'))} -> "
+                  f"{after.get('mode', after.get('error'))}, {after.get('scored', 0)} scored")
+    return ok
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precompute the Universal Brain's historical predictions")
+    parser.add_argument("--symbols", nargs="+", default=None, help="Symbols to score (default: the training universe)")
+    parser.add_argument("--force", action="store_true", help="Rescore the full history even if it's up to date")
+    parser.add_argument("--check", action="store_true",
+                        help="Check that one appended bar is scored incrementally (scratch store, nothing written)")
+    args = parser.parse_args()
+
+    if args.symbols is None:
+        from train_universe import UNIVERSE
+        args.symbols = UNIVERSE
+    if args.check:
+        raise SystemExit(0 if check_incremental(args.symbols) else 1)
+    score_universe(args.symbols, force=args.force)
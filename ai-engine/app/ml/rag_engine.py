@@ -1,32 +1,49 @@
-from sentence_transformers import SentenceTransformer, util
 import numpy as np
+from app.ml.embedding_cache import EmbeddingCache, embedding_cache
 
 class RAGEngine:
     """
     The 'Semantic Brain' of Aladdin.
     Converts text into vectors to understand context, not just keywords.
     """
-    def __init__(self):
-        print("🧠 Loading RAG Embedding Model (MiniLM)...")
-        # We use a tiny, fast model designed for semantic search
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        
-        # Define 'Anchor Concepts' - We compare news against these ideas
-        self.positive_anchors = self.model.encode([
-            "Stock price surged significantly",
-            "Company reports record high profits",
-            "Strategic partnership announced",
-            "Market bullish and optimistic",
-            "Analyst upgrades rating to buy"
-        ])
-        
-        self.negative_anchors = self.model.encode([
-            "Stock price crashed heavily",
-            "Company files for bankruptcy or lawsuit",
-            "Quarterly earnings missed expectations",
-            "Market bearish and fearful",
-            "Analyst downgrades rating to sell"
-        ])
+    def __init__(self, cache: EmbeddingCache = None):
+        # Embeddings go through the shared content-hash cache (MiniLM loads on first miss)
+        self.cache = cache or embedding_cache
+        self._anchors = None
+
+    @property
+    def model(self):
+        return self.cache.model
+
+    @property
+    def positive_anchors(self):
+        return self._get_anchors()[0]
+
+    @property
+    def negative_anchors(self):
+        return self._get_anchors()[1]
+
+    def _get_anchors(self):
+        if self._anchors is None:
+            # Define 'Anchor Concepts' - We compare news against these ideas
+            # (persisted in the cache, so only the very first run encodes them)
+            positive = self.cache.encode([
+                "Stock price surged significantly",
+                "Company reports record high profits",
+                "Strategic partnership announced",
+                "Market bullish and optimistic",
+                "Analyst upgrades rating to buy"
+            ])
+            
+            negative = self.cache.encode([
+                "Stock price crashed heavily",
+                "Company files for bankruptcy or lawsuit",
+                "Quarterly earnings missed expectations",
+                "Market bearish and fearful",
+                "Analyst downgrades rating to sell"
+            ])
+            self._anchors = (_normalize(positive), _normalize(negative))
+        return self._anchors
 
     def analyze_semantic_sentiment(self, texts: list):
         """
@@ -35,24 +52,22 @@ class RAGEngine:
         """
         if not texts: return 0.0
         
-        # 1. Turn all headlines into vectors
-        news_vectors = self.model.encode(texts)
-        
-        total_sentiment = 0
-        
-        for vector in news_vectors:
-            # Calculate similarity to Positive Anchors
-            pos_score = util.cos_sim(vector, self.positive_anchors).max().item()
-            
-            # Calculate similarity to Negative Anchors
-            neg_score = util.cos_sim(vector, self.negative_anchors).max().item()
-            
-            # Net Sentiment for this headline
-            sentiment = pos_score - neg_score
-            total_sentiment += sentiment
+        # 1. Turn all headlines into vectors (cached ones are not re-encoded)
+        news_vectors = self.cache.encode(texts)
+        return self.score_vectors(news_vectors)
+
+    def score_vectors(self, news_vectors: np.ndarray) -> float:
+        """Sentiment of already-encoded headlines (cosine similarity vs anchors)."""
+        if len(news_vectors) == 0: return 0.0
+        positive, negative = self._get_anchors()
+        news_vectors = _normalize(news_vectors)
+
+        # Similarity of every headline to its closest Positive / Negative anchor
+        pos_score = (news_vectors @ positive.T).max(axis=1)
+        neg_score = (news_vectors @ negative.T).max(axis=1)
             
-        # Average the score across all headlines
-        avg_sentiment = total_sentiment / len(texts)
+        # Net Sentiment per headline, averaged across all headlines
+        avg_sentiment = float(np.mean(pos_score - neg_score))
         
         # Scale it a bit (Embeddings are usually subtle, between -0.2 and 0.2)
         final_score = avg_sentiment * 5 
@@ -60,6 +75,12 @@ class RAGEngine:
         # Cap between -1 and 1
         return max(-1.0, min(1.0, final_score))
 
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-8)
+
 # --- Quick Test Block ---
 if __name__ == "__main__":
     rag = RAGEngine()
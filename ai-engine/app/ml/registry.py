@@ -0,0 +1,184 @@
+import hashlib
+import pickle
+import threading
+import time
+from pathlib import Path
+
+import torch
+
+from app.ml.model import AladdinPricePredictor
+from app.ml.transformer_model import TimeSeriesTransformer
+
+MODELS_DIR = Path(__file__).resolve().parent / "models"
+
+# EXACT same params used in Colab training
+TRANSFORMER_CONFIG = dict(input_dim=5, d_model=128, nhead=8, num_layers=4)
+EMBEDDER_NAME = 'all-MiniLM-L6-v2'
+LOOKBACK = 60
+
+
+def load_weights(path: Path) -> dict:
+    """
+    Loads a state dict with its tensors memory-mapped from disk (no full read
+    + copy). Falls back to a regular load for legacy (non-zip) checkpoints.
+    """
+    try:
+        return torch.load(str(path), map_location=torch.device('cpu'), mmap=True, weights_only=True)
+    except (RuntimeError, TypeError, ValueError, pickle.UnpicklingError):
+        return torch.load(path, map_location=torch.device('cpu'))
+
+
+def _file_hash(path: Path) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+class ModelRegistry:
+    """
+    The 'Brain Bank'.
+    Every model (Universal Transformer, per-symbol LSTMs, MiniLM embedder) is
+    loaded at most once per process, on first use, and shared by all requests.
+    """
+
+    def __init__(self, models_dir: Path = MODELS_DIR, backend: str = None):
+        self.models_dir = Path(models_dir)
+        self.backend = backend
+        self.backend_report = None
+        self._weights_hash = None
+        self._models = {}
+        self._status = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    # --- Public getters ---
+
+    def get_transformer(self):
+        """
+        The Universal Brain on the configured inference backend (INFERENCE_BACKEND).
+        None if the weights are missing or broken.
+        """
+        return self._get("transformer", self._load_serving_transformer)
+
+    def get_reference_transformer(self):
+        """The plain fp32 eager Universal Brain (reference for the backend drift check)."""
+        return self._get("transformer:fp32", self._load_transformer)
+
+    def get_lstm(self, symbol: str):
+        """Legacy per-symbol LSTM (None if that symbol was never trained)."""
+        return self._get(f"lstm:{symbol}", lambda: self._load_lstm(symbol))
+
+    def get_embedder(self):
+        """Shared SentenceTransformer used by the RAG engine."""
+        return self._get("embedder", self._load_embedder)
+
+    def model_version(self) -> str:
+        """
+        Identifies the serving Universal Brain: weights content hash + inference backend.
+        Changes whenever new weights or a different backend are served ('none' until loaded).
+        Never loads or waits on the model lock, so it's safe to call on the event loop.
+        """
+        if self._models.get("transformer") is None:
+            return "none"
+        backend = (self.backend_report or {}).get("backend", "eager")
+        return f"{self._weights_hash}:{backend}"
+
+    def warm_up(self, include_embedder: bool = True):
+        """Loads the hot models and runs one dummy forward so the first real request is fast."""
+        model = self.get_transformer()
+        if model is not None:
+            start = time.time()
+            with torch.no_grad():
+                model(torch.zeros(1, LOOKBACK, TRANSFORMER_CONFIG['input_dim']))
+            self._status["transformer"]["warmup_seconds"] = round(time.time() - start, 3)
+            self._status["transformer"]["warm"] = True
+
+        if include_embedder:
+            embedder = self.get_embedder()
+            if embedder is not None:
+                embedder.encode(["warm up"])
+                self._status["embedder"]["warm"] = True
+
+    def readiness(self) -> dict:
+        """Ready once the Universal Brain is loaded and warmed up."""
+        transformer = self._status.get("transformer", {})
+        return {
+            "ready": bool(transformer.get("loaded") and transformer.get("warm")),
+            "models": dict(self._status),
+            "inference_backend": self.backend_report,
+        }
+
+    # --- Internals ---
+
+    def _get(self, key: str, loader):
+        if key in self._models:
+            return self._models[key]
+
+        with self._guard:
+            lock = self._locks.setdefault(key, threading.Lock())
+
+        # Per-model lock: loading MiniLM doesn't block the Transformer
+        with lock:
+            if key in self._models:
+                return self._models[key]
+
+            start = time.time()
+            try:
+                model = loader()
+            except Exception as e:
+                # Broken weights: remember the failure instead of retrying every request
+                print(f"⚠️ Failed to load {key}: {e}")
+                self._status[key] = {"loaded": False, "error": str(e)}
+                self._models[key] = None
+                return None
+
+            if model is None:
+                # Missing file: not cached, so a freshly trained model gets picked up
+                self._status[key] = {"loaded": False, "error": "weights not found"}
+                return None
+
+            print(f"🧠 Loaded {key} in {time.time() - start:.2f}s")
+            self._status[key] = {"loaded": True, "load_seconds": round(time.time() - start, 3)}
+            self._models[key] = model
+            return model
+
+    def _load_transformer(self):
+        path = self.models_dir / "universal_transformer.pth"
+        if not path.exists():
+            print(f"❌ Universal Model not found at {path}")
+            return None
+        model = TimeSeriesTransformer(**TRANSFORMER_CONFIG)
+        model.load_state_dict(load_weights(path))
+        model.eval()
+        self._weights_hash = _file_hash(path)
+        return model
+
+    def _load_serving_transformer(self):
+        # Imported lazily: backends imports this module
+        from app.ml.backends import select_backend, INFERENCE_BACKEND
+
+        reference = self.get_reference_transformer()
+        if reference is None:
+            return None
+        model, self.backend_report = select_backend(reference, self.backend or INFERENCE_BACKEND)
+        return model
+
+    def _load_lstm(self, symbol: str):
+        path = self.models_dir / f"{symbol}_lstm.pth"
+        if not path.exists():
+            return None
+        model = AladdinPricePredictor(input_dim=TRANSFORMER_CONFIG['input_dim'])
+        model.load_state_dict(load_weights(path))
+        model.eval()
+        return model
+
+    def _load_embedder(self):
+        # Imported lazily: sentence-transformers is slow to import
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(EMBEDDER_NAME)
+
+
+# Shared instance (one set of brains per process)
+registry = ModelRegistry()
@@ -1,11 +1,13 @@
 import torch
 import torch.nn as nn
 import numpy as np
-import pandas as pd
-from sklearn.preprocessing import MinMaxScaler
+import copy
+import os
+from torch.utils.data import Dataset, DataLoader, Subset, ConcatDataset
 from app.services.data_loader import MarketDataLoader
+from app.processing.incremental import indicator_engine
 from app.processing.indicators import TechnicalAnalyzer
-from app.ml.model import AladdinPricePredictor
+from app.processing.scaling import FeatureScaler, feature_scalers, FEATURES
 from app.ml.transformer_model import TimeSeriesTransformer
 import time
 
@@ -13,77 +15,187 @@ import time
 LOOKBACK = 60    # Look at past 60 days
 EPOCHS = 50      # How many times to study the data
 LR = 0.001       # Learning Rate (Speed of learning)
+BATCH_SIZE = int(os.getenv("TRAIN_BATCH_SIZE", "256"))   # Windows per gradient step
+NUM_WORKERS = int(os.getenv("TRAIN_NUM_WORKERS", "0"))   # DataLoader worker processes
+VAL_SPLIT = 0.1  # Last 10% of each series (by time) is held out for validation
+PATIENCE = 5     # Stop after this many epochs without a better validation loss
 
-def prepare_data(df):
-    """Turns raw data into 'Sequences' for the LSTM"""
+UNIVERSAL_MODEL_PATH = "app/ml/models/universal_transformer.pth"
+
+def model_path_for(symbol: str) -> str:
+    """Where train_model saves a symbol's Transformer."""
+    return f"app/ml/models/{symbol}_transformer.pth"
+
+class WindowedDataset(Dataset):
+    """
+    Sliding 60-day windows over one contiguous float32 array.
+    Each sample is a view into that array (no per-window copy), so memory
+    stays at the size of the raw series instead of ~LOOKBACK times it.
+    Sample i: input = rows [i, i+LOOKBACK), target = Close (column 0) of row i+LOOKBACK.
+    """
+
+    def __init__(self, data: np.ndarray, lookback: int = LOOKBACK):
+        self.data = torch.from_numpy(np.ascontiguousarray(data, dtype=np.float32))
+        self.lookback = lookback
+
+    def __len__(self):
+        return max(0, len(self.data) - self.lookback)
+
+    def __getitem__(self, i):
+        return self.data[i:i + self.lookback], self.data[i + self.lookback, 0:1]
+
+def prepare_data(df, symbol: str = None):
+    """
+    Turns raw data into a windowed Dataset of 'Sequences' (plus the scaler).
+    With a symbol, features come from the same incremental engine as serving
+    (OBV anchored at the first stored bar) and its stored scaler is updated and
+    used, so a training window and a serving window for the same dates match.
+    """
     # 1. Add Technical Indicators
-    ta = TechnicalAnalyzer()
-    df = ta.add_all_indicators(df)
+    df = indicator_engine.features(symbol, df) if symbol else TechnicalAnalyzer().add_all_indicators(df)
     
     # 2. Select Features (What the AI sees)
-    features = ['Close', 'RSI', 'SMA_50', 'SMA_200', 'OBV']
-    data = df[features].values
+    data = df[FEATURES].values
     
     # 3. Scale Data (Normalize between 0 and 1)
-    scaler = MinMaxScaler(feature_range=(0, 1))
-    scaled_data = scaler.fit_transform(data)
+    scaler = feature_scalers.fit(symbol, df) if symbol else FeatureScaler.from_frame(df, FEATURES)
+    scaled_data = scaler.transform(data)
     
-    # 4. Create Sequences (Sliding Window)
-    X, y = [], []
-    for i in range(LOOKBACK, len(scaled_data)):
-        # Input: Day (i-60) to Day (i-1)
-        X.append(scaled_data[i-LOOKBACK:i])
-        # Target: Day (i) Close Price (index 0)
-        y.append(scaled_data[i, 0]) 
-        
-    return np.array(X), np.array(y), scaler
-
-def train_model(symbol="RELIANCE.NS"):
+    # 4. Sliding windows are views into the scaled array (built lazily per batch)
+    return WindowedDataset(scaled_data), scaler
+
+def time_split(dataset: WindowedDataset, val_split: float = VAL_SPLIT):
+    """Chronological train/validation split: the validation windows are the most recent ones."""
+    n_val = int(len(dataset) * val_split)
+    n_train = len(dataset) - n_val
+    return Subset(dataset, range(n_train)), Subset(dataset, range(n_train, len(dataset)))
+
+def evaluate(model, loader, criterion):
+    model.eval()
+    total, count = 0.0, 0
+    with torch.no_grad():
+        for X, y in loader:
+            total += criterion(model(X), y).item() * len(X)
+            count += len(X)
+    return total / count if count else float("nan")
+
+def fit(model, datasets, epochs=EPOCHS, batch_size=BATCH_SIZE, num_workers=NUM_WORKERS, patience=PATIENCE):
+    """
+    Mini-batch training over one or more WindowedDatasets with early stopping.
+    Every dataset is split by time, so validation never sees windows older than training.
+    Restores (and returns) the weights with the best validation loss.
+    """
+    splits = [time_split(ds) for ds in datasets]
+    train_set = ConcatDataset([tr for tr, _ in splits])
+    val_set = ConcatDataset([va for _, va in splits])
+
+    train_loader = DataLoader(train_set, batch_size=batch_size, shuffle=True, num_workers=num_workers)
+    val_loader = DataLoader(val_set, batch_size=batch_size, num_workers=num_workers) if len(val_set) else None
+
+    criterion = nn.MSELoss() # Loss function (Mean Squared Error)
+    optimizer = torch.optim.Adam(model.parameters(), lr=LR)
+
+    print(f"🧠 Training on {len(train_set)} sequences ({len(val_set)} held out for validation)...")
+    best_loss, best_state, stale = float("inf"), None, 0
+
+    for epoch in range(epochs):
+        model.train()
+        running = 0.0
+        for X, y in train_loader:
+            loss = criterion(model(X), y)
+
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            running += loss.item() * len(X)
+        train_loss = running / len(train_set)
+
+        # Without a validation set (tiny series), fall back to the training loss
+        val_loss = evaluate(model, val_loader, criterion) if val_loader else train_loss
+
+        if (epoch+1) % 10 == 0:
+            print(f"   Epoch [{epoch+1}/{epochs}], Loss: {train_loss:.6f}, Val Loss: {val_loss:.6f}")
+
+        if val_loss < best_loss:
+            best_loss, best_state, stale = val_loss, copy.deepcopy(model.state_dict()), 0
+        else:
+            stale += 1
+            if stale >= patience:
+                print(f"   ⏹️ Early stop at epoch {epoch+1} (best Val Loss: {best_loss:.6f})")
+                break
+
+    if best_state is not None:
+        model.load_state_dict(best_state)
+    return model
+
+def train_model(symbol="RELIANCE.NS", df=None):
+    """
+    Trains and saves a Transformer for one symbol.
+    `df` can be passed in when the data was already fetched (e.g. prefetched by train_universe).
+    Returns the saved model path, or None if there was no data.
+    """
     print(f"🎓 Starting Training Session for {symbol}...")
     
     # 1. Get Data
-    loader = MarketDataLoader()
-    df = loader.get_stock_data(symbol, period="5y") # 5 Years of history
+    if df is None:
+        loader = MarketDataLoader()
+        df = loader.get_stock_data(symbol, period="5y") # 5 Years of history
     
-    if df is None: return
+    if df is None: return None
     
     # 2. Prepare Data
-    X, y, scaler = prepare_data(df)
-    
-    # Convert to PyTorch Tensors
-    X_train = torch.from_numpy(X).float()
-    y_train = torch.from_numpy(y).float()
+    dataset, scaler = prepare_data(df, symbol)
+    if len(dataset) == 0: return None
     
     # 3. Initialize Model
-    model = TimeSeriesTransformer(input_dim=X.shape[2])
-    criterion = nn.MSELoss() # Loss function (Mean Squared Error)
-    optimizer = torch.optim.Adam(model.parameters(), lr=LR)
+    model = TimeSeriesTransformer(input_dim=len(FEATURES))
     
     # 4. Training Loop
-    print(f"🧠 Training on {len(X)} sequences...")
     start_time = time.time()
-    
-    for epoch in range(EPOCHS):
-        model.train()
-        outputs = model(X_train)
-        loss = criterion(outputs, y_train.unsqueeze(1))
-        
-        optimizer.zero_grad()
-        loss.backward()
-        optimizer.step()
-        
-        if (epoch+1) % 10 == 0:
-            print(f"   Epoch [{epoch+1}/{EPOCHS}], Loss: {loss.item():.6f}")
-            
+    fit(model, [dataset])
     print(f"✅ Training Complete in {time.time() - start_time:.2f}s")
     
     # Save the trained brain
-    torch.save(model.state_dict(), f"app/ml/models/{symbol}_transformer.pth")
-    print(f"💾 Transformer Model saved to app/ml/models/{symbol}_transformer.pth")
+    model_path = model_path_for(symbol)
+    # Atomic swap: train_universe skips symbols whose file exists, so never leave a partial one
+    tmp_path = model_path + ".tmp"
+    torch.save(model.state_dict(), tmp_path)
+    os.replace(tmp_path, model_path)
+    print(f"💾 Transformer Model saved to {model_path}")
+    return model_path
+
+def train_universal(symbols, model_path=UNIVERSAL_MODEL_PATH):
+    """
+    Trains the Universal Brain on many assets at once.
+    Each symbol is scaled on its own history; only the raw float32 series are kept in memory.
+    """
+    from app.ml.registry import TRANSFORMER_CONFIG
+
+    print(f"🌍 Training Universal Brain on {len(symbols)} assets...")
+    loader = MarketDataLoader()
+    datasets = []
+    for symbol in symbols:
+        df = loader.get_stock_data(symbol, period="5y")
+        if df is None or df.empty:
+            print(f"⚠️ No data for {symbol}. Skipping.")
+            continue
+        dataset, _ = prepare_data(df, symbol)
+        if len(dataset):
+            datasets.append(dataset)
+
+    if not datasets: return None
+
+    model = TimeSeriesTransformer(**TRANSFORMER_CONFIG)
+    start_time = time.time()
+    fit(model, datasets)
+    print(f"✅ Training Complete in {time.time() - start_time:.2f}s")
+
+    torch.save(model.state_dict(), model_path)
+    print(f"💾 Universal Brain saved to {model_path}")
+    return model_path
 
 if __name__ == "__main__":
     import argparse
-    import os
     
     # Create the models folder if it doesn't exist
     os.makedirs("app/ml/models", exist_ok=True)
@@ -91,6 +203,11 @@ if __name__ == "__main__":
     # Allow passing arguments from command line
     parser = argparse.ArgumentParser()
     parser.add_argument("--symbol", type=str, default="RELIANCE.NS", help="Stock/Crypto symbol to train")
+    parser.add_argument("--universal", nargs="*", default=None, help="Train the Universal Brain on these symbols (default: the training universe)")
     args = parser.parse_args()
     
-    train_model(args.symbol)
\ No newline at end of file
+    if args.universal is not None:
+        from train_universe import UNIVERSE
+        train_universal(args.universal or UNIVERSE)
+    else:
+        train_model(args.symbol)
\ No newline at end of file
@@ -0,0 +1,359 @@
+import math
+import os
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from app.services.bar_store import bar_store
+
+# Rebuild running sums from the raw window every N bars so float drift
+# from repeated add/subtract never accumulates.
+RESYNC_EVERY = 1000
+# Symbols whose full-history indicator rows are kept in memory (least recently used evicted)
+FEATURE_CACHE_SYMBOLS = int(os.getenv("FEATURE_CACHE_SYMBOLS", "1024"))
+
+
+class IncrementalAnalyzer:
+    """
+    Streaming twin of TechnicalAnalyzer for ONE symbol.
+    Keeps rolling sums, EMA states and the OBV accumulator, so each new bar
+    updates every indicator in O(1) instead of reprocessing the history.
+    Values match TechnicalAnalyzer.add_all_indicators (before its dropna).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.prev_close = None
+
+        # Last 200 closes cover SMA_50, SMA_200 and the 20-day Bollinger window
+        self.closes = deque(maxlen=200)
+        self.sum_20 = 0.0
+        self.sum_50 = 0.0
+        self.sum_200 = 0.0
+
+        # RSI (14): rolling means of gains and losses
+        self.gains = deque(maxlen=14)
+        self.losses = deque(maxlen=14)
+        self.gain_sum = 0.0
+        self.loss_sum = 0.0
+
+        # MACD (12, 26, 9) EMA states (adjust=False)
+        self.ema_12 = None
+        self.ema_26 = None
+        self.ema_signal = None
+
+        # OBV accumulator
+        self.obv = 0.0
+
+        # Enough to roll back the latest bar (see revise)
+        self._undo = None
+
+    def update(self, bar: dict) -> dict:
+        """
+        Feeds one NEW bar (needs 'Close' and 'Volume', other keys are passed through)
+        and returns the bar with all indicator columns added.
+        """
+        self._undo = self._undo_record()
+        close = float(bar['Close'])
+        volume = float(bar['Volume'])
+        delta = close - self.prev_close if self.prev_close is not None else None
+
+        # 1. Rolling windows (value leaving each window is read before the append)
+        self._push_close(close)
+
+        # 2. RSI inputs (first bar has no delta and counts as 0 gain / 0 loss, like pandas)
+        gain = delta if delta is not None and delta > 0 else 0.0
+        loss = -delta if delta is not None and delta < 0 else 0.0
+        if len(self.gains) == self.gains.maxlen:
+            self.gain_sum -= self.gains[0]
+            self.loss_sum -= self.losses[0]
+        self.gains.append(gain)
+        self.losses.append(loss)
+        self.gain_sum += gain
+        self.loss_sum += loss
+
+        # 3. EMAs
+        self.ema_12 = self._ema(self.ema_12, close, 12)
+        self.ema_26 = self._ema(self.ema_26, close, 26)
+        macd = self.ema_12 - self.ema_26
+        self.ema_signal = self._ema(self.ema_signal, macd, 9)
+
+        # 4. OBV
+        if delta is not None:
+            self.obv += math.copysign(volume, delta) if delta != 0 else 0.0
+
+        self.prev_close = close
+        self.count += 1
+        if self.count % RESYNC_EVERY == 0:
+            self._resync()
+
+        return {**bar, **self.current(macd)}
+
+    def revise(self, bar: dict) -> dict:
+        """
+        Replaces the latest bar (e.g. today's intraday bar got a new price).
+        Rolls the last update back in O(1) and applies the revised bar.
+        """
+        if self._undo is None:
+            raise ValueError("No bar to revise")
+        self._rollback(self._undo)
+        return self.update(bar)
+
+    def current(self, macd: float = None) -> dict:
+        """Indicator values for the latest bar (NaN while a window is still filling)."""
+        nan = float('nan')
+        n = len(self.closes)
+        if macd is None:
+            macd = self.ema_12 - self.ema_26 if self.ema_12 is not None else nan
+
+        sma_50 = self.sum_50 / 50 if n >= 50 else nan
+        sma_200 = self.sum_200 / 200 if n >= 200 else nan
+
+        rsi = 50.0
+        if len(self.gains) == 14:
+            avg_gain = self.gain_sum / 14
+            avg_loss = self.loss_sum / 14
+            if avg_loss > 0:
+                rsi = 100 - (100 / (1 + avg_gain / avg_loss))
+            elif avg_gain > 0:
+                rsi = 100.0
+
+        if n >= 20:
+            sma_20 = self.sum_20 / 20
+            # Two-pass variance over the fixed 20-bar window: still O(1), and
+            # avoids the cancellation a running sum of squares has on flat prices
+            var_20 = sum((c - sma_20) ** 2 for c in islice(reversed(self.closes), 20)) / 19
+            std_20 = math.sqrt(var_20)
+            bbl, bbu = sma_20 - std_20 * 2, sma_20 + std_20 * 2
+        else:
+            bbl = bbu = nan
+
+        signal = self.ema_signal if self.ema_signal is not None else nan
+        return {
+            'SMA_50': sma_50,
+            'SMA_200': sma_200,
+            'RSI': rsi,
+            'MACD': macd,
+            'MACD_signal': signal,
+            'MACDh_12_26_9': macd - signal,
+            'BBL_20_2.0': bbl,
+            'BBU_20_2.0': bbu,
+            'OBV': self.obv,
+        }
+
+    def warm_up(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Seeds the state from history. Returns the same rows add_all_indicators would (before dropna)."""
+        rows = [self.update(bar) for bar in df.to_dict('records')]
+        return pd.DataFrame(rows, index=df.index)
+
+    # --- State ---
+
+    def snapshot(self) -> dict:
+        """JSON-serializable copy of the full state."""
+        return {
+            'count': self.count,
+            'prev_close': self.prev_close,
+            'closes': list(self.closes),
+            'gains': list(self.gains),
+            'losses': list(self.losses),
+            'ema_12': self.ema_12,
+            'ema_26': self.ema_26,
+            'ema_signal': self.ema_signal,
+            'obv': self.obv,
+            'undo': self._undo,
+        }
+
+    @classmethod
+    def restore(cls, state: dict) -> "IncrementalAnalyzer":
+        analyzer = cls()
+        analyzer.count = state['count']
+        analyzer.prev_close = state['prev_close']
+        analyzer.closes.extend(state['closes'])
+        analyzer.gains.extend(state['gains'])
+        analyzer.losses.extend(state['losses'])
+        analyzer.ema_12 = state['ema_12']
+        analyzer.ema_26 = state['ema_26']
+        analyzer.ema_signal = state['ema_signal']
+        analyzer.obv = state['obv']
+        analyzer._resync()
+        analyzer._undo = state.get('undo')
+        return analyzer
+
+    # --- Internals ---
+
+    def _push_close(self, close: float):
+        closes = self.closes
+        n = len(closes)
+        if n >= 20:
+            self.sum_20 -= closes[-20]
+        if n >= 50:
+            self.sum_50 -= closes[-50]
+        if n >= 200:
+            self.sum_200 -= closes[0]
+
+        closes.append(close)
+        self.sum_20 += close
+        self.sum_50 += close
+        self.sum_200 += close
+
+    def _undo_record(self) -> dict:
+        # Items that the next append will evict from each full window
+        return {
+            'evicted_close': self.closes[0] if len(self.closes) == self.closes.maxlen else None,
+            'evicted_gain': self.gains[0] if len(self.gains) == self.gains.maxlen else None,
+            'evicted_loss': self.losses[0] if len(self.losses) == self.losses.maxlen else None,
+            'count': self.count,
+            'prev_close': self.prev_close,
+            'ema_12': self.ema_12,
+            'ema_26': self.ema_26,
+            'ema_signal': self.ema_signal,
+            'obv': self.obv,
+        }
+
+    def _rollback(self, undo: dict):
+        self.closes.pop()
+        self.gains.pop()
+        self.losses.pop()
+        if undo['evicted_close'] is not None:
+            self.closes.appendleft(undo['evicted_close'])
+        if undo['evicted_gain'] is not None:
+            self.gains.appendleft(undo['evicted_gain'])
+            self.losses.appendleft(undo['evicted_loss'])
+        for key in ('count', 'prev_close', 'ema_12', 'ema_26', 'ema_signal', 'obv'):
+            setattr(self, key, undo[key])
+        self._undo = None
+        self._resync()
+
+    def _resync(self):
+        closes = list(self.closes)
+        self.sum_20 = sum(closes[-20:])
+        self.sum_50 = sum(closes[-50:])
+        self.sum_200 = sum(closes[-200:])
+        self.gain_sum = sum(self.gains)
+        self.loss_sum = sum(self.losses)
+
+    @staticmethod
+    def _ema(prev, value, span):
+        if prev is None:
+            return value
+        alpha = 2 / (span + 1)
+        return prev + alpha * (value - prev)
+
+
+class IncrementalIndicatorEngine:
+    """
+    Keeps one IncrementalAnalyzer per symbol for live feeds and intraday refreshes.
+
+    features() is the store-backed path used by /predict, reports, backtests
+    and the prediction store: indicators are computed over the symbol's FULL
+    stored history, so cumulative ones (OBV) start at a fixed first bar rather
+    than at the requested period's start. Rows are kept in memory and a call
+    only folds in the bars added since the last one (revising the last bar if
+    it changed); the history is replayed only when stored bars were rewritten.
+    """
+
+    def __init__(self, max_symbols: int = FEATURE_CACHE_SYMBOLS, store=None):
+        self.analyzers = {}
+        self.max_symbols = max_symbols
+        self.store = store or bar_store
+        self._rows = OrderedDict()  # symbol -> indicator rows for the bars its analyzer has seen
+        self._locks = {}
+        self._guard = threading.Lock()
+        self.appended = 0
+        self.rebuilt = 0
+
+    def warm_up(self, symbol: str, df: pd.DataFrame) -> pd.DataFrame:
+        """(Re)builds a symbol's state from its history."""
+        analyzer = IncrementalAnalyzer()
+        out = analyzer.warm_up(df)
+        self.analyzers[symbol] = analyzer
+        self._rows[symbol] = out
+        return out
+
+    def update(self, symbol: str, bar: dict) -> dict:
+        if symbol not in self.analyzers:
+            self.analyzers[symbol] = IncrementalAnalyzer()
+        self._rows.pop(symbol, None)  # Fed outside features(): its rows no longer match the state
+        return self.analyzers[symbol].update(bar)
+
+    def features(self, symbol: str, df: pd.DataFrame, interval: str = "1d") -> pd.DataFrame:
+        """
+        Indicator frame for `df` (a period read from the bar store by
+        MarketDataLoader), computed over the symbol's full stored history and
+        trimmed to df's first date. Same columns and rows as
+        TechnicalAnalyzer.add_all_indicators(...).dropna().
+        """
+        history = self.store.read(symbol, interval)
+        if history is None or history.empty or history['Date'].iloc[-1] != df['Date'].iloc[-1]:
+            history = df  # Not (or no longer) what the store holds: use what we were given
+        rows = self.history_rows(symbol, history)
+
+        # Same cleanup as add_all_indicators, then back to the requested period
+        rows = rows.dropna() if len(rows) > 60 else rows.bfill()
+        return rows[rows['Date'] >= df['Date'].iloc[0]].reset_index(drop=True)
+
+    def history_rows(self, symbol: str, history: pd.DataFrame) -> pd.DataFrame:
+        """Indicator rows (before dropna) for every bar of `history`, reusing the previous call's work."""
+        # NaN prices would poison the running sums; such bars (a half-written live bar) are skipped
+        history = history.dropna(subset=['Close', 'Volume']).reset_index(drop=True)
+
+        with self._lock(symbol):
+            rows, analyzer = self._rows.get(symbol), self.analyzers.get(symbol)
+            seen = len(rows) if rows is not None else 0
+            if analyzer is None or not 0 < seen <= len(history) or not _same_bars(rows, history, seen - 1):
+                analyzer = IncrementalAnalyzer()
+                rows = analyzer.warm_up(history)
+                self.rebuilt += 1
+            else:
+                records = history.iloc[seen - 1:].to_dict('records')
+                if not _same_bars(rows.iloc[seen - 1:], history.iloc[seen - 1:seen], 1):
+                    # The last bar was still forming when we saw it
+                    rows = pd.concat([rows.iloc[:seen - 1], pd.DataFrame([analyzer.revise(records[0])])],
+                                     ignore_index=True)
+                if len(records) > 1:
+                    rows = pd.concat([rows, pd.DataFrame([analyzer.update(bar) for bar in records[1:]])],
+                                     ignore_index=True)
+                    self.appended += len(records) - 1
+
+            self.analyzers[symbol] = analyzer
+            self._rows[symbol] = rows
+            self._rows.move_to_end(symbol)
+            while len(self._rows) > self.max_symbols:
+                evicted, _ = self._rows.popitem(last=False)
+                self.analyzers.pop(evicted, None)
+            return rows
+
+    def first_date(self, symbol: str):
+        """First bar of the history features() last used for symbol (where OBV starts), or None."""
+        rows = self._rows.get(symbol)
+        return rows['Date'].iloc[0] if rows is not None and len(rows) else None
+
+    def _lock(self, symbol: str) -> threading.Lock:
+        with self._guard:
+            if symbol not in self._locks:
+                self._locks[symbol] = threading.Lock()
+            return self._locks[symbol]
+
+    def snapshot(self) -> dict:
+        return {symbol: analyzer.snapshot() for symbol, analyzer in self.analyzers.items()}
+
+    def restore(self, state: dict):
+        self.analyzers = {symbol: IncrementalAnalyzer.restore(s) for symbol, s in state.items()}
+        self._rows.clear()
+
+
+def _same_bars(a: pd.DataFrame, b: pd.DataFrame, count: int) -> bool:
+    """True if the first `count` bars of a and b have the same date, close and volume."""
+    if count <= 0:
+        return True
+    for column in ('Date', 'Close', 'Volume'):
+        if not np.array_equal(a[column].to_numpy()[:count], b[column].to_numpy()[:count]):
+            return False
+    return True
+
+
+# Shared instance (one per process)
+indicator_engine = IncrementalIndicatorEngine()
@@ -0,0 +1,200 @@
+import copy
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.services.bar_store import bar_store
+
+FEATURES = ['Close', 'RSI', 'SMA_50', 'SMA_200', 'OBV']
+# Bumped when the features' definition changes (2: OBV accumulated from the first stored bar)
+SCALER_FORMAT = 2
+
+
+class FeatureScaler:
+    """
+    Min/max scaling of the model FEATURES for ONE symbol.
+    The statistics cover every feature row seen so far (first_date..last_date)
+    and only grow: update() folds in rows outside that range, so a new bar
+    costs O(new rows) instead of a refit over the whole history. Attribute
+    names and math match sklearn's MinMaxScaler(feature_range=(0, 1)).
+    """
+
+    def __init__(self, data_min=None, data_max=None, first_date=None, last_date=None, features: list = FEATURES):
+        self.features = list(features)
+        self.data_min_ = np.asarray(data_min, dtype=np.float64) if data_min is not None else None
+        self.data_max_ = np.asarray(data_max, dtype=np.float64) if data_max is not None else None
+        self.first_date = pd.Timestamp(first_date) if first_date is not None else None
+        self.last_date = pd.Timestamp(last_date) if last_date is not None else None
+        self._derive()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, features: list = FEATURES):
+        """One-off (not persisted) scaler fitted on df, like MinMaxScaler().fit (a Date column is optional)."""
+        if 'Date' in df.columns:
+            scaler = cls(features=features)
+            scaler.update(df)
+            return scaler
+        values = df[list(features)].to_numpy(dtype=np.float64)
+        with np.errstate(all="ignore"):
+            return cls(np.nanmin(values, axis=0), np.nanmax(values, axis=0), features=features)
+
+    def _derive(self):
+        if self.data_min_ is None:
+            self.scale_ = self.min_ = None
+            return
+        data_range = self.data_max_ - self.data_min_
+        # Constant features: same as sklearn (range treated as 1)
+        data_range = np.where(data_range == 0, 1.0, data_range)
+        self.scale_ = 1.0 / data_range
+        self.min_ = -self.data_min_ * self.scale_
+
+    @property
+    def fitted(self) -> bool:
+        return self.data_min_ is not None
+
+    def update(self, df: pd.DataFrame) -> bool:
+        """
+        Folds the rows of df (Date + FEATURES) that the statistics don't cover yet:
+        dates after last_date (new bars, the last bar re-read in case it was
+        partial) and dates before first_date (a longer history). Returns True if
+        the statistics changed.
+        """
+        dates = _naive_dates(df['Date'])
+        if self.fitted:
+            mask = (dates >= self.last_date.to_datetime64()) | (dates < self.first_date.to_datetime64())
+            if not mask.any():
+                return False
+            values, dates = df[self.features].to_numpy(dtype=np.float64)[mask], dates[mask]
+        else:
+            values = df[self.features].to_numpy(dtype=np.float64)
+        if len(values) == 0:
+            return False
+
+        # NaN rows (indicator warm-up) are ignored, like MinMaxScaler
+        with np.errstate(all="ignore"):
+            new_min, new_max = np.nanmin(values, axis=0), np.nanmax(values, axis=0)
+        if np.isnan(new_min).all():
+            return False
+        if self.fitted:
+            new_min = np.fmin(self.data_min_, new_min)
+            new_max = np.fmax(self.data_max_, new_max)
+
+        changed = not self.fitted or not (np.array_equal(new_min, self.data_min_) and np.array_equal(new_max, self.data_max_))
+        old_last = self.last_date
+        first, last = pd.Timestamp(dates.min()), pd.Timestamp(dates.max())
+        self.first_date = min(first, self.first_date) if self.first_date is not None else first
+        self.last_date = max(last, self.last_date) if self.last_date is not None else last
+        self.data_min_, self.data_max_ = new_min, new_max
+        self._derive()
+        return changed or self.last_date != old_last
+
+    def transform(self, values: np.ndarray) -> np.ndarray:
+        """[rows, features] -> scaled (values outside the seen range fall outside [0, 1])."""
+        return np.asarray(values, dtype=np.float64) * self.scale_ + self.min_
+
+    def scale_close(self, close):
+        return np.asarray(close, dtype=np.float64) * self.scale_[0] + self.min_[0]
+
+    def unscale_close(self, scaled):
+        """Inverse of the Close column only (no dummy feature rows)."""
+        return (np.asarray(scaled, dtype=np.float64) - self.min_[0]) / self.scale_[0]
+
+    def to_dict(self) -> dict:
+        return {
+            "features": self.features,
+            "data_min": self.data_min_.tolist() if self.fitted else None,
+            "data_max": self.data_max_.tolist() if self.fitted else None,
+            "first_date": self.first_date.isoformat() if self.first_date is not None else None,
+            "last_date": self.last_date.isoformat() if self.last_date is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data.get("data_min"), data.get("data_max"), data.get("first_date"), data.get("last_date"),
+                   data.get("features", FEATURES))
+
+
+def _naive_dates(dates: pd.Series) -> np.ndarray:
+    if not pd.api.types.is_datetime64_dtype(dates):
+        dates = pd.to_datetime(dates)
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+    return dates.to_numpy(dtype='datetime64[ns]')
+
+
+class ScalerStore:
+    """
+    Per-symbol FeatureScalers, persisted as JSON next to the bars
+    (data/historical/<symbol>_scaler.json) and cached in memory.
+    """
+
+    def __init__(self, root: Path = None):
+        self._root = Path(root) if root is not None else None
+        self._scalers = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    @property
+    def root(self) -> Path:
+        # Follows the bar store unless given its own directory
+        return self._root or bar_store.root
+
+    def _path(self, symbol: str) -> Path:
+        return self.root / (re.sub(r'[^A-Za-z0-9._-]', '_', symbol) + "_scaler.json")
+
+    def _lock(self, symbol: str) -> threading.Lock:
+        with self._guard:
+            if symbol not in self._locks:
+                self._locks[symbol] = threading.Lock()
+            return self._locks[symbol]
+
+    def get(self, symbol: str) -> FeatureScaler:
+        """The stored scaler (unfitted if the symbol was never seen)."""
+        scaler = self._scalers.get(symbol)
+        if scaler is None:
+            scaler = self._load(symbol)
+            self._scalers[symbol] = scaler
+        return scaler
+
+    def fit(self, symbol: str, df: pd.DataFrame) -> FeatureScaler:
+        """Updates the symbol's statistics with any rows of df they don't cover, then returns the scaler."""
+        with self._lock(symbol):
+            # Copy-on-write: a scaler other threads already hold never changes under them
+            scaler = copy.deepcopy(self.get(symbol))
+            if not scaler.update(df):
+                return self.get(symbol)
+            self._save(symbol, scaler)
+            self._scalers[symbol] = scaler
+            return scaler
+
+    def reset(self, symbol: str):
+        with self._lock(symbol):
+            self._scalers.pop(symbol, None)
+            self._path(symbol).unlink(missing_ok=True)
+
+    def _load(self, symbol: str) -> FeatureScaler:
+        path = self._path(symbol)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("features") == FEATURES and data.get("format") == SCALER_FORMAT:
+                return FeatureScaler.from_dict(data)
+        except (OSError, ValueError):
+            pass
+        return FeatureScaler()
+
+    def _save(self, symbol: str, scaler: FeatureScaler):
+        path = self._path(symbol)
+        tmp_path = path.with_suffix(".tmp.json")
+        with open(tmp_path, "w") as f:
+            json.dump({**scaler.to_dict(), "format": SCALER_FORMAT}, f)
+        os.replace(tmp_path, path)  # Atomic swap
+
+
+# Shared instance (one per process; the JSON files are shared)
+feature_scalers = ScalerStore()
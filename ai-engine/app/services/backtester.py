@@ -1,33 +1,122 @@
-import pandas as pd
+import asyncio
 import numpy as np
 import torch
-from sklearn.preprocessing import MinMaxScaler
 import os
-from datetime import datetime
 
 # Imports
 from app.services.data_loader import MarketDataLoader
 from app.processing.indicators import TechnicalAnalyzer
-from app.ml.model import AladdinPricePredictor 
-from app.ml.transformer_model import TimeSeriesTransformer
+from app.processing.incremental import indicator_engine
+from app.processing.scaling import FeatureScaler, feature_scalers
+from app.ml.inference import batch_forward
+from app.ml.registry import registry
+from app.ml.prediction_store import prediction_store
+from app.services.executor import executor
+
+# (threshold, holding rule) pairs evaluated per CPU-pool task in a sweep
+SWEEP_CHUNK_SIZE = 64
+
+# Where the vectorized simulations get historical predictions:
+# "store" reads the precomputed prediction store (python -m app.ml.prediction_store)
+# and falls back to inference on a miss, "model" always runs inference
+PREDICTION_SOURCES = ("store", "model")
+PREDICTION_SOURCE = os.getenv("BACKTEST_PREDICTIONS", "store")
 
 class BacktestEngine:
-    def __init__(self, initial_capital=1000):
+    def __init__(self, initial_capital=1000, source: str = PREDICTION_SOURCE):
         self.loader = MarketDataLoader()
         self.ta = TechnicalAnalyzer()
         self.initial_capital = initial_capital
+        self.source = source
         self.features = ['Close', 'RSI', 'SMA_50', 'SMA_200', 'OBV']
         
-    async def run_backtest(self, symbol: str, days: int = 180, capital: float = None):
+    async def run_backtest(self, symbol: str, days: int = 180, capital: float = None, vectorized: bool = True):
+        """
+        vectorized=True scores the whole window in batched passes (fast path);
+        vectorized=False keeps the original day-by-day loop as a reference.
+        """
         start_money = float(capital) if capital is not None and capital > 0 else self.initial_capital
         print(f"⏳ Starting Backtest for {symbol} with ₹{start_money}...")
         
-        # 1. Fetch Data
-        df = self.loader.get_stock_data(symbol, period="5y")
+        # 1. Fetch Data (off the event loop)
+        df = await executor.run("download", self.loader.get_stock_data, symbol, period="5y")
         
         if df is None or df.empty:
             return {"error": "No data found for this stock."}
 
+        # Indicators, scaling and simulation are CPU work: run them on the backtest stage
+        return await executor.run("backtest", self.simulate, symbol, df, days, start_money, vectorized)
+
+    async def run_sweep(self, symbols: list, thresholds: list, holding_rules: list, days: int = 180, capital: float = None):
+        """
+        Backtests every (symbol, threshold, holding rule) combination.
+        Data is downloaded and the model is run ONCE per symbol; the grid is then
+        evaluated in chunks on the CPU pool (a process pool when ENGINE_PROCESSES > 0).
+        Returns a table ranked by return (then smaller drawdown).
+        """
+        start_money = float(capital) if capital is not None and capital > 0 else self.initial_capital
+        for rule in holding_rules:
+            parse_holding_rule(rule)  # Fail fast on a bad rule
+        params = [(float(t), rule) for t in thresholds for rule in holding_rules]
+        print(f"🧪 Sweeping {len(symbols)} symbols x {len(params)} parameter sets...")
+
+        # 1. Fetch all symbols concurrently, then one batched prediction pass per symbol
+        series, errors = await self.predict_many(symbols, days)
+
+        # 2. Spread the grid over the pool, reusing each symbol's predictions
+        jobs = [
+            executor.run_cpu("backtest", sweep_chunk, symbol, data["close"], data["predicted"], start_money,
+                             params[i:i + SWEEP_CHUNK_SIZE])
+            for symbol, data in series.items()
+            for i in range(0, len(params), SWEEP_CHUNK_SIZE)
+        ]
+        rows = [row for chunk in await asyncio.gather(*jobs) for row in chunk]
+
+        # 3. Ranked table
+        rows.sort(key=lambda r: (-r["return_pct"], r["max_drawdown_pct"], r["trades_count"]))
+        for rank, row in enumerate(rows, start=1):
+            row["rank"] = rank
+
+        return {
+            "initial_capital": start_money,
+            "days": days,
+            "runs": len(rows),
+            "results": rows,
+            "errors": errors,
+        }
+
+    def simulate(self, symbol: str, df, days: int, start_money: float, vectorized: bool = True):
+        """Blocking part of run_backtest (everything after the download)."""
+        prepared = self._prepare(df, days, symbol)
+        if "error" in prepared:
+            return prepared
+        df, scaled_data, scaler, model = prepared["df"], prepared["scaled"], prepared["scaler"], prepared["model"]
+        sim_start, lookback = prepared["sim_start"], prepared["lookback"]
+
+        if vectorized:
+            equity_curve, trade_log = self._simulate_vectorized(df, scaled_data, scaler, model, sim_start, lookback, start_money, symbol)
+        else:
+            equity_curve, trade_log = self._simulate_loop(df, scaled_data, scaler, model, sim_start, lookback, start_money)
+
+        if not equity_curve:
+            return {"error": "Simulation generated no data."}
+
+        final_val = equity_curve[-1]['value']
+        ret_pct = ((final_val - start_money) / start_money) * 100
+        
+        return {
+            "symbol": symbol,
+            "initial_capital": start_money,
+            "final_value": round(final_val, 2),
+            "return_pct": round(ret_pct, 2),
+            "max_drawdown_pct": round(max_drawdown_pct([p['value'] for p in equity_curve]), 2),
+            "trades_count": len(trade_log),
+            "equity_curve": equity_curve,
+            "trade_log": trade_log
+        }
+
+    def _prepare(self, df, days: int, symbol: str = None) -> dict:
+        """Validation, indicators, scaling and model lookup shared by every simulation mode."""
         # 2. Validate Length (CRITICAL FIX)
         # We need at least 100 rows to run ANY indicator or AI
         if len(df) < 100:
@@ -41,30 +130,20 @@ class BacktestEngine:
                  return {"error": "History too short for valid simulation."}
             print(f"⚠️ Adjusted backtest to {days} days due to limited history.")
 
-        # 4. Add Indicators
-        df = self.ta.add_all_indicators(df)
-        df = df.dropna()
+        # 4. Add Indicators (over the full stored history, like serving and the prediction store)
+        df = indicator_engine.features(symbol, df) if symbol else self.ta.add_all_indicators(df).dropna()
         
         # 5. Prep AI Data
-        data_values = df[self.features].values
-        scaler = MinMaxScaler(feature_range=(0, 1))
-        scaler.fit(data_values)
-        scaled_data = scaler.transform(data_values)
+        # The symbol's stored scaler (same statistics as serving); a one-off fit without a symbol
+        scaler = feature_scalers.fit(symbol, df) if symbol else FeatureScaler.from_frame(df, self.features)
+        scaled_data = scaler.transform(df[self.features].values)
         
-        # 6. Load Brain
-        model_path = "app/ml/models/universal_transformer.pth"
-        if not os.path.exists(model_path):
+        # 6. Shared Brain (loaded once per process)
+        model = registry.get_transformer()
+        if model is None:
              return {"error": "Universal Model not found."}
-
-        model = TimeSeriesTransformer(input_dim=len(self.features), d_model=128, nhead=8, num_layers=4)
-        model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
-        model.eval()
         
-        # 7. Loop
-        cash = start_money
-        holdings = 0
-        trade_log = []
-        equity_curve = []
+        # 7. Simulate
         lookback = 60
         
         # Only start if we have enough data after lookback
@@ -74,6 +153,82 @@ class BacktestEngine:
         sim_start = int(len(df) - days)
         # Ensure start index is valid (must be after lookback)
         sim_start = max(lookback, sim_start)
+        return {"df": df, "scaled": scaled_data, "scaler": scaler, "model": model, "sim_start": sim_start, "lookback": lookback}
+
+    async def predict_many(self, symbols: list, days: int):
+        """
+        Downloads every symbol concurrently and runs predict_window on each.
+        Returns ({symbol: {"close", "predicted", "dates"}}, {symbol: error}).
+        """
+        frames = await asyncio.gather(
+            *(executor.run("download", self.loader.get_stock_data, sym, period="5y") for sym in symbols),
+            return_exceptions=True
+        )
+        errors, loaded = {}, {}
+        for symbol, df in zip(symbols, frames):
+            if isinstance(df, Exception):
+                errors[symbol] = str(df)
+            elif df is None or df.empty:
+                errors[symbol] = "No data found for this stock."
+            else:
+                loaded[symbol] = df
+
+        predictions = await asyncio.gather(
+            *(executor.run("backtest", self.predict_window, df, days, symbol) for symbol, df in loaded.items())
+        )
+        series = {}
+        for symbol, prediction in zip(loaded, predictions):
+            if "error" in prediction:
+                errors[symbol] = prediction["error"]
+            else:
+                series[symbol] = prediction
+        return series, errors
+
+    def predict_window(self, df, days: int, symbol: str = None) -> dict:
+        """
+        Predicted next close for every simulated day, in one batched pass.
+        Returns {"close", "predicted", "dates"} arrays (or {"error"}), reusable
+        across any number of strategy parameters.
+        """
+        prepared = self._prepare(df, days, symbol)
+        if "error" in prepared:
+            return prepared
+        close, predicted, dates = self._predict_arrays(prepared["df"], prepared["scaled"], prepared["scaler"],
+                                                       prepared["model"], prepared["sim_start"], prepared["lookback"], symbol)
+        if len(close) == 0:
+            return {"error": "Simulation generated no data."}
+        return {"close": close, "predicted": predicted, "dates": dates}
+
+    def _predict_arrays(self, df, scaled_data, scaler, model, sim_start, lookback, symbol=None):
+        end = len(df) - 1
+        if end <= sim_start:
+            empty = np.empty(0)
+            return empty, empty, empty
+
+        predicted = None
+        if symbol and self.source == "store":
+            # Valid only for the same weights/backend, history start (OBV anchor) and scaler statistics
+            predicted = prediction_store.lookup(symbol, registry.model_version(), df['Date'].iloc[sim_start:end],
+                                                indicator_engine.first_date(symbol), scaler)
+        if predicted is None:
+            # All lookback windows at once: windows[k] == scaled_data[k:k+lookback] (a view, no copy)
+            windows = np.lib.stride_tricks.sliding_window_view(scaled_data, lookback, axis=0).transpose(0, 2, 1)
+            # Day i is predicted from scaled_data[i-lookback:i]
+            pred_scaled = batch_forward(model, windows[sim_start - lookback:end - lookback])
+
+            # Inverse-scale the Close column in one op
+            predicted = scaler.unscale_close(pred_scaled)
+
+        close = df['Close'].to_numpy(dtype=np.float64)[sim_start:end]
+        dates = df['Date'].iloc[sim_start:end].dt.strftime("%Y-%m-%d").to_numpy()
+        return close, predicted, dates
+
+    def _simulate_loop(self, df, scaled_data, scaler, model, sim_start, lookback, start_money):
+        """Reference day-by-day simulation (one model call per day)."""
+        cash = start_money
+        holdings = 0
+        trade_log = []
+        equity_curve = []
 
         for i in range(sim_start, len(df) - 1):
             current_price = df['Close'].iloc[i]
@@ -90,9 +245,7 @@ class BacktestEngine:
             with torch.no_grad():
                 pred_scaled = model(input_tensor)
             
-            dummy = np.zeros((1, len(self.features)))
-            dummy[0, 0] = pred_scaled.item()
-            predicted_price = scaler.inverse_transform(dummy)[0, 0]
+            predicted_price = float(scaler.unscale_close(pred_scaled.item()))
             
             move_pct = ((predicted_price - current_price) / current_price) * 100
             signal = "HOLD"
@@ -112,19 +265,144 @@ class BacktestEngine:
             total_val = cash + (holdings * current_price)
             equity_curve.append({"time": date.strftime("%Y-%m-%d"), "value": round(total_val, 2)})
 
-        if not equity_curve:
-            return {"error": "Simulation generated no data."}
+        return equity_curve, trade_log
 
-        final_val = equity_curve[-1]['value']
-        ret_pct = ((final_val - start_money) / start_money) * 100
-        
-        return {
-            "symbol": symbol,
-            "initial_capital": start_money,
-            "final_value": round(final_val, 2),
-            "return_pct": round(ret_pct, 2),
-            "max_drawdown_pct": 0.0, # Simplified for safety
-            "trades_count": len(trade_log),
-            "equity_curve": equity_curve,
-            "trade_log": trade_log
-        }
\ No newline at end of file
+    def _simulate_vectorized(self, df, scaled_data, scaler, model, sim_start, lookback, start_money, symbol=None):
+        """
+        Same simulation as _simulate_loop, but every day is scored in batched
+        forward passes and the signals / equity curve are NumPy array ops.
+        """
+        close, predicted, dates = self._predict_arrays(df, scaled_data, scaler, model, sim_start, lookback, symbol)
+        if len(close) == 0:
+            return [], []
+
+        move_pct = ((predicted - close) / close) * 100
+        signal = np.where(move_pct > 1.5, 1, np.where(move_pct < -1.5, -1, 0))
+
+        trades, cash, holdings = simulate_signals(close, signal, start_money)
+
+        equity = cash + holdings * close
+        equity_curve = [{"time": t, "value": v} for t, v in zip(dates.tolist(), np.round(equity, 2).tolist())]
+        trade_log = [
+            {"date": dates[i], "action": action, "price": round(float(close[i]), 2), "qty": qty, "balance": round(balance, 2)}
+            for i, action, qty, balance in trades
+        ]
+        return equity_curve, trade_log
+
+
+def simulate_signals(close: np.ndarray, signal: np.ndarray, start_money: float, exit_after: int = None):
+    """
+    All-in / all-out execution of a BUY(1) / SELL(-1) / HOLD(0) signal array.
+
+    Only the days where something can actually happen are visited: the next
+    affordable BUY while flat (or holding leftover cash) and the next SELL
+    while invested. Returns the trade events plus per-day cash and holdings
+    arrays, matching the day-by-day loop exactly.
+
+    exit_after=N replaces SELL signals with a time exit: the position is sold
+    N days after it was opened (or held to the end if that is past the window).
+    """
+    buy_idx = np.flatnonzero(signal == 1)
+    sell_idx = np.flatnonzero(signal == -1)
+
+    cash = float(start_money)
+    holdings = 0
+    pos = 0
+    entry_day = None
+    trades = []  # (day index, action, qty, cash after)
+
+    while True:
+        # Next BUY day we can afford at least one share on
+        candidates = buy_idx[np.searchsorted(buy_idx, pos):]
+        affordable = candidates[close[candidates] < cash]
+        next_buy = affordable[0] if len(affordable) else None
+
+        # Next SELL day (only matters while invested)
+        next_sell = None
+        if holdings > 0:
+            if exit_after is not None:
+                exit_day = entry_day + exit_after
+                next_sell = exit_day if exit_day < len(close) else None
+            else:
+                k = np.searchsorted(sell_idx, pos)
+                next_sell = sell_idx[k] if k < len(sell_idx) else None
+
+        if next_buy is None and next_sell is None:
+            break
+
+        if next_sell is None or (next_buy is not None and next_buy < next_sell):
+            price = close[next_buy]
+            qty = int(cash // price)
+            cash -= qty * price
+            if holdings == 0:
+                entry_day = int(next_buy)
+            holdings += qty
+            trades.append((int(next_buy), "BUY", qty, cash))
+            pos = next_buy + 1
+        else:
+            price = close[next_sell]
+            cash += holdings * price
+            trades.append((int(next_sell), "SELL", holdings, cash))
+            holdings = 0
+            pos = next_sell + 1
+
+    # Step functions: the state after the latest trade on or before each day
+    cash_steps = np.array([start_money] + [t[3] for t in trades], dtype=np.float64)
+    holding_steps = np.zeros(len(trades) + 1, dtype=np.float64)
+    running = 0
+    for k, (_, action, qty, _) in enumerate(trades, start=1):
+        running = running + qty if action == "BUY" else 0
+        holding_steps[k] = running
+
+    marker = np.zeros(len(close), dtype=np.int64)
+    if trades:
+        marker[[t[0] for t in trades]] = np.arange(1, len(trades) + 1)
+    marker = np.maximum.accumulate(marker)
+
+    return trades, cash_steps[marker], holding_steps[marker]
+
+
+def max_drawdown_pct(values) -> float:
+    """Largest peak-to-trough fall of an equity curve, in percent (positive number)."""
+    equity = np.asarray(values, dtype=np.float64)
+    if len(equity) == 0:
+        return 0.0
+    peak = np.maximum.accumulate(equity)
+    drawdown = (peak - equity) / np.where(peak > 0, peak, 1)
+    return float(drawdown.max() * 100)
+
+
+# --- Parameter sweeps ---
+
+def parse_holding_rule(rule: str):
+    """'signal' -> exit on SELL signals (None); 'hold_N' -> time exit after N days (N)."""
+    if rule == "signal":
+        return None
+    if rule.startswith("hold_") and rule[5:].isdigit() and int(rule[5:]) > 0:
+        return int(rule[5:])
+    raise ValueError(f"Invalid holding rule '{rule}'. Use 'signal' or 'hold_<days>'.")
+
+
+def evaluate_strategy(close: np.ndarray, predicted: np.ndarray, start_money: float,
+                      threshold: float = 1.5, holding: str = "signal") -> dict:
+    """Return / drawdown / trade count of one (threshold, holding rule) on precomputed predictions."""
+    move_pct = ((predicted - close) / close) * 100
+    signal = np.where(move_pct > threshold, 1, np.where(move_pct < -threshold, -1, 0))
+
+    trades, cash, holdings = simulate_signals(close, signal, start_money, exit_after=parse_holding_rule(holding))
+    equity = cash + holdings * close
+    final_val = float(equity[-1])
+    return {
+        "threshold": threshold,
+        "holding": holding,
+        "final_value": round(final_val, 2),
+        "return_pct": round((final_val - start_money) / start_money * 100, 2),
+        "max_drawdown_pct": round(max_drawdown_pct(equity), 2),
+        "trades_count": len(trades),
+    }
+
+
+def sweep_chunk(symbol: str, close: np.ndarray, predicted: np.ndarray, start_money: float, params: list) -> list:
+    """Evaluates many (threshold, holding) pairs for one symbol (picklable, for the process pool)."""
+    return [{"symbol": symbol, **evaluate_strategy(close, predicted, start_money, threshold, holding)}
+            for threshold, holding in params]
@@ -0,0 +1,137 @@
+import json
+import os
+import re
+import threading
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# ai-engine/data/historical (same root detection as mongo.py)
+DATA_DIR = Path(__file__).resolve().parent.parent.parent / "data" / "historical"
+
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+BAR_DTYPE = np.dtype([('Date', '<M8[ns]')] + [(c, '<f8') for c in BAR_COLUMNS])
+
+
+class BarStore:
+    """
+    The 'Warehouse' behind MarketDataLoader.
+    One memory-mapped NumPy file of OHLCV bars per symbol+interval, plus a
+    small JSON sidecar recording how far back the history goes and when it
+    was last refreshed.
+    """
+
+    def __init__(self, root: Path = DATA_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _key(self, symbol: str, interval: str) -> str:
+        # Symbols like 'EURUSD=X' or '^NSEI' are not filename-safe
+        return re.sub(r'[^A-Za-z0-9._-]', '_', f"{symbol}_{interval}")
+
+    def _bars_path(self, symbol: str, interval: str) -> Path:
+        return self.root / f"{self._key(symbol, interval)}.npy"
+
+    def _meta_path(self, symbol: str, interval: str) -> Path:
+        return self.root / f"{self._key(symbol, interval)}.json"
+
+    def lock(self, symbol: str, interval: str = "1d") -> threading.Lock:
+        """Per-file lock so concurrent requests don't interleave read-modify-write."""
+        key = self._key(symbol, interval)
+        with self._locks_guard:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    # --- Reads ---
+
+    def read(self, symbol: str, interval: str = "1d", start: date = None):
+        path = self._bars_path(symbol, interval)
+        if not path.exists():
+            return None
+
+        bars = np.load(path, mmap_mode='r')
+        if start is not None:
+            # Bars are kept sorted, so the slice start is a binary search
+            first = np.searchsorted(bars['Date'], np.datetime64(start, 'ns'))
+            bars = bars[first:]
+
+        df = pd.DataFrame({name: np.array(bars[name]) for name in BAR_DTYPE.names})
+        return df
+
+    def meta(self, symbol: str, interval: str = "1d") -> dict:
+        path = self._meta_path(symbol, interval)
+        if not path.exists():
+            return {}
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def last_date(self, symbol: str, interval: str = "1d"):
+        """Date of the newest stored bar (None if nothing stored)."""
+        last = self.meta(symbol, interval).get("last_date")
+        return date.fromisoformat(last) if last else None
+
+    # --- Writes ---
+
+    def write(self, symbol: str, interval: str, df: pd.DataFrame, covered_from: date = None):
+        """Replaces the stored bars with `df` (must contain Date + OHLCV)."""
+        df = df.sort_values('Date').drop_duplicates(subset='Date', keep='last')
+
+        bars = np.empty(len(df), dtype=BAR_DTYPE)
+        dates = pd.to_datetime(df['Date'])
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+        bars['Date'] = dates.values.astype('datetime64[ns]')
+        for col in BAR_COLUMNS:
+            bars[col] = df[col].to_numpy(dtype='float64') if col in df.columns else np.nan
+
+        path = self._bars_path(symbol, interval)
+        tmp_path = path.with_suffix(".tmp.npy")
+        np.save(tmp_path, bars)
+        os.replace(tmp_path, path)  # Atomic swap, readers never see half a file
+
+        meta = self.meta(symbol, interval)
+        if covered_from is not None:
+            meta["covered_from"] = covered_from.isoformat()
+        meta["last_date"] = pd.Timestamp(bars['Date'][-1]).date().isoformat() if len(bars) else None
+        meta["fetched_at"] = datetime.now(timezone.utc).isoformat()
+        meta["rows"] = int(len(bars))
+        self._write_meta(symbol, interval, meta)
+
+    def append(self, symbol: str, interval: str, new_bars: pd.DataFrame):
+        """
+        Merges freshly downloaded bars into the store.
+        Overlapping dates are replaced (an intraday partial bar becomes final).
+        """
+        if new_bars is None or new_bars.empty:
+            self.touch(symbol, interval)
+            return
+
+        existing = self.read(symbol, interval)
+        if existing is not None and not existing.empty:
+            new_bars = pd.concat([existing, new_bars[existing.columns.intersection(new_bars.columns)]], ignore_index=True)
+        self.write(symbol, interval, new_bars)
+
+    def touch(self, symbol: str, interval: str = "1d"):
+        """Records a refresh that produced no new bars."""
+        meta = self.meta(symbol, interval)
+        meta["fetched_at"] = datetime.now(timezone.utc).isoformat()
+        self._write_meta(symbol, interval, meta)
+
+    def _write_meta(self, symbol: str, interval: str, meta: dict):
+        path = self._meta_path(symbol, interval)
+        tmp_path = path.with_suffix(".tmp.json")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+
+# Shared instance (one warehouse per process)
+bar_store = BarStore()
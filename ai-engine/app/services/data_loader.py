@@ -3,38 +3,209 @@ import pandas as pd
 import ccxt
 import requests
 import time # Needed for sleep
-from datetime import datetime, timedelta
+from datetime import datetime, date, timedelta
+from app.services.bar_store import bar_store
+from app.services.metrics import CACHE_REQUESTS, UPSTREAM_ATTEMPTS, UPSTREAM_SECONDS
+from app.services.market_calendar import MarketCalendar, IST
+
+# How stale a cached bar may be while the market is trading
+LIVE_REFRESH = timedelta(minutes=5)
+
+
+def period_start(period: str, calendar: MarketCalendar = None, today: date = None):
+    """
+    Converts a yfinance period ('5d', '6mo', '2y', 'ytd', 'max') into the
+    first calendar date it covers. Returns None for 'max'.
+    Day periods count trading sessions, like Yahoo does ('1d' = last session).
+    """
+    calendar = calendar or MarketCalendar("nse")
+    today = today or datetime.now(IST).date()
+    if period == "max":
+        return None
+    if period == "ytd":
+        return date(today.year, 1, 1)
+
+    for unit, days in (("mo", 30), ("wk", 7), ("d", 1), ("y", 365)):
+        if period.endswith(unit):
+            count = int(period[:-len(unit)])
+            if unit == "d":
+                day = calendar.last_session_date()
+                for _ in range(count - 1):
+                    day = calendar.previous_trading_day(day)
+                return day
+            if unit == "y":
+                try:
+                    return today.replace(year=today.year - count)
+                except ValueError: # Feb 29
+                    return today.replace(year=today.year - count, day=28)
+            return today - timedelta(days=count * days)
+    raise ValueError(f"Unsupported period: {period}")
 
 class MarketDataLoader:
     """
     The 'Fuel Pump' of the AI Engine.
-    Robust version with Auto-Retry for Yahoo Finance.
+    Robust version with Auto-Retry for Yahoo Finance, backed by a local bar store.
     """
     
-    def __init__(self):
+    def __init__(self, store=None):
+        self.store = store or bar_store
         self.crypto_exchange = ccxt.binance({
             'enableRateLimit': True
         })
 
-    def get_stock_data(self, symbol: str, period: str = "2y", retries: int = 3):
+    def get_stock_data(self, symbol: str, period: str = "2y", retries: int = 3, interval: str = "1d"):
+        """
+        Fetches Stocks/Forex, served from the local BarStore whenever possible.
+        Only bars newer than the last stored date are downloaded, and nothing
+        is downloaded while the market is closed and the store is current.
+        """
+        calendar = MarketCalendar.for_symbol(symbol)
+        start = period_start(period, calendar)
+
+        with self.store.lock(symbol, interval):
+            meta = self.store.meta(symbol, interval)
+            covered_from = meta.get("covered_from")
+            last_bar = self.store.last_date(symbol, interval)
+
+            # ISO dates compare correctly as strings; 'max' is stored as date.min
+            if covered_from is not None and last_bar is not None and covered_from <= (start or date.min).isoformat():
+                if self._is_fresh(calendar, meta.get("fetched_at")):
+                    CACHE_REQUESTS.inc("bars", "hit")
+                    print(f"💾 Cache hit: {symbol} ({period})")
+                    return self.store.read(symbol, interval, start=start)
+
+                # Re-download from the last stored bar (inclusive) so a partial intraday bar gets finalized
+                CACHE_REQUESTS.inc("bars", "update")
+                print(f"📡 Updating Stock/Forex: {symbol} since {last_bar}...")
+                new_bars = self._download(symbol, retries, interval=interval, allow_empty=True, start=last_bar.isoformat())
+                if new_bars is not None:
+                    self.store.append(symbol, interval, new_bars)
+                # On failure fall back to the (stale) stored bars rather than nothing
+                return self.store.read(symbol, interval, start=start)
+
+            CACHE_REQUESTS.inc("bars", "miss")
+            print(f"📡 Fetching Stock/Forex: {symbol}...")
+            df = self._download(symbol, retries, interval=interval, period=period)
+            if df is None:
+                return None
+
+            existing = self.store.read(symbol, interval)
+            merged = df if existing is None else pd.concat([existing, df], ignore_index=True)
+            self.store.write(symbol, interval, merged, covered_from=start or date.min)
+            return self.store.read(symbol, interval, start=start)
+
+    def get_last_closes(self, symbols: list, retries: int = 3, interval: str = "1d") -> dict:
+        """
+        Latest close for many tickers: {symbol: price}.
+        Symbols with fresh bars in the local store cost nothing; all others are
+        fetched together in ONE multi-ticker download. Missing symbols are left out.
+        """
+        closes, stale = {}, []
+        for symbol in dict.fromkeys(symbols):
+            last_bar = self.store.last_date(symbol, interval)
+            meta = self.store.meta(symbol, interval)
+            if last_bar is not None and self._is_fresh(MarketCalendar.for_symbol(symbol), meta.get("fetched_at")):
+                bars = self.store.read(symbol, interval, start=last_bar)
+                if bars is not None and not bars.empty:
+                    closes[symbol] = float(bars['Close'].iloc[-1])
+                    continue
+            stale.append(symbol)
+        CACHE_REQUESTS.inc("last_close", "hit", amount=len(closes))
+        CACHE_REQUESTS.inc("last_close", "miss", amount=len(stale))
+
+        if not stale:
+            print(f"💾 Cache hit: last close for {len(closes)} symbols")
+            return closes
+
+        print(f"📡 Fetching last close for {len(stale)} symbols in one request...")
+        for attempt in range(retries):
+            try:
+                with UPSTREAM_SECONDS.time("yfinance"):
+                    df = yf.download(
+                        tickers=stale,
+                        period="5d",
+                        interval=interval,
+                        group_by="column",
+                        progress=False,
+                        timeout=20,
+                    )
+                if df.empty:
+                    raise ValueError("Received empty data")
+                UPSTREAM_ATTEMPTS.inc("yfinance", "ok")
+                break
+            except Exception as e:
+                print(f"⚠️ Attempt {attempt + 1}/{retries} failed for bulk quote: {str(e)}")
+                if attempt < retries - 1:
+                    UPSTREAM_ATTEMPTS.inc("yfinance", "retry")
+                    time.sleep(2)
+                else:
+                    UPSTREAM_ATTEMPTS.inc("yfinance", "failed")
+                    print("❌ All retries failed for bulk quote.")
+                    return closes
+
+        for symbol in stale:
+            bars = self._ticker_bars(df, symbol, single=len(stale) == 1)
+            if bars is None or bars.empty:
+                continue
+            closes[symbol] = float(bars['Close'].iloc[-1])
+
+            # Keep the store current when the 5 days connect to what's already stored
+            with self.store.lock(symbol, interval):
+                last_bar = self.store.last_date(symbol, interval)
+                if last_bar is not None and last_bar >= bars['Date'].iloc[0].date():
+                    self.store.append(symbol, interval, bars)
+        return closes
+
+    def _ticker_bars(self, df: pd.DataFrame, symbol: str, single: bool = False):
+        """One ticker's Date + OHLCV rows out of a multi-ticker download."""
+        if isinstance(df.columns, pd.MultiIndex):
+            if symbol not in df.columns.get_level_values(1):
+                return None
+            bars = df.xs(symbol, axis=1, level=1)
+        elif single:
+            bars = df
+        else:
+            return None
+
+        bars = bars.dropna(subset=['Close']).reset_index()
+        available_cols = [c for c in ['Date', 'Open', 'High', 'Low', 'Close', 'Volume'] if c in bars.columns]
+        return bars[available_cols]
+
+    def _is_fresh(self, calendar: MarketCalendar, fetched_at: str) -> bool:
+        if not fetched_at:
+            return False
+        now = datetime.now(IST)
+        fetched = datetime.fromisoformat(fetched_at)
+
+        if calendar.is_open(now):
+            # Today's bar is still forming; tolerate it being a few minutes old
+            return now - fetched < LIVE_REFRESH
+        # Market closed: fresh if we fetched after the last session's bar became final
+        return fetched >= calendar.session_end(calendar.last_session_date(now))
+
+    def _download(self, symbol: str, retries: int = 3, interval: str = "1d", allow_empty: bool = False, **window):
         """
-        Fetches Stocks/Forex with Auto-Retry logic.
+        Downloads from Yahoo Finance with Auto-Retry logic.
+        `window` is passed through to yfinance (period=... or start=...).
         """
-        print(f"📡 Fetching Stock/Forex: {symbol}...")
-        
         for attempt in range(retries):
             try:
                 # Attempt download
-                df = yf.download(
-                    tickers=symbol, 
-                    period=period, 
-                    interval="1d", 
-                    progress=False,
-                    timeout=20 # Set explicit timeout
-                )
+                with UPSTREAM_SECONDS.time("yfinance"):
+                    df = yf.download(
+                        tickers=symbol, 
+                        interval=interval, 
+                        progress=False,
+                        timeout=20, # Set explicit timeout
+                        **window
+                    )
                 
                 # Check if data is valid
                 if df.empty:
+                    # An incremental fetch can legitimately have nothing new
+                    if allow_empty:
+                        UPSTREAM_ATTEMPTS.inc("yfinance", "ok")
+                        return df
                     # If empty, it might be a glitch, wait and retry
                     raise ValueError("Received empty data")
 
@@ -49,25 +220,31 @@ class MarketDataLoader:
                 df = df[available_cols]
                 
                 # If we succeeded, return immediately
+                UPSTREAM_ATTEMPTS.inc("yfinance", "ok")
                 return df
                 
             except Exception as e:
                 print(f"⚠️ Attempt {attempt + 1}/{retries} failed for {symbol}: {str(e)}")
                 if attempt < retries - 1:
+                    UPSTREAM_ATTEMPTS.inc("yfinance", "retry")
                     time.sleep(2) # Wait 2 seconds before retrying
                 else:
+                    UPSTREAM_ATTEMPTS.inc("yfinance", "failed")
                     print(f"❌ All retries failed for {symbol}.")
                     return None
 
     def get_crypto_data(self, symbol: str, timeframe: str = '1d', limit: int = 365):
         print(f"🪙 Fetching Crypto: {symbol}...")
         try:
-            ohlcv = self.crypto_exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+            with UPSTREAM_SECONDS.time("ccxt"):
+                ohlcv = self.crypto_exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+            UPSTREAM_ATTEMPTS.inc("ccxt", "ok")
             df = pd.DataFrame(ohlcv, columns=['timestamp', 'Open', 'High', 'Low', 'Close', 'Volume'])
             df['Date'] = pd.to_datetime(df['timestamp'], unit='ms')
             df.drop(columns=['timestamp'], inplace=True)
             return df
         except Exception as e:
+            UPSTREAM_ATTEMPTS.inc("ccxt", "failed")
             print(f"⚠️ Critical Error fetching Crypto {symbol}: {str(e)}")
             return None
 
@@ -0,0 +1,97 @@
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from app.services.metrics import STAGE_SECONDS, STAGE_QUEUE_SECONDS, STAGE_ERRORS
+
+# Pool sizes (env-configurable). ENGINE_PROCESSES=0 keeps CPU stages on threads.
+THREAD_POOL_SIZE = int(os.getenv("ENGINE_THREADS", "16"))
+PROCESS_POOL_SIZE = int(os.getenv("ENGINE_PROCESSES", "0"))
+
+# Max concurrent jobs per pipeline stage; override with e.g. STAGE_LIMIT_DOWNLOAD=16
+DEFAULT_STAGE_LIMITS = {
+    "download": 8,     # yfinance / ccxt (network + retry sleeps)
+    "indicators": 4,   # pandas indicator math
+    "inference": 2,    # torch forwards (each already uses several intra-op threads)
+    "sentiment": 2,    # MiniLM encoding
+    "backtest": 2,     # full simulations
+    "quotes": 8,       # live-quote pollers (one call per symbol per interval)
+}
+
+
+class StageExecutor:
+    """
+    Runs the blocking parts of the pipeline (downloads, pandas, torch) off the
+    event loop, so async Mongo I/O and other requests keep flowing.
+    Every stage has its own concurrency limit; one slow stage can't starve the rest.
+    Queue wait and run time are recorded per stage (aladdin_stage_*_seconds).
+    """
+
+    def __init__(self, threads: int = THREAD_POOL_SIZE, processes: int = PROCESS_POOL_SIZE, limits: dict = None):
+        self.threads = threads
+        self.processes = processes
+        self.limits = dict(DEFAULT_STAGE_LIMITS)
+        for stage in self.limits:
+            env_value = os.getenv(f"STAGE_LIMIT_{stage.upper()}")
+            if env_value:
+                self.limits[stage] = int(env_value)
+        self.limits.update(limits or {})
+
+        self._thread_pool = None
+        self._process_pool = None
+        self._semaphores = {}
+
+    def _semaphore(self, stage: str) -> asyncio.Semaphore:
+        if stage not in self._semaphores:
+            self._semaphores[stage] = asyncio.Semaphore(self.limits.get(stage, self.threads))
+        return self._semaphores[stage]
+
+    def _threads(self) -> ThreadPoolExecutor:
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="aladdin")
+        return self._thread_pool
+
+    async def _submit(self, stage: str, pool, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        queued = time.perf_counter()
+        async with self._semaphore(stage):
+            started = time.perf_counter()
+            STAGE_QUEUE_SECONDS.observe(started - queued, stage)
+            try:
+                return await loop.run_in_executor(pool, functools.partial(fn, *args, **kwargs))
+            except Exception:
+                STAGE_ERRORS.inc(stage)
+                raise
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage)
+
+    async def run(self, stage: str, fn, *args, **kwargs):
+        """Runs fn(*args, **kwargs) on the thread pool under the stage's limit."""
+        return await self._submit(stage, self._threads(), fn, *args, **kwargs)
+
+    async def run_cpu(self, stage: str, fn, *args, **kwargs):
+        """
+        Like run(), but on the process pool when one is configured (ENGINE_PROCESSES > 0).
+        fn and its arguments must be picklable.
+        """
+        if self.processes <= 0:
+            return await self.run(stage, fn, *args, **kwargs)
+
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=self.processes)
+        return await self._submit(stage, self._process_pool, fn, *args, **kwargs)
+
+    def shutdown(self):
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=False, cancel_futures=True)
+            self._thread_pool = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+        self._semaphores = {}
+
+
+# Shared instance (one set of pools per process)
+executor = StageExecutor()
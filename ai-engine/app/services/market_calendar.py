@@ -0,0 +1,95 @@
+from datetime import datetime, date, time, timedelta
+from zoneinfo import ZoneInfo
+
+IST = ZoneInfo("Asia/Kolkata")
+
+# NSE Cash Market session (IST)
+NSE_OPEN = time(9, 15)
+NSE_CLOSE = time(15, 30)
+
+# NSE trading holidays (weekday closures only).
+# Update once a year from the NSE holiday circular. A missing entry only
+# costs an extra (empty) refetch, it never serves wrong data.
+NSE_HOLIDAYS = {
+    # 2024
+    date(2024, 1, 22), date(2024, 1, 26), date(2024, 3, 8), date(2024, 3, 25),
+    date(2024, 3, 29), date(2024, 4, 11), date(2024, 4, 17), date(2024, 5, 1),
+    date(2024, 5, 20), date(2024, 6, 17), date(2024, 7, 17), date(2024, 8, 15),
+    date(2024, 10, 2), date(2024, 11, 1), date(2024, 11, 15), date(2024, 11, 20),
+    date(2024, 12, 25),
+    # 2025
+    date(2025, 2, 26), date(2025, 3, 14), date(2025, 3, 31), date(2025, 4, 10),
+    date(2025, 4, 14), date(2025, 4, 18), date(2025, 5, 1), date(2025, 8, 15),
+    date(2025, 8, 27), date(2025, 10, 2), date(2025, 10, 21), date(2025, 10, 22),
+    date(2025, 11, 5), date(2025, 12, 25),
+    # 2026
+    date(2026, 1, 26), date(2026, 3, 3), date(2026, 3, 26), date(2026, 3, 31),
+    date(2026, 4, 3), date(2026, 4, 14), date(2026, 5, 1), date(2026, 5, 28),
+    date(2026, 6, 26), date(2026, 9, 14), date(2026, 10, 2), date(2026, 10, 20),
+    date(2026, 11, 10), date(2026, 11, 24), date(2026, 12, 25),
+}
+
+
+class MarketCalendar:
+    """
+    Knows when a market trades, so cached bars are not refetched while it is closed.
+
+    kind: 'nse' (Indian equities), 'forex' (Mon-Fri, 24h) or 'crypto' (24/7).
+    """
+
+    def __init__(self, kind: str = "nse"):
+        self.kind = kind
+
+    @classmethod
+    def for_symbol(cls, symbol: str) -> "MarketCalendar":
+        if symbol.endswith("-USD"):
+            return cls("crypto")
+        if symbol.endswith("=X"):
+            return cls("forex")
+        return cls("nse")
+
+    def is_trading_day(self, day: date) -> bool:
+        if self.kind == "crypto":
+            return True
+        if day.weekday() >= 5:
+            return False
+        if self.kind == "nse" and day in NSE_HOLIDAYS:
+            return False
+        return True
+
+    def is_open(self, now: datetime = None) -> bool:
+        now = now or datetime.now(IST)
+        now = now.astimezone(IST)
+        if not self.is_trading_day(now.date()):
+            return False
+        if self.kind != "nse":
+            return True
+        return NSE_OPEN <= now.time() < NSE_CLOSE
+
+    def previous_trading_day(self, day: date) -> date:
+        day -= timedelta(days=1)
+        while not self.is_trading_day(day):
+            day -= timedelta(days=1)
+        return day
+
+    def next_trading_day(self, day: date) -> date:
+        day += timedelta(days=1)
+        while not self.is_trading_day(day):
+            day += timedelta(days=1)
+        return day
+
+    def session_end(self, day: date) -> datetime:
+        """Moment after which the daily bar for `day` is final."""
+        if self.kind == "nse":
+            return datetime.combine(day, NSE_CLOSE, tzinfo=IST)
+        return datetime.combine(day + timedelta(days=1), time(0), tzinfo=IST)
+
+    def last_session_date(self, now: datetime = None) -> date:
+        """Date of the most recent session whose daily bar is (or is being) published."""
+        now = (now or datetime.now(IST)).astimezone(IST)
+        today = now.date()
+        if self.kind != "nse":
+            return today if self.is_trading_day(today) else self.previous_trading_day(today)
+        if self.is_trading_day(today) and now.time() >= NSE_OPEN:
+            return today
+        return self.previous_trading_day(today)
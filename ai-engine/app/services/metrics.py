@@ -0,0 +1,228 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers a cached /predict (ms) up to a cold multi-retry download (tens of s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """
+    Monotonic count per label set. Values kept elsewhere (e.g. a cache's own
+    hit counters) can be exported at scrape time with track(fn) instead of
+    being incremented twice.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._trackers = []
+        self._failing = set()  # Trackers already reported (scrapes would repeat the warning forever)
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def track(self, fn):
+        """fn() -> {label values tuple: value}, read on every scrape."""
+        self._trackers.append(fn)
+
+    def samples(self) -> dict:
+        with self._lock:
+            values = dict(self._values)
+        for fn in self._trackers:
+            try:
+                values.update(fn())
+            except Exception as e:
+                COLLECTOR_ERRORS.inc(self.name)
+                if fn not in self._failing:
+                    self._failing.add(fn)
+                    print(f"⚠️ Metrics: collector for {self.name} failed: {e} "
+                          f"(logged once, counted in {COLLECTOR_ERRORS.name})")
+        return values
+
+    def render(self) -> list:
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+                for labels, value in sorted(self.samples().items())]
+
+
+class Gauge(Counter):
+    """Point-in-time value (set() or track())."""
+
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram. observe() is a bisect plus two adds under
+    a lock; cumulative bucket counts are only built when /metrics is scraped.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [per-bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> list:
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+
+        lines = []
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total!r}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class RequestTimer:
+    """
+    Plain ASGI middleware feeding aladdin_http_request_seconds. Requests are
+    labelled by route template (/predict/{symbol}), so label count stays
+    bounded; WebSockets pass straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = scope.get("route")
+            HTTP_SECONDS.observe(time.perf_counter() - start, scope["method"],
+                                 getattr(route, "path", "unmatched"), str(status))
+
+
+class MetricsRegistry:
+    """All metric families of the process, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {_escape(metric.help)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Shared instance (one per process; each API worker is scraped on its own)
+metrics = MetricsRegistry()
+
+# Pipeline families. Stages are the executor's: download, indicators,
+# inference (Transformer forward), sentiment (MiniLM), backtest, quotes.
+STAGE_SECONDS = metrics.histogram(
+    "aladdin_stage_seconds", "Time a pipeline stage spent running on the worker pools", ("stage",))
+STAGE_QUEUE_SECONDS = metrics.histogram(
+    "aladdin_stage_queue_seconds", "Time a job waited for its stage's concurrency limit", ("stage",))
+STAGE_ERRORS = metrics.counter(
+    "aladdin_stage_errors_total", "Pipeline stage jobs that raised", ("stage",))
+UPSTREAM_SECONDS = metrics.histogram(
+    "aladdin_upstream_seconds", "Duration of one call to an external data source", ("source",))
+UPSTREAM_ATTEMPTS = metrics.counter(
+    "aladdin_upstream_attempts_total",
+    "Calls to external data sources by result (ok, retry = failed and retried, failed = gave up)",
+    ("source", "result"))
+CACHE_REQUESTS = metrics.counter(
+    "aladdin_cache_requests_total", "Cache lookups by cache and result", ("cache", "result"))
+CACHE_ENTRIES = metrics.gauge(
+    "aladdin_cache_entries", "Entries currently held by in-memory caches", ("cache",))
+MONGO_SECONDS = metrics.histogram(
+    "aladdin_mongo_seconds", "MongoDB command round trips", ("command",))
+MONGO_ERRORS = metrics.counter(
+    "aladdin_mongo_errors_total", "MongoDB commands that failed", ("command",))
+MONGO_BUFFERED_WRITES = metrics.counter(
+    "aladdin_mongo_buffered_writes_total",
+    "Write-behind documents by collection and result (written, failed, dropped)", ("collection", "result"))
+MONGO_PENDING_WRITES = metrics.gauge(
+    "aladdin_mongo_pending_writes", "Documents waiting in the write-behind buffer")
+HTTP_SECONDS = metrics.histogram(
+    "aladdin_http_request_seconds", "HTTP request latency by route template", ("method", "route", "status"))
+QUOTE_CLIENTS = metrics.gauge("aladdin_quote_clients", "Connected live-quote WebSocket clients")
+QUOTE_SYMBOLS = metrics.gauge("aladdin_quote_symbols", "Symbols with a running quote poller")
+COLLECTOR_ERRORS = metrics.counter(
+    "aladdin_metrics_collector_errors_total", "Scrape-time collectors that raised, by metric", ("metric",))
@@ -1,7 +1,14 @@
+import asyncio
 import motor.motor_asyncio
 import os
+from collections import deque
 from dotenv import load_dotenv
 from pathlib import Path
+from pymongo import ASCENDING, DESCENDING, IndexModel, monitoring
+from pymongo.errors import BulkWriteError
+
+from app.services.metrics import (MONGO_SECONDS, MONGO_ERRORS, MONGO_BUFFERED_WRITES,
+                                  MONGO_PENDING_WRITES)
 
 # --- DEBUGGING PATHS ---
 # 1. Get the path of THIS file (mongo.py)
@@ -23,10 +30,153 @@ else:
 # 3. Load the file
 load_dotenv(dotenv_path=env_path)
 
+# Write-behind buffer: flush when this many documents are pending or every WRITE_FLUSH_SECONDS
+WRITE_BATCH_SIZE = int(os.getenv("MONGO_WRITE_BATCH_SIZE", "500"))
+WRITE_FLUSH_SECONDS = float(os.getenv("MONGO_WRITE_FLUSH_SECONDS", "2"))
+# While MongoDB is unreachable the oldest buffered documents are dropped beyond this
+WRITE_BUFFER_LIMIT = int(os.getenv("MONGO_WRITE_BUFFER_LIMIT", "50000"))
+
+# Format /trade used to store timestamps in (strings); now they're BSON dates
+LEGACY_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Every query / sort the API runs, per collection (create_index is a no-op when one exists)
+INDEXES = {
+    "trades": [
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)]),                       # /trades
+        IndexModel([("user_id", ASCENDING), ("symbol", ASCENDING), ("timestamp", DESCENDING)]),
+    ],
+    "positions": [
+        IndexModel([("user_id", ASCENDING), ("symbol", ASCENDING)], unique=True),
+        IndexModel([("symbol", ASCENDING)], partialFilterExpression={"quantity": {"$gt": 0}}),  # held_symbols
+    ],
+    "users": [IndexModel([("user_id", ASCENDING)], unique=True)],
+    "reports": [
+        IndexModel([("type", ASCENDING), ("date", ASCENDING)]),
+        IndexModel([("type", ASCENDING), ("timestamp", DESCENDING)]),                            # /reports/latest
+    ],
+    "predictions": [IndexModel([("symbol", ASCENDING), ("timestamp", DESCENDING)])],
+}
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Records every command's server round trip (aladdin_mongo_seconds), e.g. insert / find / update."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, event.command_name)
+
+    def failed(self, event):
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, event.command_name)
+        MONGO_ERRORS.inc(event.command_name)
+
+
+class WriteBuffer:
+    """
+    Write-behind queue for records nothing reads back right away (predictions,
+    audit logs). add() never waits for the server; pending documents go out as
+    one unordered insert_many per collection when WRITE_BATCH_SIZE are pending
+    or every WRITE_FLUSH_SECONDS. A failed flush (server unreachable) is kept
+    for the next one; rejected documents are logged and counted, not retried.
+    Anything still pending is flushed by MongoDB.close().
+    """
+
+    def __init__(self, mongo, batch_size: int = WRITE_BATCH_SIZE, interval: float = WRITE_FLUSH_SECONDS,
+                 limit: int = WRITE_BUFFER_LIMIT):
+        self.mongo = mongo
+        self.batch_size = batch_size
+        self.interval = interval
+        self.limit = limit
+        self._pending = {}  # collection -> deque of documents
+        self.pending = 0
+        self._task = None
+        self._wake = None
+        self._flushing = None
+
+    def add(self, collection: str, doc: dict):
+        """Queues doc (must be called from the event loop)."""
+        queue = self._pending.setdefault(collection, deque())
+        queue.append(doc)
+        self.pending += 1
+        while self.pending > self.limit:
+            self._drop_oldest()
+
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._flushing = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+        if self.pending >= self.batch_size:
+            self._wake.set()
+
+    def _drop_oldest(self):
+        collection, queue = max(self._pending.items(), key=lambda item: len(item[1]))
+        queue.popleft()
+        self.pending -= 1
+        MONGO_BUFFERED_WRITES.inc(collection, "dropped")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        if self._flushing is None or not self.pending:
+            return
+        async with self._flushing:
+            for collection, queue in list(self._pending.items()):
+                if self.mongo.db is None:
+                    return
+                docs = list(queue)
+                if not docs:
+                    continue
+                # Detached while in flight; add() keeps appending to the (now empty) queue
+                queue.clear()
+                self.pending -= len(docs)
+                try:
+                    await getattr(self.mongo.db, collection).insert_many(docs, ordered=False)
+                    written, rejected = len(docs), 0
+                except BulkWriteError as e:
+                    # Unordered: everything but the rejected documents was written
+                    errors = e.details.get("writeErrors", [])
+                    rejected, written = len(errors), len(docs) - len(errors)
+                    print(f"⚠️ MongoDB rejected {rejected}/{len(docs)} buffered {collection} documents: "
+                          f"{errors[0].get('errmsg') if errors else e}")
+                except Exception as e:
+                    print(f"⚠️ Buffered {collection} write failed, keeping {len(docs)} documents for the next flush: {e}")
+                    queue.extendleft(reversed(docs))
+                    self.pending += len(docs)
+                    while self.pending > self.limit:
+                        self._drop_oldest()
+                    return
+                MONGO_BUFFERED_WRITES.inc(collection, "written", amount=written)
+                if rejected:
+                    MONGO_BUFFERED_WRITES.inc(collection, "failed", amount=rejected)
+
+    async def close(self):
+        """Stops the flush task and writes out what's pending."""
+        if self._task is not None:
+            async with self._flushing:  # Never cancel a batch mid-insert
+                self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self.flush()
+        if self.pending:
+            print(f"⚠️ {self.pending} buffered documents could not be written")
+        # The next event loop (e.g. a restarted app in tests) gets fresh primitives
+        self._task = self._wake = self._flushing = None
+
+
 class MongoDB:
     client: motor.motor_asyncio.AsyncIOMotorClient = None
     db = None
 
+    def __init__(self):
+        self.buffer = WriteBuffer(self)
+
     def connect(self):
         """Connect to MongoDB Cloud"""
         mongo_url = os.getenv("MONGO_URL")
@@ -36,21 +186,58 @@ class MongoDB:
             return
 
         try:
-            self.client = motor.motor_asyncio.AsyncIOMotorClient(mongo_url)
+            self.client = motor.motor_asyncio.AsyncIOMotorClient(mongo_url, event_listeners=[CommandMetrics()])
             self.db = self.client.algotrade 
             print("✅ Connected to MongoDB Atlas (algotrade DB)")
         except Exception as e:
             print(f"❌ Database Connection Error: {e}")
 
     async def close(self):
+        await self.buffer.close()
         if self.client:
             self.client.close()
             print("🔒 MongoDB Connection Closed")
 
+    async def ensure_indexes(self):
+        """Creates the INDEXES (startup). One failing index (e.g. duplicates under a unique key) doesn't stop the rest."""
+        if self.db is None:
+            return
+        for collection, models in INDEXES.items():
+            for model in models:
+                try:
+                    await getattr(self.db, collection).create_indexes([model])
+                except Exception as e:
+                    print(f"⚠️ Could not create index {model.document['name']} on {collection}: {e}")
+        print(f"🗂️ MongoDB indexes ensured for {', '.join(INDEXES)}")
+
+    async def normalize_timestamps(self):
+        """
+        One-off migration: trades logged with string timestamps get BSON dates,
+        so sorts on the timestamp indexes order old and new trades together.
+        Strings that don't parse are left as they are.
+        """
+        if self.db is None:
+            return
+        result = await self.db.trades.update_many(
+            {"timestamp": {"$type": "string"}},
+            [{"$set": {"timestamp": {"$dateFromString": {
+                "dateString": "$timestamp",
+                "format": LEGACY_TIMESTAMP_FORMAT,
+                "onError": {"$dateFromString": {"dateString": "$timestamp", "onError": "$timestamp"}},
+            }}}}],
+        )
+        if result.modified_count:
+            print(f"🕒 Converted {result.modified_count} trade timestamps to dates")
+
+    def write_behind(self, collection: str, doc: dict):
+        """Buffered insert for records nothing reads back immediately (see WriteBuffer)."""
+        if self.db is None:
+            print(f"⚠️ Data NOT saved to {collection} (Database not connected)")
+            return
+        self.buffer.add(collection, doc)
+
     async def save_prediction(self, data: dict):
-        if self.db is not None:
-            await self.db.predictions.insert_one(data)
-        else:
-            print("⚠️ Data NOT saved (Database not connected)")
+        self.write_behind("predictions", data)
 
-db = MongoDB()
\ No newline at end of file
+db = MongoDB()
+MONGO_PENDING_WRITES.track(lambda: {(): db.buffer.pending})
\ No newline at end of file
@@ -1,47 +1,125 @@
+import asyncio
 import requests
+import httpx
 from bs4 import BeautifulSoup
 from app.ml.rag_engine import RAGEngine # Import the new brain
+from app.services.ttl_cache import TTLCache
+from app.services.metrics import UPSTREAM_ATTEMPTS, UPSTREAM_SECONDS
+
+NEWS_TTL_SECONDS = 600      # Google News RSS barely changes within 10 minutes
+NEWS_ERROR_TTL_SECONDS = 30 # After a failed fetch (429, 5xx, not a feed), back off briefly instead
+NEWS_TIMEOUT_SECONDS = 10
+NEWS_MAX_CONCURRENCY = 8    # Parallel requests to Google News at most
 
 class NewsAgent:
     """
     Aladdin's 'Smart Ears'.
     Scrapes Google News and uses Vector RAG for sentiment.
+    Parsed feeds are cached per query; the async client pools connections
+    and never blocks the event loop.
     """
-    
-    def __init__(self):
+
+    def __init__(self, ttl: float = NEWS_TTL_SECONDS, timeout: float = NEWS_TIMEOUT_SECONDS,
+                 max_concurrency: int = NEWS_MAX_CONCURRENCY):
         # Initialize the RAG engine once
         self.rag = RAGEngine()
-    
+        self.cache = TTLCache(maxsize=2048, ttl=ttl)
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+
+        self._session = requests.Session() # Keep-alive for the sync path
+        self._client = None                # httpx.AsyncClient, created on first async call
+        self._semaphore = None
+
+    def _url(self, query: str) -> str:
+        return f"https://news.google.com/rss/search?q={query}+when:7d&hl=en-IN&gl=IN&ceid=IN:en"
+
+    def _parse(self, content: bytes):
+        soup = BeautifulSoup(content, features="xml")
+        if soup.find("channel") is None:
+            # e.g. an HTML consent / error page served with 200
+            raise ValueError("Response is not an RSS feed")
+        news_results = []
+        for item in soup.find_all("item"):
+            news_results.append({
+                "title": item.title.text,
+                "link": item.link.text,
+                "pubDate": item.pubDate.text,
+                "source": item.source.text if item.source else "Unknown"
+            })
+        return news_results
+
     def get_news(self, query: str, max_results=5):
+        """Blocking version (scripts, worker threads)."""
+        cached = self.cache.get(query)
+        if cached is not None:
+            return cached[:max_results]
+
         print(f"📰 Aladdin is reading news about: {query}...")
-        url = f"https://news.google.com/rss/search?q={query}+when:7d&hl=en-IN&gl=IN&ceid=IN:en"
-        
         try:
-            response = requests.get(url)
-            soup = BeautifulSoup(response.content, features="xml")
-            items = soup.find_all("item")
-            
-            news_results = []
-            for item in items[:max_results]:
-                news_results.append({
-                    "title": item.title.text,
-                    "link": item.link.text,
-                    "pubDate": item.pubDate.text,
-                    "source": item.source.text if item.source else "Unknown"
-                })
-            return news_results
+            with UPSTREAM_SECONDS.time("google_news"):
+                response = self._session.get(self._url(query), timeout=self.timeout)
+            response.raise_for_status()
+            items = self._parse(response.content)
+            self.cache.set(query, items)
+            UPSTREAM_ATTEMPTS.inc("google_news", "ok")
+            return items[:max_results]
         except Exception as e:
+            UPSTREAM_ATTEMPTS.inc("google_news", "failed")
             print(f"⚠️ Error reading news: {e}")
+            self.cache.set(query, [], ttl=NEWS_ERROR_TTL_SECONDS)
             return []
 
+    async def aget_news(self, query: str, max_results=5):
+        """Non-blocking version for the API: pooled connections, bounded concurrency, TTL cache."""
+        cached = self.cache.get(query)
+        if cached is not None:
+            return cached[:max_results]
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency * 2, max_keepalive_connections=self.max_concurrency),
+                follow_redirects=True,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        print(f"📰 Aladdin is reading news about: {query}...")
+        try:
+            async with self._semaphore:
+                with UPSTREAM_SECONDS.time("google_news"):
+                    response = await self._client.get(self._url(query))
+            response.raise_for_status()
+            # XML parsing is CPU work: keep it off the event loop
+            items = await asyncio.to_thread(self._parse, response.content)
+            self.cache.set(query, items)
+            UPSTREAM_ATTEMPTS.inc("google_news", "ok")
+            return items[:max_results]
+        except Exception as e:
+            UPSTREAM_ATTEMPTS.inc("google_news", "failed")
+            print(f"⚠️ Error reading news: {e}")
+            self.cache.set(query, [], ttl=NEWS_ERROR_TTL_SECONDS)
+            return []
+
+    async def aget_news_many(self, queries: list, max_results=5):
+        """Fetches several queries concurrently. Returns {query: items}."""
+        results = await asyncio.gather(*(self.aget_news(q, max_results) for q in queries))
+        return dict(zip(queries, results))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._session.close()
+
     def analyze_sentiment(self, news_items):
         """
         Uses RAG Engine to understand meaning.
         """
         if not news_items: return 0.0
-        
+
         # Extract just the titles for analysis
         titles = [item['title'] for item in news_items]
-        
+
         # Ask the RAG Engine to score them
-        return self.rag.analyze_semantic_sentiment(titles)
\ No newline at end of file
+        return self.rag.analyze_semantic_sentiment(titles)
@@ -0,0 +1,51 @@
+import asyncio
+
+import numpy as np
+
+from app.ml.inference import batch_forward
+from app.ml.registry import registry, LOOKBACK
+from app.processing.incremental import indicator_engine
+from app.processing.scaling import feature_scalers, FEATURES
+from app.services.data_loader import MarketDataLoader
+from app.services.executor import executor
+
+# Shared by /predict, /predict/batch, the reports and the scheduled warm-up
+market_loader = MarketDataLoader()
+
+
+async def serving_model():
+    """The Universal Brain (None if missing); a first load happens in a thread, never on the event loop."""
+    return await asyncio.to_thread(registry.get_transformer)
+
+
+async def load_features(symbol: str, period: str = "2y"):
+    """
+    Downloads history and adds the indicators the Universal Brain needs (off the event loop).
+    Indicators come from the incremental engine over the symbol's full stored
+    history: only new bars are processed, and OBV has a fixed starting point.
+    """
+    df = await executor.run("download", market_loader.get_stock_data, symbol, period=period)
+    if df is None or df.empty:
+        return None
+
+    # Thread pool, not run_cpu: the engine's per-symbol state lives in this process
+    return await executor.run("indicators", indicator_engine.features, symbol, df)
+
+
+def scale_window(symbol: str, df):
+    """Updates the symbol's stored scaler with any new bars and returns the last LOOKBACK days, scaled."""
+    scaler = feature_scalers.fit(symbol, df)
+    return scaler.transform(df[FEATURES].values[-LOOKBACK:]), scaler
+
+
+def predict_closes(model, symbols: list, frames: list) -> list:
+    """Scales every frame's last window and predicts all next closes in one stacked forward (blocking)."""
+    windows, scalers = [], []
+    for symbol, df in zip(symbols, frames):
+        scaled_input, scaler = scale_window(symbol, df)
+        windows.append(scaled_input)
+        scalers.append(scaler)
+
+    preds_scaled = batch_forward(model, np.stack(windows))
+    # Unscale Predictions (Close column only)
+    return [float(scaler.unscale_close(p)) for scaler, p in zip(scalers, preds_scaled)]
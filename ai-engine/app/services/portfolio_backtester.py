@@ -0,0 +1,207 @@
+import numpy as np
+import pandas as pd
+
+from app.services.backtester import BacktestEngine, max_drawdown_pct
+from app.services.executor import executor
+
+SIZING_RULES = ("equal", "signal", "inverse_vol")
+REBALANCE_RULES = ("daily", "weekly", "monthly")
+TRADING_DAYS = 252
+CALENDAR_DAYS = 365  # Crypto trades every day
+VOL_WINDOW = 20
+
+
+class PortfolioBacktester:
+    """
+    Basket backtest with one shared cash account.
+    Prices, predictions and positions are aligned (dates x symbols) NumPy
+    matrices. Target weights come from the model's signals. Trades happen
+    only on rebalance days and on injection days, and are vectorized across
+    symbols. The equity curve and metrics are computed with array ops.
+    """
+
+    def __init__(self, initial_capital: float = 1000.0):
+        self.engine = BacktestEngine(initial_capital=initial_capital)
+        self.initial_capital = initial_capital
+
+    async def run(self, symbols: list, days: int = 365, capital: float = None, sizing: str = "equal",
+                  rebalance: str = "weekly", threshold: float = 1.5, cost_bps: float = 10.0,
+                  monthly_injection: float = 1000.0, max_weight: float = 1.0) -> dict:
+        if sizing not in SIZING_RULES:
+            raise ValueError(f"Invalid sizing '{sizing}'. Use one of {SIZING_RULES}.")
+        if rebalance not in REBALANCE_RULES:
+            raise ValueError(f"Invalid rebalance '{rebalance}'. Use one of {REBALANCE_RULES}.")
+        start_money = float(capital) if capital is not None and capital > 0 else self.initial_capital
+        print(f"📊 Portfolio backtest: {len(symbols)} assets, {sizing} sizing, {rebalance} rebalance...")
+
+        # 1. Data + one batched prediction pass per symbol (concurrently)
+        series, errors = await self.engine.predict_many(symbols, days)
+        if not series:
+            return {"error": "No symbol could be simulated.", "errors": errors}
+
+        # 2. Matrix simulation (CPU work)
+        result = await executor.run_cpu(
+            "backtest", simulate_portfolio, series, start_money, sizing, rebalance,
+            threshold, cost_bps, monthly_injection, max_weight
+        )
+        result["errors"] = errors
+        return result
+
+
+def align(series: dict):
+    """{symbol: {"dates", "close", "predicted"}} -> (dates, symbols, close[T,N], predicted[T,N]) on the union of dates."""
+    symbols = list(series)
+    close = pd.DataFrame({s: pd.Series(series[s]["close"], index=pd.to_datetime(series[s]["dates"])) for s in symbols}).sort_index()
+    predicted = pd.DataFrame({s: pd.Series(series[s]["predicted"], index=pd.to_datetime(series[s]["dates"])) for s in symbols})
+    predicted = predicted.reindex(close.index)
+
+    # A market that's closed on a date (weekend, other exchange's holiday) keeps its last price, no new prediction
+    close = close.ffill()
+    return close.index, symbols, close.to_numpy(dtype=np.float64), predicted.to_numpy(dtype=np.float64)
+
+
+def periods_per_year(dates: pd.DatetimeIndex) -> int:
+    """Bars per year of the aligned calendar: every day once a symbol trades on weekends (crypto), else trading days."""
+    return CALENDAR_DAYS if len(dates) and (dates.dayofweek >= 5).any() else TRADING_DAYS
+
+
+def target_weights(close: np.ndarray, predicted: np.ndarray, sizing: str, threshold: float, max_weight: float) -> np.ndarray:
+    """
+    Desired weight per (date, symbol). Long after a BUY signal, flat after a SELL
+    signal, unchanged on HOLD. Longs are sized by the rule, then capped at max_weight.
+    The remainder stays in cash.
+    """
+    move_pct = (predicted - close) / close * 100
+    state = np.where(move_pct > threshold, 1.0, np.where(move_pct < -threshold, 0.0, np.nan))
+    state = pd.DataFrame(state).ffill().fillna(0.0).to_numpy()
+    state[np.isnan(close)] = 0.0
+
+    if sizing == "equal":
+        raw = state
+    elif sizing == "signal":
+        raw = state * np.nan_to_num(np.abs(move_pct), nan=0.0)
+    else:  # inverse_vol
+        returns = pd.DataFrame(close).pct_change()
+        vol = np.nan_to_num(returns.rolling(VOL_WINDOW, min_periods=2).std().to_numpy(), nan=0.0)
+        raw = state * np.divide(1.0, vol, out=np.zeros_like(vol), where=vol > 0)
+
+    total = raw.sum(axis=1, keepdims=True)
+    weights = np.divide(raw, total, out=np.zeros_like(raw), where=total > 0)
+    return np.minimum(weights, max_weight)
+
+
+def rebalance_mask(dates: pd.DatetimeIndex, rule: str) -> np.ndarray:
+    """True on the first date of every day / ISO week / month."""
+    if rule == "daily":
+        return np.ones(len(dates), dtype=bool)
+    periods = dates.to_period("W") if rule == "weekly" else dates.to_period("M")
+    mask = np.ones(len(dates), dtype=bool)
+    mask[1:] = periods[1:] != periods[:-1]
+    return mask
+
+
+def injection_schedule(dates: pd.DatetimeIndex, monthly_injection: float) -> np.ndarray:
+    """Cash added on the first date of each new month (not on the start date)."""
+    months = dates.to_period("M")
+    inject = np.zeros(len(dates))
+    if monthly_injection > 0 and len(dates) > 1:
+        inject[1:] = np.where(months[1:] != months[:-1], monthly_injection, 0.0)
+    return inject
+
+
+def simulate_portfolio(series: dict, start_money: float, sizing: str = "equal", rebalance: str = "weekly",
+                       threshold: float = 1.5, cost_bps: float = 10.0, monthly_injection: float = 1000.0,
+                       max_weight: float = 1.0) -> dict:
+    """
+    Shared-capital basket simulation with fractional shares.
+    Only the event days (rebalances and injections) are visited. Between
+    events, holdings are constant, so the daily equity is a single matrix
+    product of the forward-filled share matrix with the price matrix.
+    """
+    dates, symbols, close, predicted = align(series)
+    T, N = close.shape
+    price = np.nan_to_num(close, nan=0.0)
+    weights = target_weights(close, predicted, sizing, threshold, max_weight)
+    inject = injection_schedule(dates, monthly_injection)
+    cost_rate = cost_bps / 10_000
+
+    events = np.flatnonzero(rebalance_mask(dates, rebalance) | (inject > 0))
+    event_shares = np.zeros((len(events), N))
+    event_cash = np.zeros(len(events))
+    turnover = np.zeros(T)
+    costs = np.zeros(T)
+
+    shares = np.zeros(N)
+    cash = float(start_money)
+    for k, t in enumerate(events):
+        cash += inject[t]
+        value = cash + shares @ price[t]
+        tradable = price[t] > 0
+
+        target_value = weights[t] * value
+        target = np.divide(target_value, price[t], out=shares.copy(), where=tradable)
+        # Fees come out of the same capital: shrink the target until it's affordable (2 passes converge)
+        for _ in range(2):
+            cost = cost_rate * np.abs(target - shares) @ price[t]
+            invested = target @ price[t]
+            if invested + cost <= value or invested <= 0:
+                break
+            target *= (value - cost) / invested
+
+        traded_value = np.abs(target - shares) @ price[t]
+        cost = cost_rate * traded_value
+        cash = value - target @ price[t] - cost
+        shares = target
+
+        turnover[t] = traded_value / value if value > 0 else 0.0
+        costs[t] = cost
+        event_shares[k] = shares
+        event_cash[k] = cash
+
+    # State after the latest event on or before each day
+    marker = np.full(T, -1)
+    marker[events] = np.arange(len(events))
+    marker = np.maximum.accumulate(marker)
+    held = np.where(marker[:, None] >= 0, event_shares[np.maximum(marker, 0)], 0.0)
+    cash_series = np.where(marker >= 0, event_cash[np.maximum(marker, 0)], start_money)
+    equity = cash_series + np.einsum("tn,tn->t", held, price)
+
+    return {
+        "symbols": symbols,
+        "initial_capital": start_money,
+        **portfolio_metrics(equity, inject, start_money, turnover, costs, periods_per_year(dates)),
+        "final_weights": {s: round(float(w), 4) for s, w in zip(symbols, _weights_of(held[-1], price[-1], equity[-1]))},
+        "equity_curve": [{"time": t, "value": v} for t, v in zip(dates.strftime("%Y-%m-%d").tolist(), np.round(equity, 2).tolist())],
+    }
+
+
+def portfolio_metrics(equity: np.ndarray, inject: np.ndarray, start_money: float, turnover: np.ndarray, costs: np.ndarray,
+                      periods: int = TRADING_DAYS) -> dict:
+    """
+    Time-weighted return, drawdown, Sharpe and turnover (injections are not
+    counted as performance). `periods` is the number of bars per year.
+    """
+    previous = np.concatenate([[start_money], equity[:-1]])
+    daily = np.divide(equity - inject, previous, out=np.ones_like(equity), where=previous > 0) - 1
+    growth = np.cumprod(1 + daily)
+
+    std = daily.std(ddof=1) if len(daily) > 1 else 0.0
+    years = len(equity) / periods
+    contributed = start_money + inject.sum()
+    return {
+        "final_value": round(float(equity[-1]), 2),
+        "total_contributed": round(float(contributed), 2),
+        "profit": round(float(equity[-1] - contributed), 2),
+        "return_pct": round(float((growth[-1] - 1) * 100), 2),
+        "max_drawdown_pct": round(max_drawdown_pct(growth), 2),
+        "sharpe": round(float(daily.mean() / std * np.sqrt(periods)) if std > 0 else 0.0, 2),
+        "turnover": round(float(turnover.sum()), 2),
+        "annual_turnover": round(float(turnover.sum() / years), 2) if years > 0 else 0.0,
+        "costs_paid": round(float(costs.sum()), 2),
+        "rebalances": int((turnover > 0).sum()),
+        "periods_per_year": periods,
+    }
+
+
+def _weights_of(shares: np.ndarray, price: np.ndarray, value: float) -> np.ndarray:
+    return shares * price / value if value > 0 else np.zeros_like(shares)
@@ -0,0 +1,168 @@
+from datetime import datetime
+from app.services.mongo import db
+
+COST_TOLERANCE = 1e-6
+
+
+def replay_trades(trades: list) -> dict:
+    """
+    Recomputes positions from a trade log (oldest first), using the same
+    average-cost rules as the live /trade path.
+    Returns {(user_id, symbol): {"quantity", "total_cost", "realized_pnl"}}.
+    """
+    book = {}
+    for t in trades:
+        key = (t.get("user_id"), t["symbol"])
+        pos = book.setdefault(key, {"quantity": 0, "total_cost": 0.0, "realized_pnl": 0.0})
+        qty = t["quantity"]
+        price = t["price"]
+
+        if t["action"] == "BUY":
+            pos["quantity"] += qty
+            pos["total_cost"] += qty * price
+        elif t["action"] == "SELL" and pos["quantity"] > 0:
+            # FIFO logic is complex, using simple average cost for now
+            avg_cost = pos["total_cost"] / pos["quantity"]
+            pos["total_cost"] -= qty * avg_cost
+            pos["quantity"] -= qty
+            pos["realized_pnl"] += qty * (price - avg_cost)
+            if pos["quantity"] <= 0:
+                pos["total_cost"] = 0.0
+    return book
+
+
+class PositionBook:
+    """
+    Materialized holdings: one document per (user_id, symbol) in `positions`,
+    updated atomically by /trade, so reads never replay the trade log.
+    """
+
+    @property
+    def collection(self):
+        return db.db.positions
+
+    async def get(self, user_id: str, symbol: str):
+        return await self.collection.find_one({"user_id": user_id, "symbol": symbol})
+
+    async def holdings(self, user_id: str) -> list:
+        """Open positions only (O(holdings), independent of trade history length)."""
+        return await self.collection.find({"user_id": user_id, "quantity": {"$gt": 0}}).to_list(length=None)
+
+    async def held_symbols(self) -> list:
+        """Every symbol with an open position, across users."""
+        return await self.collection.distinct("symbol", {"quantity": {"$gt": 0}})
+
+    async def apply_buy(self, user_id: str, symbol: str, quantity: int, price: float):
+        await self.collection.update_one(
+            {"user_id": user_id, "symbol": symbol},
+            {
+                "$inc": {"quantity": quantity, "total_cost": quantity * price},
+                "$setOnInsert": {"realized_pnl": 0.0},
+                "$set": {"updated_at": datetime.utcnow()},
+            },
+            upsert=True
+        )
+
+    async def apply_sell(self, user_id: str, symbol: str, quantity: int, price: float) -> bool:
+        """
+        Atomically reduces the position at average cost and books realized PnL.
+        Returns False (and changes nothing) if the user holds fewer than `quantity`.
+        """
+        avg_cost = {"$divide": ["$total_cost", "$quantity"]}
+        remaining = {"$subtract": ["$quantity", quantity]}
+        result = await self.collection.update_one(
+            # The quantity check is part of the filter, so validation + update is one atomic step
+            {"user_id": user_id, "symbol": symbol, "quantity": {"$gte": quantity, "$gt": 0}},
+            [{"$set": {
+                "quantity": remaining,
+                "total_cost": {"$cond": [
+                    {"$lte": [remaining, 0]}, 0.0,
+                    {"$subtract": ["$total_cost", {"$multiply": [quantity, avg_cost]}]}
+                ]},
+                "realized_pnl": {"$add": [
+                    {"$ifNull": ["$realized_pnl", 0.0]},
+                    {"$multiply": [quantity, {"$subtract": [price, avg_cost]}]}
+                ]},
+                "updated_at": datetime.utcnow(),
+            }}]
+        )
+        return result.modified_count == 1
+
+    async def clear(self, user_id: str):
+        await self.collection.delete_many({"user_id": user_id})
+
+    # --- Rebuild / Verify ---
+
+    async def _expected(self, user_id: str = None) -> dict:
+        query = {"user_id": user_id} if user_id else {}
+        # _id (ObjectId) order == insertion order, regardless of timestamp type
+        trades = await db.db.trades.find(query).sort("_id", 1).to_list(length=None)
+        return replay_trades(trades)
+
+    async def rebuild(self, user_id: str = None) -> int:
+        """Recomputes positions from `trades` and replaces the stored ones."""
+        expected = await self._expected(user_id)
+        now = datetime.utcnow()
+        docs = [
+            {"user_id": uid, "symbol": sym, **pos, "updated_at": now}
+            for (uid, sym), pos in expected.items()
+        ]
+
+        await self.collection.delete_many({"user_id": user_id} if user_id else {})
+        if docs:
+            await self.collection.insert_many(docs)
+        print(f"🔁 Rebuilt {len(docs)} positions from trade history")
+        return len(docs)
+
+    async def verify(self, user_id: str = None) -> list:
+        """Returns every (user, symbol) whose stored position disagrees with the trade log."""
+        expected = await self._expected(user_id)
+        stored = await self.collection.find({"user_id": user_id} if user_id else {}).to_list(length=None)
+        actual = {(d["user_id"], d["symbol"]): d for d in stored}
+
+        mismatches = []
+        for key in set(expected) | set(actual):
+            exp = expected.get(key, {"quantity": 0, "total_cost": 0.0})
+            act = actual.get(key, {"quantity": 0, "total_cost": 0.0})
+            if exp["quantity"] != act["quantity"] or abs(exp["total_cost"] - act["total_cost"]) > COST_TOLERANCE * max(1.0, abs(exp["total_cost"])):
+                mismatches.append({
+                    "user_id": key[0], "symbol": key[1],
+                    "expected": {"quantity": exp["quantity"], "total_cost": exp["total_cost"]},
+                    "actual": {"quantity": act["quantity"], "total_cost": act["total_cost"]},
+                })
+        return mismatches
+
+    async def ensure_materialized(self):
+        """First start after the upgrade: build positions if trades exist but positions don't."""
+        if db.db is None:
+            return
+        if await self.collection.find_one({}) is None and await db.db.trades.find_one({}) is not None:
+            await self.rebuild()
+
+
+positions = PositionBook()
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Rebuild or verify the materialized positions collection")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute positions from the trades collection")
+    parser.add_argument("--user", type=str, default=None, help="Only this user_id (default: all users)")
+    args = parser.parse_args()
+
+    async def main():
+        db.connect()
+        if args.rebuild:
+            await positions.rebuild(args.user)
+        mismatches = await positions.verify(args.user)
+        if mismatches:
+            print(f"❌ {len(mismatches)} positions disagree with the trade log:")
+            for m in mismatches:
+                print(f"   {m['user_id']} {m['symbol']}: expected {m['expected']}, stored {m['actual']}")
+        else:
+            print("✅ Positions match the trade log.")
+        await db.close()
+
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+import asyncio
+import os
+import time
+
+from app.ml.registry import registry
+from app.services.bar_store import bar_store
+
+# A cached market view is served as-is for PREDICTION_TTL_SECONDS, then served
+# stale (while one background refresh runs) for up to PREDICTION_MAX_STALE_SECONDS
+PREDICTION_TTL_SECONDS = float(os.getenv("PREDICTION_TTL_SECONDS", "300"))
+PREDICTION_MAX_STALE_SECONDS = float(os.getenv("PREDICTION_MAX_STALE_SECONDS", "3600"))
+
+
+class PredictionCache:
+    """
+    Caches the user-independent part of /predict (forecast, news, sentiment,
+    chart) per symbol, keyed by (symbol, last stored bar date, model version).
+
+    - fresh entry:   returned immediately
+    - expired entry: returned immediately, refreshed once in the background
+    - miss / key changed (new bar, new model): computed, concurrent callers
+      for the same symbol share that one computation
+    """
+
+    def __init__(self, ttl: float = PREDICTION_TTL_SECONDS, max_stale: float = PREDICTION_MAX_STALE_SECONDS,
+                 interval: str = "1d"):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.interval = interval
+        self._entries = {}   # symbol -> (key, stored_at, view)
+        self._inflight = {}  # symbol -> asyncio.Task
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def key_for(self, symbol: str) -> tuple:
+        # Lookups and stores both read the bar store's last date. The view's own
+        # last row can be older (dropna drops a partial bar), so it never keys.
+        last_bar = bar_store.last_date(symbol, self.interval)
+        return (symbol, last_bar.isoformat() if last_bar else None, registry.model_version())
+
+    async def get(self, symbol: str, compute):
+        """
+        Returns the market view for `symbol`. `compute` is a zero-arg coroutine
+        function producing a fresh view from the bar store's current bars.
+        """
+        entry = self._entries.get(symbol)
+        if entry is not None:
+            key, stored_at, view = entry
+            age = time.monotonic() - stored_at
+            if key == self.key_for(symbol):
+                if age < self.ttl:
+                    self.hits += 1
+                    return view
+                if age < self.ttl + self.max_stale:
+                    self.stale_hits += 1
+                    self._refresh(symbol, compute)
+                    return view
+
+        self.misses += 1
+        # shield: one caller disconnecting must not cancel the shared computation
+        return await asyncio.shield(self._refresh(symbol, compute))
+
+    def put(self, symbol: str, view: dict):
+        """Stores a view computed elsewhere (e.g. by /predict/batch)."""
+        self._entries[symbol] = (self.key_for(symbol), time.monotonic(), view)
+
+    def invalidate(self, symbol: str = None):
+        if symbol is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(symbol, None)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "stale_hits": self.stale_hits,
+                "misses": self.misses, "refreshing": len(self._inflight)}
+
+    def _refresh(self, symbol: str, compute) -> asyncio.Task:
+        task = self._inflight.get(symbol)
+        if task is None:
+            task = asyncio.create_task(self._compute(symbol, compute))
+            self._inflight[symbol] = task
+            task.add_done_callback(lambda t: self._done(symbol, t))
+        return task
+
+    async def _compute(self, symbol: str, compute):
+        view = await compute()
+        self.put(symbol, view)
+        return view
+
+    def _done(self, symbol: str, task: asyncio.Task):
+        self._inflight.pop(symbol, None)
+        if not task.cancelled() and task.exception() is not None:
+            # Background refreshes have no awaiting caller: keep serving the old view
+            print(f"⚠️ Prediction refresh failed for {symbol}: {task.exception()}")
+
+
+# Shared instance (one cache per API process)
+prediction_cache = PredictionCache()
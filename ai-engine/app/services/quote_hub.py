@@ -0,0 +1,232 @@
+import asyncio
+import os
+import random
+import time
+import zlib
+from datetime import datetime, timezone
+
+import yfinance as yf
+
+from app.services.bar_store import bar_store
+from app.services.executor import executor
+from app.services.market_calendar import MarketCalendar
+
+# "live" polls yfinance (stocks/forex) and ccxt (crypto); "simulated" is a local
+# random walk for development and tests (no network)
+QUOTE_FEED = os.getenv("QUOTE_FEED", "live")
+QUOTE_POLL_SECONDS = float(os.getenv("QUOTE_POLL_SECONDS", "5"))
+# While a symbol's market is closed its poller slows down by this factor
+QUOTE_CLOSED_BACKOFF = float(os.getenv("QUOTE_CLOSED_BACKOFF", "12"))
+MAX_SYMBOLS_PER_CLIENT = int(os.getenv("QUOTE_MAX_SYMBOLS_PER_CLIENT", "50"))
+# A client whose socket doesn't accept a message within this time is disconnected
+QUOTE_SEND_TIMEOUT = float(os.getenv("QUOTE_SEND_TIMEOUT", "10"))
+
+
+def crypto_pair(symbol: str) -> str:
+    """'BTC-USD' (Yahoo style) -> 'BTC/USDT' (Binance); ccxt pairs pass through."""
+    if "/" in symbol:
+        return symbol
+    return symbol[:-len("-USD")] + "/USDT"
+
+
+def is_crypto(symbol: str) -> bool:
+    return "/" in symbol or MarketCalendar.for_symbol(symbol).kind == "crypto"
+
+
+class LiveFeed:
+    """Blocking upstream lookups (run on the executor's 'quotes' stage)."""
+
+    name = "live"
+    market_hours = True  # Nothing new to fetch while the market is closed
+
+    def __init__(self, loader=None):
+        self._loader = loader
+
+    @property
+    def loader(self):
+        # Imported lazily: only the live feed needs the ccxt client
+        if self._loader is None:
+            from app.services.data_loader import MarketDataLoader
+            self._loader = MarketDataLoader()
+        return self._loader
+
+    def fetch(self, symbol: str) -> dict:
+        if is_crypto(symbol):
+            ticker = self.loader.crypto_exchange.fetch_ticker(crypto_pair(symbol))
+            return {"price": float(ticker["last"]), "change_pct": ticker.get("percentage"), "source": "ccxt"}
+
+        info = yf.Ticker(symbol).fast_info
+        price, previous = float(info.last_price), info.previous_close
+        change = (price - previous) / previous * 100 if previous else None
+        return {"price": price, "change_pct": change, "source": "yfinance"}
+
+
+class SimulatedFeed:
+    """
+    Local stand-in feed: a seeded random walk per symbol, starting from the
+    last stored close when there is one. Same output shape as LiveFeed.
+    """
+
+    name = "simulated"
+    market_hours = False
+
+    def __init__(self, volatility: float = 0.002):
+        self.volatility = volatility
+        self._state = {}
+
+    def fetch(self, symbol: str) -> dict:
+        if symbol not in self._state:
+            bars = bar_store.read(symbol)
+            start = float(bars['Close'].iloc[-1]) if bars is not None and len(bars) else 100.0
+            self._state[symbol] = (start, start, random.Random(zlib.crc32(symbol.encode())))
+        previous, price, rng = self._state[symbol]
+        price *= 1 + rng.gauss(0, self.volatility)
+        self._state[symbol] = (previous, price, rng)
+        return {"price": price, "change_pct": (price - previous) / previous * 100, "source": "simulated"}
+
+
+def make_feed(name: str = QUOTE_FEED):
+    if name == "simulated":
+        return SimulatedFeed()
+    if name == "live":
+        return LiveFeed()
+    raise ValueError(f"Unknown quote feed '{name}'. Use 'live' or 'simulated'.")
+
+
+class Subscriber:
+    """
+    One connected client. Updates are conflated per symbol: a client that
+    reads slower than quotes arrive only gets the newest quote of each symbol,
+    so its backlog is bounded by its subscription count, never by time.
+    """
+
+    def __init__(self):
+        self.symbols = set()
+        self.dropped = 0
+        self._pending = {}
+        self._ready = asyncio.Event()
+
+    def offer(self, quote: dict):
+        if quote["symbol"] in self._pending:
+            self.dropped += 1  # Superseded before the client read it
+        self._pending[quote["symbol"]] = quote
+        self._ready.set()
+
+    async def next_batch(self) -> list:
+        """Waits for updates, then returns (and clears) everything pending."""
+        await self._ready.wait()
+        batch = list(self._pending.values())
+        self._pending.clear()
+        self._ready.clear()
+        return batch
+
+
+class QuoteHub:
+    """
+    Fans live quotes out to WebSocket clients.
+    Exactly one poller task runs per subscribed symbol, however many clients
+    watch it; it stops when the last subscriber leaves. Upstream calls and CPU
+    therefore scale with distinct symbols, not with connections.
+    """
+
+    def __init__(self, feed=None, interval: float = QUOTE_POLL_SECONDS):
+        self._feed = feed
+        self.interval = interval
+        self._subscribers = {}  # symbol -> set of Subscriber
+        self._pollers = {}      # symbol -> asyncio.Task
+        self._last = {}         # symbol -> latest quote
+        self.clients = 0
+        self.polls = 0
+        self.poll_errors = 0
+        self.delivered = 0
+
+    @property
+    def feed(self):
+        if self._feed is None:
+            self._feed = make_feed()
+        return self._feed
+
+    def connect(self) -> Subscriber:
+        self.clients += 1
+        return Subscriber()
+
+    def subscribe(self, subscriber: Subscriber, symbols: list) -> list:
+        """Returns the symbols actually added (capped at MAX_SYMBOLS_PER_CLIENT per client)."""
+        added = []
+        for symbol in symbols:
+            if symbol in subscriber.symbols:
+                continue
+            if len(subscriber.symbols) >= MAX_SYMBOLS_PER_CLIENT:
+                break
+            subscriber.symbols.add(symbol)
+            self._subscribers.setdefault(symbol, set()).add(subscriber)
+            if symbol not in self._pollers:
+                self._pollers[symbol] = asyncio.create_task(self._poll(symbol))
+            if symbol in self._last:
+                subscriber.offer(self._last[symbol])  # Don't make a new client wait a full interval
+            added.append(symbol)
+        return added
+
+    def unsubscribe(self, subscriber: Subscriber, symbols: list):
+        for symbol in symbols:
+            subscriber.symbols.discard(symbol)
+            watchers = self._subscribers.get(symbol)
+            if watchers is None:
+                continue
+            watchers.discard(subscriber)
+            if not watchers:
+                del self._subscribers[symbol]
+                task = self._pollers.pop(symbol, None)
+                if task is not None:
+                    task.cancel()
+                self._last.pop(symbol, None)
+
+    def disconnect(self, subscriber: Subscriber):
+        self.unsubscribe(subscriber, list(subscriber.symbols))
+        self.clients -= 1
+
+    async def _poll(self, symbol: str):
+        calendar = MarketCalendar("crypto") if is_crypto(symbol) else MarketCalendar.for_symbol(symbol)
+        while True:
+            started = time.monotonic()
+            try:
+                quote = await executor.run("quotes", self.feed.fetch, symbol)
+                self.polls += 1
+                quote = {"symbol": symbol, **quote, "time": datetime.now(timezone.utc).isoformat()}
+                self._last[symbol] = quote
+                for subscriber in self._subscribers.get(symbol, ()):
+                    subscriber.offer(quote)
+                    self.delivered += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.poll_errors += 1
+                print(f"⚠️ Quote poll failed for {symbol}: {e}")
+
+            interval = self.interval
+            if self.feed.market_hours and not calendar.is_open():
+                interval *= QUOTE_CLOSED_BACKOFF
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    def stats(self) -> dict:
+        return {
+            "feed": self.feed.name,
+            "clients": self.clients,
+            "symbols": len(self._pollers),
+            "polls": self.polls,
+            "poll_errors": self.poll_errors,
+            "delivered": self.delivered,
+        }
+
+    async def shutdown(self):
+        tasks = list(self._pollers.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._pollers.clear()
+        self._subscribers.clear()
+        self._last.clear()
+
+
+# Shared instance (one set of pollers per API process)
+quote_hub = QuoteHub()
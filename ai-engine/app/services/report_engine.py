@@ -1,106 +1,99 @@
-import pandas as pd
+import asyncio
+import os
+import time
 import numpy as np
 from datetime import datetime
-from app.services.data_loader import MarketDataLoader
-from app.processing.indicators import TechnicalAnalyzer
-# UPDATE: Import the Transformer Model, not the old PricePredictor
-from app.ml.transformer_model import TimeSeriesTransformer
+from app.ml.registry import LOOKBACK
+from app.services.pipeline import market_loader, load_features, predict_closes, serving_model
 from app.services.news_agent import NewsAgent
 from app.services.mongo import db
-import torch
-from sklearn.preprocessing import MinMaxScaler
-import os
+from app.services.executor import executor
+
+# Pre-market watchlist; override with REPORT_WATCHLIST="RELIANCE.NS,TCS.NS,..." or per request
+DEFAULT_WATCHLIST = ["RELIANCE.NS", "TCS.NS", "INFY.NS", "HDFCBANK.NS", "BTC-USD"]
+
+def default_watchlist() -> list:
+    env_value = os.getenv("REPORT_WATCHLIST", "")
+    symbols = [s.strip() for s in env_value.split(",") if s.strip()]
+    return symbols or list(DEFAULT_WATCHLIST)
 
 class ReportEngine:
-    def __init__(self):
-        self.loader = MarketDataLoader()
-        self.ta = TechnicalAnalyzer()
-        self.news_agent = NewsAgent()
-        
+    def __init__(self, news_agent: NewsAgent = None):
+        self.loader = market_loader
+        # Reuse the API's agent when given (its RAG engine is already warm)
+        self.news_agent = news_agent or NewsAgent()
+
+    def _score_sentiments(self, news_lists: list) -> list:
+        """Encodes every headline of every symbol in one call, then scores each symbol's slice (blocking)."""
+        rag = self.news_agent.rag
+        titles = [item['title'] for news in news_lists for item in news]
+        vectors = rag.cache.encode(titles) if titles else np.empty((0, 0), dtype=np.float32)
+
+        scores, offset = [], 0
+        for news in news_lists:
+            scores.append(rag.score_vectors(vectors[offset:offset + len(news)]) if news else 0.0)
+            offset += len(news)
+        return scores
+
     async def generate_pre_market_report(self, symbols: list):
-        print("📝 Generating Pre-Market Report with Universal Brain...")
+        print(f"📝 Generating Pre-Market Report with Universal Brain for {len(symbols)} assets...")
+        start_time = time.time()
         report_entries = []
         
-        # Features used by the Transformer
-        features = ['Close', 'RSI', 'SMA_50', 'SMA_200', 'OBV']
-        
-        # Load the Universal Brain ONCE
-        model_path = "app/ml/models/universal_transformer.pth"
-        if not os.path.exists(model_path):
-            print(f"❌ Universal Model not found at {model_path}")
-            return {"status": "error", "message": "Model missing"}
-            
-        # Initialize Transformer with correct dimensions
-        model = TimeSeriesTransformer(input_dim=len(features), d_model=128, nhead=8, num_layers=4)
-        try:
-            model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
-            model.eval()
-        except Exception as e:
-            print(f"❌ Error loading model: {e}")
-            return {"status": "error", "message": "Model failed to load"}
+        # Shared Universal Brain (loaded once per process)
+        model = await serving_model()
+        if model is None:
+            return {"status": "error", "message": "Model missing or failed to load"}
         
-        for symbol in symbols:
-            try:
-                # 1. Fetch Data (2y for indicators)
-                df = self.loader.get_stock_data(symbol, period="2y") 
-                if df is None or df.empty: continue
-                
-                # 2. Indicators & Cleanup
-                df = self.ta.add_all_indicators(df)
-                df = df.dropna()
-                if len(df) < 60: continue
-
-                # 3. AI Prediction (Transformer)
-                data_values = df[features].values
-                scaler = MinMaxScaler(feature_range=(0, 1))
-                scaler.fit(data_values)
-                
-                last_60_days = data_values[-60:]
-                scaled_input = scaler.transform(last_60_days)
-                input_tensor = torch.from_numpy(scaled_input).float().unsqueeze(0)
-                
-                with torch.no_grad():
-                    pred_scaled = model(input_tensor)
-                    
-                # Unscale Prediction
-                dummy = np.zeros((1, len(features)))
-                dummy[0, 0] = pred_scaled.item()
-                prediction_actual = scaler.inverse_transform(dummy)[0, 0]
-                
-                current_price = df['Close'].iloc[-1]
-                move_pct = ((prediction_actual - current_price) / current_price) * 100
-                
-                # 4. Sentiment & Reasoning
-                rsi = df['RSI'].iloc[-1]
-                search_term = f"{symbol.replace('.NS','')} stock news"
-                news = self.news_agent.get_news(search_term)
-                sentiment = self.news_agent.analyze_sentiment(news)
-                
-                reason = f"RSI is {rsi:.1f}. "
-                if sentiment > 0.2: reason += "News is Positive."
-                elif sentiment < -0.2: reason += "News is Negative."
-                else: reason += "News is Neutral."
-                
-                signal = "HOLD"
-                if move_pct > 1.0: signal = "BUY"
-                elif move_pct < -1.0: signal = "SELL"
-                
-                report_entries.append({
-                    "symbol": symbol,
-                    "signal": signal,
-                    "target": round(prediction_actual, 2),
-                    "reason": reason,
-                    "current_price": round(current_price, 2)
-                })
-                print(f"✅ Analyzed {symbol}: {signal} (Target: {prediction_actual:.2f})")
-                
-            except Exception as e:
-                print(f"❌ Skipping {symbol}: {e}")
-
-        # 5. Save Report
-        if not report_entries:
+        # 1. Fetch price data and news for every symbol concurrently
+        search_terms = [f"{symbol.replace('.NS','')} stock news" for symbol in symbols]
+        frames, news_by_term = await asyncio.gather(
+            asyncio.gather(*(load_features(s) for s in symbols), return_exceptions=True),
+            self.news_agent.aget_news_many(search_terms),
+        )
+
+        ready = []
+        for symbol, term, df in zip(symbols, search_terms, frames):
+            if isinstance(df, Exception):
+                print(f"❌ Skipping {symbol}: {df}")
+            elif df is not None and len(df) >= LOOKBACK:
+                ready.append((symbol, df, news_by_term.get(term, [])))
+        if not ready:
             return {"status": "error", "message": "No stocks analyzed"}
 
+        # 2. One batched AI Prediction (Transformer) + one batched headline encoding
+        predictions, sentiments = await asyncio.gather(
+            executor.run("inference", predict_closes, model, [s for s, _, _ in ready], [df for _, df, _ in ready]),
+            executor.run("sentiment", self._score_sentiments, [news for _, _, news in ready]),
+        )
+
+        for (symbol, df, _), prediction_actual, sentiment in zip(ready, predictions, sentiments):
+            prediction_actual = float(prediction_actual)
+            current_price = float(df['Close'].iloc[-1])
+            move_pct = ((prediction_actual - current_price) / current_price) * 100
+            
+            # 3. Reasoning
+            rsi = df['RSI'].iloc[-1]
+            reason = f"RSI is {rsi:.1f}. "
+            if sentiment > 0.2: reason += "News is Positive."
+            elif sentiment < -0.2: reason += "News is Negative."
+            else: reason += "News is Neutral."
+            
+            signal = "HOLD"
+            if move_pct > 1.0: signal = "BUY"
+            elif move_pct < -1.0: signal = "SELL"
+            
+            report_entries.append({
+                "symbol": symbol,
+                "signal": signal,
+                "target": round(prediction_actual, 2),
+                "reason": reason,
+                "current_price": round(current_price, 2)
+            })
+
+        print(f"✅ Analyzed {len(report_entries)}/{len(symbols)} assets in {time.time() - start_time:.1f}s")
+
+        # 4. Save Report
         report = {
             "type": "PRE_MARKET",
             "date": datetime.utcnow().strftime("%Y-%m-%d"),
@@ -124,16 +117,19 @@ class ReportEngine:
             
         accuracy_log = []
         correct_count = 0
-        
+
+        # One bulk quote for the whole report (store hits + a single multi-ticker download)
+        symbols = [entry['symbol'] for entry in morning_report['entries']]
+        closes = await executor.run("download", self.loader.get_last_closes, symbols)
+
         for entry in morning_report['entries']:
             symbol = entry['symbol']
             signal = entry['signal']
             start_price = entry['current_price']
-            
-            df = self.loader.get_stock_data(symbol, period="5d")
-            if df is None or df.empty: continue
-            close_price = df['Close'].iloc[-1]
-            
+
+            close_price = closes.get(symbol)
+            if close_price is None: continue
+
             actual_move = ((close_price - start_price) / start_price) * 100
             
             was_correct = False
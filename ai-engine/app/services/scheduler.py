@@ -0,0 +1,91 @@
+import asyncio
+import os
+import time as clock
+from datetime import datetime, time
+
+from app.services.market_calendar import MarketCalendar, IST
+
+MARKET_SCHEDULER = os.getenv("MARKET_SCHEDULER", "1") == "1"
+# IST wall-clock times, on NSE trading days only
+PRE_OPEN_AT = time.fromisoformat(os.getenv("SCHEDULE_PRE_OPEN", "09:00"))
+POST_MARKET_AT = time.fromisoformat(os.getenv("SCHEDULE_POST_MARKET", "15:45"))
+# Long sleeps are split so a suspended / adjusted clock is noticed quickly
+MAX_SLEEP_SECONDS = 60
+
+
+class MarketScheduler:
+    """
+    Runs async jobs at fixed IST times on NSE trading days (weekends and
+    holidays are skipped). A job whose time already passed when the app starts
+    still runs if it's before its catch_up_until time, e.g. a restart at 09:05
+    still warms the caches before the open.
+    """
+
+    def __init__(self, calendar: MarketCalendar = None):
+        self.calendar = calendar or MarketCalendar("nse")
+        self._jobs = {}
+        self._tasks = {}
+
+    def add(self, name: str, at: time, job, catch_up_until: time = None):
+        """job: zero-arg coroutine function."""
+        self._jobs[name] = {"at": at, "job": job, "catch_up_until": catch_up_until,
+                            "next_run": None, "last_run": None, "last_status": None, "last_seconds": None}
+
+    def next_run(self, at: time, now: datetime = None) -> datetime:
+        now = (now or datetime.now(IST)).astimezone(IST)
+        day = now.date()
+        if not (self.calendar.is_trading_day(day) and now.time() < at):
+            day = self.calendar.next_trading_day(day)
+        return datetime.combine(day, at, tzinfo=IST)
+
+    def _catching_up(self, spec: dict, now: datetime) -> bool:
+        until = spec["catch_up_until"]
+        return (until is not None and self.calendar.is_trading_day(now.date())
+                and spec["at"] <= now.time() < until)
+
+    async def run(self, name: str):
+        """Runs one job now (also used for manual triggers). Failures are logged, never raised."""
+        spec = self._jobs[name]
+        print(f"⏰ Scheduler: running {name}...")
+        start = clock.time()
+        try:
+            await spec["job"]()
+            spec["last_status"] = "ok"
+        except Exception as e:
+            spec["last_status"] = f"error: {e}"
+            print(f"❌ Scheduler: {name} failed: {e}")
+        spec["last_run"] = datetime.now(IST).isoformat()
+        spec["last_seconds"] = round(clock.time() - start, 2)
+        print(f"✅ Scheduler: {name} finished in {spec['last_seconds']}s")
+
+    async def _loop(self, name: str):
+        spec = self._jobs[name]
+        if self._catching_up(spec, datetime.now(IST)):
+            await self.run(name)
+        while True:
+            run_at = self.next_run(spec["at"])
+            spec["next_run"] = run_at.isoformat()
+            while (remaining := (run_at - datetime.now(IST)).total_seconds()) > 0:
+                await asyncio.sleep(min(remaining, MAX_SLEEP_SECONDS))
+            await self.run(name)
+
+    def start(self):
+        for name in self._jobs:
+            if name not in self._tasks:
+                self._tasks[name] = asyncio.create_task(self._loop(name))
+        times = ", ".join(f"{name} @ {spec['at']:%H:%M}" for name, spec in self._jobs.items())
+        print(f"🗓️ Scheduler started (IST): {times}")
+
+    async def stop(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def status(self) -> dict:
+        jobs = {}
+        for name, spec in self._jobs.items():
+            jobs[name] = {k: v for k, v in spec.items() if k not in ("job", "at", "catch_up_until")}
+            jobs[name]["at"] = spec["at"].isoformat(timespec="minutes")
+        return {"enabled": bool(self._tasks), "jobs": jobs}
@@ -0,0 +1,134 @@
+import tempfile
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Fixed headlines for the sentiment benchmarks (mix of bullish / bearish / neutral)
+HEADLINES = [
+    "Reliance shares surge after record quarterly profit",
+    "TCS bags multi-year deal with European bank",
+    "Infosys cuts revenue guidance, stock slips",
+    "HDFC Bank Q3 net profit rises 18% on strong loan growth",
+    "Sensex ends flat as investors await RBI policy",
+    "Bitcoin tumbles as regulators tighten crypto rules",
+    "ICICI Bank upgraded to buy by global brokerage",
+    "ITC announces demerger of hotels business",
+    "SBI faces lawsuit over loan recovery practices",
+    "Nifty hits fresh all-time high on FII inflows",
+    "Rupee weakens against dollar amid oil price spike",
+    "Bharti Airtel tariff hike lifts ARPU outlook",
+    "Adani group stocks crash after short-seller report",
+    "Maruti sales miss estimates in festive quarter",
+    "Ethereum rallies ahead of network upgrade",
+    "Wipro announces share buyback at premium",
+    "Auto stocks fall on weak monthly volumes",
+    "HUL margins improve as input costs ease",
+    "LIC stake sale plan spooks investors",
+    "Markets mixed as global cues remain uncertain",
+]
+
+
+def synthetic_ohlcv(rows: int = 1250, seed: int = 0, start_price: float = 1000.0) -> pd.DataFrame:
+    """Deterministic daily OHLCV bars (a seeded geometric random walk on business days)."""
+    rng = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rng.normal(0.0003, 0.015, rows)))
+    spread = np.abs(rng.normal(0, 0.008, rows)) * close
+    open_ = close * (1 + rng.normal(0, 0.004, rows))
+    return pd.DataFrame({
+        "Date": pd.bdate_range(end="2024-12-31", periods=rows),
+        "Open": open_,
+        "High": np.maximum(open_, close) + spread,
+        "Low": np.minimum(open_, close) - spread,
+        "Close": close,
+        "Volume": rng.integers(100_000, 5_000_000, rows).astype(float),
+    })
+
+
+def _seed_for(symbol: str) -> int:
+    # Stable across runs (unlike hash())
+    return zlib.crc32(symbol.encode("utf-8"))
+
+
+def fake_download(tickers, interval="1d", period=None, start=None, **kwargs):
+    """Stand-in for yfinance.download: same shape of frame, no network."""
+    if isinstance(tickers, (list, tuple)):
+        frames = {t: fake_download(t, interval, period, start) for t in tickers}
+        return pd.concat(frames, axis=1).swaplevel(0, 1, axis=1)
+
+    df = synthetic_ohlcv(seed=_seed_for(tickers)).set_index("Date")
+    if start is not None:
+        df = df[df.index >= pd.Timestamp(start)]
+    if period == "5d":
+        df = df.iloc[-5:]
+    return df
+
+
+def fake_news(self, query: str, max_results=5):
+    return [{"title": t, "link": "", "pubDate": "", "source": "bench"} for t in HEADLINES[:max_results]]
+
+
+async def afake_news(self, query: str, max_results=5):
+    return fake_news(self, query, max_results)
+
+
+class InMemoryCollection:
+    """Just enough of a motor collection for the engine's writes and simple lookups."""
+
+    def __init__(self):
+        self.docs = []
+
+    async def insert_one(self, doc):
+        self.docs.append(dict(doc))
+
+    async def insert_many(self, docs):
+        self.docs.extend(dict(d) for d in docs)
+
+    async def find_one(self, query=None, *args, **kwargs):
+        return next(iter(self._match(query or {})), None)
+
+    async def delete_many(self, query):
+        keep = [d for d in self.docs if d not in self._match(query)]
+        self.docs = keep
+
+    def _match(self, query):
+        return [d for d in self.docs if all(d.get(k) == v for k, v in query.items())]
+
+
+class InMemoryDB:
+    def __init__(self):
+        self._collections = {}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self._collections.setdefault(name, InMemoryCollection())
+
+
+def install_stand_ins(workdir: Path = None) -> Path:
+    """
+    Points the engine at local stand-ins: synthetic yfinance bars, fixed
+    headlines, an in-memory Mongo and throwaway bar-store / embedding-cache /
+    prediction-store directories. Returns the scratch directory.
+    """
+    from app.services import data_loader
+    from app.services.bar_store import bar_store
+    from app.services.mongo import db
+    from app.services.news_agent import NewsAgent
+    from app.ml.embedding_cache import embedding_cache
+    from app.ml.prediction_store import prediction_store
+
+    workdir = Path(workdir or tempfile.mkdtemp(prefix="aladdin-bench-"))
+    (workdir / "historical").mkdir(parents=True, exist_ok=True)
+    (workdir / "vector_db").mkdir(parents=True, exist_ok=True)
+    (workdir / "predictions").mkdir(parents=True, exist_ok=True)
+
+    data_loader.yf.download = fake_download
+    bar_store.root = workdir / "historical"
+    embedding_cache.root = workdir / "vector_db"
+    prediction_store.root = workdir / "predictions"
+    NewsAgent.get_news = fake_news
+    NewsAgent.aget_news = afake_news
+    db.db = InMemoryDB()
+    return workdir
@@ -0,0 +1,296 @@
+"""
+Micro-benchmarks for the engine's hot paths.
+
+    cd ai-engine
+    python -m benchmarks.run                     # run, write results, compare with the baseline
+    python -m benchmarks.run --save-baseline     # run and store the numbers as the new baseline
+    python -m benchmarks.run --only indicators backtest_vectorized
+
+Everything runs offline on deterministic fixtures (see fixtures.py). Exit
+code is 1 when a benchmark's median is slower than the baseline by more
+than --threshold, and 2 when there is no baseline to compare with (timings
+depend on the machine, so each one records its own with --save-baseline).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import torch
+
+BENCH_DIR = Path(__file__).resolve().parent
+BASELINE_PATH = BENCH_DIR / "baseline.json"
+RESULTS_DIR = BENCH_DIR / "results"
+DEFAULT_THRESHOLD = 0.20   # 20% slower than baseline = regression
+
+FEATURES = ['Close', 'RSI', 'SMA_50', 'SMA_200', 'OBV']
+LOOKBACK = 60
+BATCH_WINDOWS = 256
+
+
+def measure(fn, repeats: int, warmup: int = 1, number: int = 1) -> dict:
+    """Times `number` calls of fn per sample, `repeats` samples. Milliseconds per call."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) * 1000 / number)
+    return {
+        "median_ms": statistics.median(samples),
+        "min_ms": min(samples),
+        "mean_ms": statistics.fmean(samples),
+        "stdev_ms": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "repeats": repeats,
+        "number": number,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def build_suite(loop: asyncio.AbstractEventLoop, repeats: int) -> dict:
+    """
+    name -> zero-arg callable returning the timing dict. Each case imports and
+    builds what it needs only when it runs (after the stand-ins), so --only
+    indicators never loads the model or MiniLM. Shared inputs are built once.
+    """
+
+    @lru_cache(maxsize=None)
+    def bars():
+        from benchmarks.fixtures import synthetic_ohlcv
+        return synthetic_ohlcv(rows=1250, seed=42)
+
+    @lru_cache(maxsize=None)
+    def featured():
+        from app.processing.indicators import TechnicalAnalyzer
+        return TechnicalAnalyzer().add_all_indicators(bars()).dropna()
+
+    @lru_cache(maxsize=None)
+    def windows():
+        from app.processing.scaling import FeatureScaler
+        scaled = FeatureScaler.from_frame(featured(), FEATURES).transform(featured()[FEATURES].values).astype(np.float32)
+        return np.lib.stride_tricks.sliding_window_view(scaled, LOOKBACK, axis=0).transpose(0, 2, 1)[-BATCH_WINDOWS:]
+
+    @lru_cache(maxsize=None)
+    def model():
+        from app.ml.registry import registry, TRANSFORMER_CONFIG
+        from app.ml.transformer_model import TimeSeriesTransformer
+
+        # The served model (INFERENCE_BACKEND applies); seeded random weights if none are trained
+        served = registry.get_transformer()
+        if served is None:
+            torch.manual_seed(0)
+            served = TimeSeriesTransformer(**TRANSFORMER_CONFIG).eval()
+        return served
+
+    @lru_cache(maxsize=None)
+    def rag():
+        from benchmarks.fixtures import HEADLINES
+        from app.ml.rag_engine import RAGEngine
+
+        engine = RAGEngine()
+        engine.analyze_semantic_sentiment(HEADLINES)  # load the embedder + anchors outside the timing
+        return engine
+
+    def indicators():
+        from app.processing.indicators import TechnicalAnalyzer
+        ta, data = TechnicalAnalyzer(), bars()
+        return measure(lambda: ta.add_all_indicators(data), repeats)
+
+    def prepare_data():
+        from app.ml.train import prepare_data as prepare
+        data = bars()
+        return measure(lambda: prepare(data), repeats)
+
+    def scale_window_stored():
+        from app.processing.scaling import ScalerStore
+        frame, scalers = featured(), ScalerStore()
+        scalers.fit("BENCH.NS", frame)  # statistics already stored, as after the first request
+        return measure(lambda: scalers.fit("BENCH.NS", frame).transform(frame[FEATURES].values[-LOOKBACK:]),
+                       repeats, number=10)
+
+    def transformer_forward_single():
+        brain = model()
+        single = torch.from_numpy(np.ascontiguousarray(windows()[-1:]))
+
+        def forward():
+            with torch.no_grad():
+                brain(single)
+        return measure(forward, repeats, warmup=3, number=10)
+
+    def transformer_forward_batch256():
+        from app.ml.inference import batch_forward
+        brain, batch = model(), windows()
+        return measure(lambda: batch_forward(brain, batch), repeats)
+
+    def rag_sentiment_cold():
+        from benchmarks.fixtures import HEADLINES
+        from app.ml.rag_engine import RAGEngine
+        from app.ml.embedding_cache import EmbeddingCache, embedding_cache
+
+        rag()  # embedder loaded outside the timing
+        cold_runs = iter(range(10**6))
+
+        def cold():
+            # Fresh (empty) cache directory every call: every headline goes through the encoder
+            cache = EmbeddingCache(get_model=lambda: embedding_cache.model,
+                                   root=embedding_cache.root / f"cold-{next(cold_runs)}")
+            cache.root.mkdir()
+            RAGEngine(cache=cache).analyze_semantic_sentiment(HEADLINES)
+        return measure(cold, repeats)
+
+    def rag_sentiment_cached():
+        from benchmarks.fixtures import HEADLINES
+        engine = rag()
+        return measure(lambda: engine.analyze_semantic_sentiment(HEADLINES), repeats, number=10)
+
+    def backtest(vectorized: bool, samples: int):
+        from app.services.backtester import BacktestEngine
+        model()  # registry lookup outside the timing
+        engine = BacktestEngine()
+        return measure(lambda: loop.run_until_complete(engine.run_backtest("BENCH.NS", days=180, vectorized=vectorized)),
+                       samples)
+
+    def calculate_confidence_x1000():
+        from app.main import calculate_confidence
+        rng = np.random.default_rng(7)
+        inputs = list(zip(
+            rng.choice(["BUY", "SELL", "HOLD"], 1000).tolist(),
+            rng.uniform(-1, 1, 1000).tolist(),
+            rng.uniform(0, 100, 1000).tolist(),
+            rng.normal(0, 5, 1000).tolist(),
+        ))
+
+        def batch():
+            for args in inputs:
+                calculate_confidence(*args)
+        return measure(batch, repeats, number=5)
+
+    return {
+        "indicators": indicators,
+        "prepare_data": prepare_data,
+        "scale_window_stored": scale_window_stored,
+        "transformer_forward_single": transformer_forward_single,
+        "transformer_forward_batch256": transformer_forward_batch256,
+        "rag_sentiment_cold": rag_sentiment_cold,
+        "rag_sentiment_cached": rag_sentiment_cached,
+        "backtest_vectorized": lambda: backtest(True, repeats),
+        "backtest_loop": lambda: backtest(False, max(1, repeats // 2)),
+        # Per 1000 calls
+        "calculate_confidence_x1000": calculate_confidence_x1000,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Prints a comparison table. Returns the names that regressed."""
+    regressions = []
+    print(f"\n{'benchmark':<30} {'median ms':>11} {'baseline':>11} {'change':>8}")
+    for name, stats in results["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if base is None:
+            print(f"{name:<30} {stats['median_ms']:>11.3f} {'-':>11} {'new':>8}")
+            continue
+        ratio = stats["median_ms"] / base["median_ms"] if base["median_ms"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  ❌ regression"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = "  🚀 faster"
+        print(f"{name:<30} {stats['median_ms']:>11.3f} {base['median_ms']:>11.3f} {(ratio - 1) * 100:>+7.1f}%{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the AI engine's hot paths")
+    parser.add_argument("--only", nargs="+", default=None, help="Run only these benchmarks")
+    parser.add_argument("--repeats", type=int, default=7, help="Samples per benchmark")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads (default: torch's choice)")
+    parser.add_argument("--output", type=Path, default=None, help="Results JSON (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown vs baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    # Deterministic inputs and model init
+    np.random.seed(0)
+    torch.manual_seed(0)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    from benchmarks.fixtures import install_stand_ins
+    workdir = install_stand_ins()
+
+    loop = asyncio.new_event_loop()
+    suite = build_suite(loop, args.repeats)
+    names = args.only or list(suite)
+    unknown = [n for n in names if n not in suite]
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(unknown)}. Available: {', '.join(suite)}")
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "torch": torch.__version__,
+            "torch_threads": torch.get_num_threads(),
+            "numpy": np.__version__,
+            "inference_backend": os.getenv("INFERENCE_BACKEND", "eager"),
+            "repeats": args.repeats,
+        },
+        "benchmarks": {},
+    }
+
+    for name in names:
+        print(f"⏱️ {name}...", flush=True)
+        results["benchmarks"][name] = suite[name]()
+        print(f"   median {results['benchmarks'][name]['median_ms']:.3f} ms")
+    loop.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\n💾 Results written to {output}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f"📌 Baseline saved to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"❌ No baseline at {args.baseline}: nothing to compare against. "
+              f"Run with --save-baseline on this machine first.")
+        return 2
+
+    regressions = compare(results, json.loads(args.baseline.read_text()), args.threshold)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print("\n✅ No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+from app.ml.prediction_store import prediction_store
+from app.ml.registry import registry
+from app.ml.transformer_model import TimeSeriesTransformer
+from app.processing.incremental import indicator_engine
+from app.processing.scaling import feature_scalers
+from app.services.bar_store import bar_store
+
+
+def make_bars(days: int = 600, seed: int = 7, start: str = "2022-01-03") -> pd.DataFrame:
+    """Synthetic daily OHLCV random walk (business days, no network)."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, days)))
+    spread = close * rng.uniform(0.002, 0.02, days)
+    return pd.DataFrame({
+        'Date': pd.bdate_range(start, periods=days),
+        'Open': close + rng.normal(0, 0.5, days),
+        'High': close + spread,
+        'Low': close - spread,
+        'Close': close,
+        'Volume': rng.integers(1_000, 100_000, days).astype(float),
+    })
+
+
+@pytest.fixture
+def bars():
+    return make_bars()
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    """Points the bar store, scalers and indicator engine at empty scratch state."""
+    monkeypatch.setattr(bar_store, "root", tmp_path)
+    monkeypatch.setattr(prediction_store, "root", tmp_path)
+    monkeypatch.setattr(feature_scalers, "_scalers", {})
+    monkeypatch.setattr(indicator_engine, "_rows", OrderedDict())
+    monkeypatch.setattr(indicator_engine, "analyzers", {})
+    return tmp_path
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """A small seeded Transformer served by the registry as the Universal Brain."""
+    torch.manual_seed(0)
+    brain = TimeSeriesTransformer(input_dim=5, d_model=16, nhead=2, num_layers=1).eval()
+    monkeypatch.setattr(registry, "_models", {"transformer": brain})
+    monkeypatch.setattr(registry, "_weights_hash", "test")
+    return brain
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from app.services.backtester import simulate_signals
+
+
+def loop_reference(close, signal, start_money, exit_after=None):
+    """Day-by-day all-in / all-out execution, as BacktestEngine._simulate_loop trades."""
+    cash, holdings, entry_day = float(start_money), 0, None
+    trades, cash_series, holding_series = [], [], []
+    for i, price in enumerate(close):
+        if holdings > 0 and exit_after is not None and i == entry_day + exit_after:
+            cash += holdings * price
+            trades.append((i, "SELL", holdings, cash))
+            holdings = 0
+        elif signal[i] == 1 and cash > price:
+            qty = int(cash // price)
+            cash -= qty * price
+            if holdings == 0:
+                entry_day = i
+            holdings += qty
+            trades.append((i, "BUY", qty, cash))
+        elif signal[i] == -1 and holdings > 0 and exit_after is None:
+            cash += holdings * price
+            trades.append((i, "SELL", holdings, cash))
+            holdings = 0
+        cash_series.append(cash)
+        holding_series.append(holdings)
+    return trades, np.array(cash_series), np.array(holding_series, dtype=np.float64)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("exit_after", [None, 1, 7])
+def test_simulate_signals_matches_loop(seed, exit_after):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, 400)))
+    signal = rng.choice([1, -1, 0], size=len(close), p=[0.15, 0.15, 0.7])
+
+    trades, cash, holdings = simulate_signals(close, signal, 1000.0, exit_after=exit_after)
+    ref_trades, ref_cash, ref_holdings = loop_reference(close, signal, 1000.0, exit_after)
+
+    assert len(trades) > 5
+    assert [t[:3] for t in trades] == [t[:3] for t in ref_trades]
+    np.testing.assert_allclose([t[3] for t in trades], [t[3] for t in ref_trades])
+    np.testing.assert_allclose(cash, ref_cash)
+    np.testing.assert_array_equal(holdings, ref_holdings)
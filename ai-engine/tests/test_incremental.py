@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.processing.incremental import IncrementalAnalyzer, indicator_engine
+from app.processing.indicators import TechnicalAnalyzer
+from app.services.bar_store import bar_store
+
+INDICATORS = ['SMA_50', 'SMA_200', 'RSI', 'MACD', 'MACD_signal', 'MACDh_12_26_9', 'BBL_20_2.0', 'BBU_20_2.0', 'OBV']
+
+
+def batch(df: pd.DataFrame) -> pd.DataFrame:
+    return TechnicalAnalyzer().add_all_indicators(df).reset_index(drop=True)
+
+
+def assert_same_indicators(actual: pd.DataFrame, expected: pd.DataFrame):
+    assert list(actual['Date']) == list(expected['Date'])
+    np.testing.assert_allclose(actual[INDICATORS].to_numpy(), expected[INDICATORS].to_numpy(), rtol=1e-9, atol=1e-9)
+
+
+def test_analyzer_matches_batch(bars):
+    # Longer than RESYNC_EVERY, so the periodic resync is covered too
+    bars = pd.concat([bars, bars.assign(Date=bars['Date'] + pd.Timedelta(days=1000))], ignore_index=True)
+    rows = IncrementalAnalyzer().warm_up(bars)
+    assert_same_indicators(rows.dropna().reset_index(drop=True), batch(bars))
+
+
+def test_features_match_batch_over_the_stored_history(stores, bars):
+    bar_store.write("TEST.NS", "1d", bars)
+    period = bars.iloc[-300:].reset_index(drop=True)
+
+    featured = indicator_engine.features("TEST.NS", period)
+    expected = batch(bars)
+    assert_same_indicators(featured, expected[expected['Date'] >= period['Date'].iloc[0]].reset_index(drop=True))
+
+
+def test_features_append_and_revise(stores, bars):
+    bar_store.write("TEST.NS", "1d", bars.iloc[:-5])
+    indicator_engine.features("TEST.NS", bars.iloc[:-5])
+    rebuilt = indicator_engine.rebuilt
+
+    # New bars are folded in without a replay
+    bar_store.write("TEST.NS", "1d", bars)
+    assert_same_indicators(indicator_engine.features("TEST.NS", bars), batch(bars))
+    assert indicator_engine.rebuilt == rebuilt
+
+    # The last bar was still forming: revised in place
+    revised = bars.copy()
+    revised.loc[revised.index[-1], ['Close', 'Volume']] = [revised['Close'].iloc[-1] * 1.03, 123_456.0]
+    bar_store.write("TEST.NS", "1d", revised)
+    assert_same_indicators(indicator_engine.features("TEST.NS", revised), batch(revised))
+    assert indicator_engine.rebuilt == rebuilt
+
+
+def test_revise_needs_a_bar():
+    with pytest.raises(ValueError):
+        IncrementalAnalyzer().revise({'Close': 1.0, 'Volume': 1.0})
@@ -0,0 +1,9 @@
+import pandas as pd
+
+from app.services.portfolio_backtester import periods_per_year, CALENDAR_DAYS, TRADING_DAYS
+
+
+def test_periods_per_year_follows_the_aligned_calendar():
+    assert periods_per_year(pd.bdate_range("2024-01-01", periods=300)) == TRADING_DAYS
+    # A crypto symbol adds weekends to the union of dates
+    assert periods_per_year(pd.date_range("2024-01-01", periods=300)) == CALENDAR_DAYS
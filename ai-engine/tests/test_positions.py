@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from app.services.mongo import db
+from app.services.positions import PositionBook, replay_trades
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+TRADES = [
+    {"user_id": "u1", "symbol": "TCS.NS", "action": "BUY", "quantity": 10, "price": 100.0},
+    {"user_id": "u1", "symbol": "TCS.NS", "action": "BUY", "quantity": 5, "price": 130.0},
+    {"user_id": "u1", "symbol": "TCS.NS", "action": "SELL", "quantity": 6, "price": 150.0},
+    {"user_id": "u1", "symbol": "TCS.NS", "action": "SELL", "quantity": 9, "price": 90.0},
+]
+
+
+@pytest.fixture
+def book(monkeypatch):
+    monkeypatch.setattr(db, "db", mongomock_motor.AsyncMongoMockClient().algotrade)
+    return PositionBook()
+
+
+async def _apply(book, trades):
+    for t in trades:
+        if t["action"] == "BUY":
+            await book.apply_buy(t["user_id"], t["symbol"], t["quantity"], t["price"])
+        else:
+            assert await book.apply_sell(t["user_id"], t["symbol"], t["quantity"], t["price"])
+    return await book.get("u1", "TCS.NS")
+
+
+@pytest.mark.parametrize("count", [3, len(TRADES)])
+def test_apply_sell_matches_replay(book, count):
+    position = asyncio.run(_apply(book, TRADES[:count]))
+    expected = replay_trades(TRADES[:count])[("u1", "TCS.NS")]
+
+    assert position["quantity"] == expected["quantity"]
+    assert position["total_cost"] == pytest.approx(expected["total_cost"])
+    assert position["realized_pnl"] == pytest.approx(expected["realized_pnl"])
+
+
+def test_apply_sell_rejects_overselling(book):
+    async def run():
+        await book.apply_buy("u1", "TCS.NS", 10, 100.0)
+        before = await book.get("u1", "TCS.NS")
+        assert not await book.apply_sell("u1", "TCS.NS", 11, 120.0)
+        assert not await book.apply_sell("u1", "INFY.NS", 1, 120.0)
+        return before, await book.get("u1", "TCS.NS")
+
+    before, after = asyncio.run(run())
+    assert after == before
+
+
+def test_concurrent_sells_cannot_both_fill(book):
+    async def run():
+        await book.apply_buy("u1", "TCS.NS", 10, 100.0)
+        fills = await asyncio.gather(*(book.apply_sell("u1", "TCS.NS", 10, 120.0) for _ in range(2)))
+        return fills, await book.get("u1", "TCS.NS")
+
+    fills, position = asyncio.run(run())
+    assert sorted(fills) == [False, True]
+    assert (position["quantity"], position["total_cost"], position["realized_pnl"]) == (0, 0.0, pytest.approx(200.0))
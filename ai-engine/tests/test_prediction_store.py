@@ -0,0 +1,66 @@
+import copy
+
+import numpy as np
+import pytest
+
+from app.ml.prediction_store import prediction_store
+from app.ml.registry import registry
+from app.processing.incremental import indicator_engine
+from app.processing.scaling import feature_scalers
+from app.services.backtester import BacktestEngine
+from app.services.bar_store import bar_store
+
+DAYS = 120
+
+
+@pytest.fixture
+def scored(stores, bars, model):
+    bar_store.write("TEST.NS", "1d", bars)
+    result = prediction_store.score("TEST.NS", bars)
+    assert result["mode"] == "full"
+    return bars
+
+
+def test_store_matches_model(scored):
+    from_store = BacktestEngine(source="store").predict_window(scored, DAYS, "TEST.NS")
+    from_model = BacktestEngine(source="model").predict_window(scored, DAYS, "TEST.NS")
+
+    np.testing.assert_array_equal(from_store["dates"], from_model["dates"])
+    np.testing.assert_allclose(from_store["predicted"], from_model["predicted"], rtol=1e-6)
+
+
+def test_store_backtest_matches_model_and_loop(scored):
+    runs = [BacktestEngine(source="store").simulate("TEST.NS", scored, DAYS, 1000.0),
+            BacktestEngine(source="model").simulate("TEST.NS", scored, DAYS, 1000.0),
+            BacktestEngine(source="model").simulate("TEST.NS", scored, DAYS, 1000.0, vectorized=False)]
+    for run in runs[1:]:
+        assert run["final_value"] == runs[0]["final_value"]
+        assert run["trade_log"] == runs[0]["trade_log"]
+
+
+def test_lookup_misses_when_scaler_changes(scored):
+    scaler = feature_scalers.get("TEST.NS")
+    dates = indicator_engine.features("TEST.NS", scored)['Date'].iloc[-DAYS:-1]
+    start = indicator_engine.first_date("TEST.NS")
+    version = registry.model_version()
+    assert prediction_store.lookup("TEST.NS", version, dates, start, scaler) is not None
+
+    widened = copy.deepcopy(scaler)
+    widened.data_max_ = widened.data_max_ * 1.1
+    assert prediction_store.lookup("TEST.NS", version, dates, start, widened) is None
+
+
+def test_appended_bar_is_incremental(stores, bars, model):
+    bar_store.write("TEST.NS", "1d", bars)
+    # Statistics over the full history first, so the appended bar can't widen the scaler
+    feature_scalers.fit("TEST.NS", indicator_engine.features("TEST.NS", bars))
+
+    assert prediction_store.score("TEST.NS", bars.iloc[:-1])["mode"] == "full"
+    result = prediction_store.score("TEST.NS", bars)
+    assert (result["mode"], result["scored"]) == ("incremental", 1)
+
+    incremental = np.array(prediction_store.read("TEST.NS", registry.model_version()))
+    prediction_store.score("TEST.NS", bars, force=True)
+    rescored = np.array(prediction_store.read("TEST.NS", registry.model_version()))
+    np.testing.assert_array_equal(incremental['Date'], rescored['Date'])
+    np.testing.assert_allclose(incremental['Predicted'], rescored['Predicted'], rtol=1e-6)
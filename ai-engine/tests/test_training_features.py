@@ -0,0 +1,18 @@
+import numpy as np
+
+from app.ml.registry import LOOKBACK
+from app.ml.train import prepare_data
+from app.processing.incremental import indicator_engine
+from app.services.bar_store import bar_store
+from app.services.pipeline import scale_window
+
+
+def test_training_and_serving_windows_match(stores, bars):
+    # The store holds more history than the training frame, so OBV's start matters
+    bar_store.write("TEST.NS", "1d", bars)
+    train_frame = bars.iloc[-450:].reset_index(drop=True)
+
+    dataset, _ = prepare_data(train_frame, "TEST.NS")
+    served, _ = scale_window("TEST.NS", indicator_engine.features("TEST.NS", train_frame))
+
+    np.testing.assert_array_equal(dataset.data[-LOOKBACK:].numpy(), served.astype(np.float32))
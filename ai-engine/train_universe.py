@@ -1,7 +1,11 @@
 import os
+import json
 import time
 import argparse
-from app.ml.train import train_model
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from datetime import datetime
+from app.ml.train import train_model, model_path_for
 
 # The "Universe" of stocks we want to support out-of-the-box
 UNIVERSE = [
@@ -14,28 +18,124 @@ UNIVERSE = [
     "EURUSD=X", "INR=X"
 ]
 
-def train_all():
-    print(f"🚀 Starting Mass Training for {len(UNIVERSE)} assets...")
+# Per-symbol outcome and timing of the last runs (the skip check itself looks at the model files)
+STATUS_FILE = "app/ml/models/training_status.json"
+PREFETCH_THREADS = 8
+
+def load_status():
+    if not os.path.exists(STATUS_FILE):
+        return {}
+    try:
+        with open(STATUS_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_status(status):
+    tmp_path = STATUS_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(status, f, indent=2)
+    os.replace(tmp_path, STATUS_FILE)
+
+def prefetch(symbols):
+    """Downloads 5y of data for every symbol concurrently (served from the bar store when cached)."""
+    from app.services.data_loader import MarketDataLoader
+    loader = MarketDataLoader()
+
+    frames = {}
+    with ThreadPoolExecutor(max_workers=PREFETCH_THREADS) as pool:
+        futures = {pool.submit(loader.get_stock_data, sym, "5y"): sym for sym in symbols}
+        for future in as_completed(futures):
+            sym = futures[future]
+            try:
+                frames[sym] = future.result()
+            except Exception as e:
+                print(f"⚠️ Prefetch failed for {sym}: {e}")
+                frames[sym] = None
+    return frames
+
+def _train_worker(symbol, df, torch_threads):
+    """Runs in a worker process: one symbol, with its share of the CPU cores."""
+    import torch
+    torch.set_num_threads(torch_threads)
+
+    start = time.time()
+    model_path = train_model(symbol, df=df)
+    return model_path, time.time() - start
+
+def train_all(symbols=None, workers=None, force=False):
+    symbols = symbols or UNIVERSE
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers or cores, len(symbols)))
+    # Split the cores between workers so torch doesn't oversubscribe the CPU
+    torch_threads = max(1, cores // workers)
+
+    print(f"🚀 Starting Mass Training for {len(symbols)} assets on {workers} workers ({torch_threads} torch threads each)...")
     print("This allows the AI to have a 'Brain' for every major stock immediately.")
-    
-    for i, symbol in enumerate(UNIVERSE):
-        print(f"\n[{i+1}/{len(UNIVERSE)}] Training Brain for {symbol}...")
-        
-        # Check if model already exists to save time
-        if os.path.exists(f"app/ml/models/{symbol}_lstm.pth"):
+    wall_start = time.time()
+
+    # 1. Resume: skip every symbol that already has a _transformer.pth (the status file is only bookkeeping)
+    status = load_status()
+    pending = []
+    for symbol in symbols:
+        if not force and os.path.exists(model_path_for(symbol)):
             print(f"✅ Model for {symbol} already exists. Skipping.")
             continue
-            
-        try:
-            train_model(symbol)
-            print(f"✅ Successfully trained {symbol}")
-        except Exception as e:
-            print(f"❌ Failed to train {symbol}: {e}")
-        
-        # Sleep briefly to be polite to Yahoo Finance API
-        time.sleep(2)
+        pending.append(symbol)
+
+    if not pending:
+        print("\n🎉 Nothing to train. Aladdin is ready.")
+        return status
+
+    # 2. Fetch all data up front, concurrently
+    fetch_start = time.time()
+    frames = prefetch(pending)
+    print(f"📦 Prefetched {len(pending)} symbols in {time.time() - fetch_start:.1f}s")
+
+    # 3. Train on a process pool ('spawn' so workers don't inherit torch thread state)
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = {}
+        for symbol in pending:
+            df = frames.get(symbol)
+            if df is None or df.empty:
+                print(f"❌ No data for {symbol}. Skipping.")
+                status[symbol] = {"status": "no_data", "finished_at": datetime.utcnow().isoformat()}
+                continue
+            futures[pool.submit(_train_worker, symbol, df, torch_threads)] = symbol
+        save_status(status)
 
+        for i, future in enumerate(as_completed(futures), start=1):
+            symbol = futures[future]
+            try:
+                model_path, seconds = future.result()
+                status[symbol] = {"status": "done" if model_path else "no_data", "seconds": round(seconds, 1),
+                                  "finished_at": datetime.utcnow().isoformat()}
+                print(f"[{i}/{len(futures)}] ✅ Successfully trained {symbol} in {seconds:.1f}s")
+            except Exception as e:
+                status[symbol] = {"status": "failed", "error": str(e), "finished_at": datetime.utcnow().isoformat()}
+                print(f"[{i}/{len(futures)}] ❌ Failed to train {symbol}: {e}")
+            save_status(status) # Persist after every symbol so a crash loses nothing
+
+    # 4. Timing report
+    wall = time.time() - wall_start
+    timed = [(sym, status[sym]["seconds"]) for sym in pending if "seconds" in status.get(sym, {})]
+    print(f"\n⏱️ Wall-clock: {wall:.1f}s for {len(pending)} symbols "
+          f"(sum of per-symbol training: {sum(t for _, t in timed):.1f}s)")
+    for sym, seconds in sorted(timed, key=lambda x: -x[1]):
+        print(f"   {sym:<16} {seconds:>7.1f}s")
+
+    failed = [sym for sym in pending if status.get(sym, {}).get("status") != "done"]
+    if failed:
+        print(f"⚠️ Not trained: {', '.join(failed)} (re-run to retry)")
     print("\n🎉 Universe Training Complete! Aladdin is ready.")
+    return status
 
 if __name__ == "__main__":
-    train_all()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=None, help="Parallel training processes (default: CPU cores)")
+    parser.add_argument("--symbols", nargs="+", default=None, help="Subset of symbols (default: UNIVERSE)")
+    parser.add_argument("--force", action="store_true", help="Retrain even if a model already exists")
+    args = parser.parse_args()
+
+    train_all(symbols=args.symbols, workers=args.workers, force=args.force)